@@ -0,0 +1,392 @@
+"""Latency benchmark of `generate_cfs()` on the bundled datasets.
+
+Train (or load from the cache) a seeded EBM on each dataset in `examples/data`:
+adult, German credit, COMPAS, and credit. Then generate CFs for a fixed sample
+of rejected rows under several constraint profiles, and report the p50/p95
+latency of each stage, the MILP sizes, and the throughput. Each profile runs a
+few warm-up calls first, which are not measured.
+
+The EBMs are pickled in `--cache-dir`, keyed by the dataset, the interpret
+version, and the number of interactions, so later runs do not train again. Use
+`--output` to append one JSON record per dataset and profile to a file, so the
+latencies can be tracked over time.
+
+Usage:
+    python benchmarks/bench_generate_cfs.py
+    python benchmarks/bench_generate_cfs.py --datasets adult compas \\
+        --profiles default total_cfs_5 --num-examples 50 --output cfs-times.jsonl
+"""
+
+import argparse
+import json
+import pickle
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+from time import time
+
+import numpy as np
+import pandas as pd
+import pulp
+from interpret import __version__ as interpret_version
+from interpret.glassbox import ExplainableBoostingClassifier
+
+import gamcoach as coach
+
+SEED = 101221
+REPO_PATH = Path(__file__).parent.parent
+DATA_PATH = REPO_PATH / "examples/data"
+CACHE_PATH = Path.home() / ".cache/gamcoach/benchmarks"
+
+# Number of pairwise interactions of the EBMs. We fix it, because the default of
+# interpret changes across versions, and it sets the size of the MILPs.
+INTERACTIONS = 10
+
+# Continuous features are limited to this percentile range of the training
+# data in the `feature_ranges` profile
+RANGE_PERCENTILES = [10, 90]
+
+# Stages to show in the printed table. All stages are saved in `--output`.
+TABLE_STAGES = [
+    "explain_local",
+    "generate_cont_options",
+    "generate_cat_options",
+    "generate_inter_options",
+    "create_milp",
+    "solve_milp",
+]
+
+
+def load_adult():
+    """Load the adult census income data. Positive: income > 50K."""
+    data = pd.read_csv(DATA_PATH / "adult.data", header=None, skipinitialspace=True)
+    names = [
+        "age",
+        "workclass",
+        "education",
+        "education_num",
+        "marital_status",
+        "occupation",
+        "relationship",
+        "sex",
+        "capital_gain",
+        "capital_loss",
+        "hours_per_week",
+        "native_country",
+    ]
+    continuous = [
+        "age",
+        "education_num",
+        "capital_gain",
+        "capital_loss",
+        "hours_per_week",
+    ]
+
+    x_df = data.iloc[:, [0, 1, 3, 4, 5, 6, 7, 9, 10, 11, 12, 13]]
+    x_df.columns = names
+    y_all = (data.iloc[:, 14] == ">50K").to_numpy(dtype=int)
+
+    return _to_arrays(x_df, y_all, continuous)
+
+
+def load_german():
+    """Load the German credit data. Positive: no default."""
+    data = pd.read_csv(DATA_PATH / "german_credit.csv")
+    continuous = ["duration_in_month", "credit_amount", "age"]
+
+    x_df = data.drop(columns=["default"])
+    y_all = 1 - data["default"].to_numpy(dtype=int)
+
+    return _to_arrays(x_df, y_all, continuous)
+
+
+def load_compas():
+    """Load the COMPAS recidivism data with the ProPublica filters. Positive:
+    no recidivism in two years."""
+    data = pd.read_csv(DATA_PATH / "compas-scores-two-years.csv")
+    data = data[
+        (data["days_b_screening_arrest"].abs() <= 30)
+        & (data["is_recid"] != -1)
+        & (data["c_charge_degree"] != "O")
+        & (data["score_text"] != "N/A")
+    ]
+    continuous = [
+        "age",
+        "juv_fel_count",
+        "juv_misd_count",
+        "juv_other_count",
+        "priors_count",
+    ]
+
+    x_df = data[continuous + ["sex", "race", "c_charge_degree"]]
+    y_all = 1 - data["two_year_recid"].to_numpy(dtype=int)
+
+    return _to_arrays(x_df, y_all, continuous)
+
+
+def load_credit():
+    """Load the processed default of credit card clients data. Positive: no
+    default next month."""
+    data = pd.read_csv(DATA_PATH / "credit_processed.csv")
+    label = "NoDefaultNextMonth (label)"
+    binary = ["isMale", "isMarried", "HasHistoryOfOverduePayments"]
+
+    x_df = data.drop(columns=[label])
+    y_all = data[label].to_numpy(dtype=int)
+    continuous = [c for c in x_df.columns if c not in binary]
+
+    return _to_arrays(x_df, y_all, continuous)
+
+
+DATASETS = {
+    "adult": load_adult,
+    "german": load_german,
+    "compas": load_compas,
+    "credit": load_credit,
+}
+
+# Extra `generate_cfs()` arguments of each profile. `feature_ranges` is filled
+# in from the training data.
+PROFILES = {
+    "default": {},
+    "max_features_2": {"max_num_features_to_vary": 2},
+    "total_cfs_5": {"total_cfs": 5},
+    "feature_ranges": {"feature_ranges": None},
+}
+
+
+def _to_arrays(x_df, y_all, continuous):
+    """Convert a feature DataFrame to an object array and the EBM feature
+    types. Continuous features are floats, and categorical features are
+    strings."""
+    x_all = np.empty(x_df.shape, dtype=object)
+    feature_types = []
+
+    for i, name in enumerate(x_df.columns):
+        if name in continuous:
+            x_all[:, i] = x_df[name].to_numpy(dtype=float)
+            feature_types.append("continuous")
+        else:
+            x_all[:, i] = x_df[name].astype(str).to_numpy()
+            feature_types.append("nominal")
+
+    return x_all, y_all, list(x_df.columns), feature_types
+
+
+def load_coach(name, cache_path=CACHE_PATH):
+    """Load a dataset, and train its EBM or load it from the cache.
+
+    Args:
+        name (str): The dataset name in `DATASETS`.
+        cache_path (Path, optional): Directory of the pickled EBMs.
+
+    Returns:
+        tuple: (GAMCoach, x_all, x_reject)
+    """
+    x_all, y_all, feature_names, feature_types = DATASETS[name]()
+
+    model_path = Path(cache_path) / "{}-ebm-{}-{}-{}.pkl".format(
+        name, interpret_version, INTERACTIONS, SEED
+    )
+
+    if model_path.exists():
+        with open(model_path, "rb") as f:
+            ebm = pickle.load(f)
+    else:
+        print("Training the EBM of {} ({} rows)...".format(name, x_all.shape[0]))
+        ebm = ExplainableBoostingClassifier(
+            feature_names=feature_names,
+            feature_types=feature_types,
+            interactions=INTERACTIONS,
+            random_state=SEED,
+        )
+        ebm.fit(x_all, y_all)
+
+        model_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(model_path, "wb") as f:
+            pickle.dump(ebm, f)
+
+    my_coach = coach.GAMCoach(ebm, x_all)
+    x_reject = x_all[ebm.predict(x_all) == 0]
+
+    return my_coach, x_all, x_reject
+
+
+def get_profile_kwargs(profile, my_coach, x_all):
+    """Get the `generate_cfs()` arguments of a profile."""
+    kwargs = dict(PROFILES[profile])
+
+    if "feature_ranges" in kwargs:
+        feature_ranges = {}
+
+        for i, f_type in enumerate(my_coach.ebm.feature_types_in_):
+            if f_type == "continuous":
+                low, high = np.percentile(x_all[:, i].astype(float), RANGE_PERCENTILES)
+                feature_ranges[my_coach.ebm.feature_names_in_[i]] = [low, high]
+
+        kwargs["feature_ranges"] = feature_ranges
+
+    return kwargs
+
+
+def run_profile(my_coach, examples, kwargs, warmup=1):
+    """Generate CFs of all examples and collect their stats.
+
+    Args:
+        my_coach (GAMCoach): The coach to benchmark.
+        examples (np.ndarray): The rejected rows.
+        kwargs (dict): Extra `generate_cfs()` arguments.
+        warmup (int, optional): Number of unmeasured calls to run first.
+
+    Returns:
+        list: `GenerationStats` of the measured calls.
+    """
+    for i in range(min(warmup, examples.shape[0])):
+        my_coach.generate_cfs(examples[i], verbose=0, **kwargs)
+
+    return [my_coach.generate_cfs(x, verbose=0, **kwargs).stats for x in examples]
+
+
+def summarize(all_stats):
+    """Summarize the stats of a profile.
+
+    Args:
+        all_stats (list): `GenerationStats` of the calls.
+
+    Returns:
+        dict: The p50/p95 latency of each stage and of the whole call, the
+            p50/max MILP sizes, and the throughput.
+    """
+    stage_times = {}
+    for stats in all_stats:
+        for name, times in stats.get_stage_times().items():
+            stage_times.setdefault(name, []).append(times["wall_time"])
+
+    milps = [milp for stats in all_stats for milp in stats.milps]
+    num_variables = [milp["num_variables"] for milp in milps] or [0]
+    num_constraints = [milp["num_constraints"] for milp in milps] or [0]
+
+    wall_times = [stats.wall_time for stats in all_stats]
+    total_time = sum(wall_times)
+    num_cfs = sum(stats.num_cfs for stats in all_stats)
+
+    return {
+        "num_calls": len(all_stats),
+        "num_cfs": num_cfs,
+        "latency": _get_percentiles(wall_times),
+        # Stages that a call skips count as zero seconds
+        "stages": {
+            name: _get_percentiles(times + [0.0] * (len(all_stats) - len(times)))
+            for name, times in stage_times.items()
+        },
+        "milp": {
+            "num_milps": len(milps),
+            "p50_variables": float(np.percentile(num_variables, 50)),
+            "max_variables": int(np.max(num_variables)),
+            "p50_constraints": float(np.percentile(num_constraints, 50)),
+            "max_constraints": int(np.max(num_constraints)),
+        },
+        "throughput": {
+            "calls_per_second": len(all_stats) / total_time,
+            "cfs_per_second": num_cfs / total_time,
+        },
+    }
+
+
+def _get_percentiles(values):
+    """Compute the p50 and p95 of a list of seconds, in milliseconds."""
+    p50, p95 = np.percentile(values, [50, 95]) * 1000
+    return {"p50_ms": float(p50), "p95_ms": float(p95)}
+
+
+def print_summary(dataset, profile, summary):
+    """Print the summary of one profile as a table."""
+    latency = summary["latency"]
+    milp = summary["milp"]
+    throughput = summary["throughput"]
+
+    print(
+        "\n{} / {}: {} calls, {} CFs, p50 {:.1f} ms, p95 {:.1f} ms, "
+        "{:.2f} calls/s, {:.2f} CFs/s".format(
+            dataset,
+            profile,
+            summary["num_calls"],
+            summary["num_cfs"],
+            latency["p50_ms"],
+            latency["p95_ms"],
+            throughput["calls_per_second"],
+            throughput["cfs_per_second"],
+        )
+    )
+    print(
+        "MILP variables p50 {:.0f}, max {}; constraints p50 {:.0f}, max {}".format(
+            milp["p50_variables"],
+            milp["max_variables"],
+            milp["p50_constraints"],
+            milp["max_constraints"],
+        )
+    )
+
+    print("{:>24} {:>10} {:>10}".format("stage", "p50 (ms)", "p95 (ms)"))
+    for name in TABLE_STAGES:
+        if name in summary["stages"]:
+            cur_times = summary["stages"][name]
+            print(
+                "{:>24} {:>10.1f} {:>10.1f}".format(
+                    name, cur_times["p50_ms"], cur_times["p95_ms"]
+                )
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS)
+    )
+    parser.add_argument(
+        "--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES)
+    )
+    parser.add_argument("--num-examples", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--cache-dir", type=str, default=str(CACHE_PATH))
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    for dataset in args.datasets:
+        my_coach, x_all, x_reject = load_coach(dataset, args.cache_dir)
+
+        # The same rows are used for all profiles and runs
+        rs = np.random.RandomState(SEED)
+        num_examples = min(args.num_examples, x_reject.shape[0])
+        examples = x_reject[rs.choice(x_reject.shape[0], num_examples, replace=False)]
+
+        for profile in args.profiles:
+            kwargs = get_profile_kwargs(profile, my_coach, x_all)
+
+            start = time()
+            all_stats = run_profile(my_coach, examples, kwargs, args.warmup)
+            elapsed = time() - start
+
+            summary = summarize(all_stats)
+            print_summary(dataset, profile, summary)
+
+            if args.output is not None:
+                record = {
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "numpy": np.__version__,
+                    "pulp": pulp.__version__,
+                    "interpret": interpret_version,
+                    "dataset": dataset,
+                    "profile": profile,
+                    "seed": SEED,
+                    "elapsed": elapsed,
+                    **summary,
+                }
+                with open(args.output, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Startup benchmark of `import gamcoach`.
+
+Run `python -X importtime -c "import gamcoach"` in fresh interpreters, and
+report the median cumulative import time of `gamcoach`, the slowest imported
+packages, and whether any heavy dependency (pulp, tqdm, scipy, pandas,
+interpret) was imported. Use `--output` to append one JSON record per run to a
+file, so the startup time can be tracked over time.
+
+Usage:
+    python benchmarks/bench_import.py --repeats 5 --output import-times.jsonl
+"""
+
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO_PATH = Path(__file__).parent.parent
+
+# Packages that `import gamcoach` should not load
+HEAVY_PACKAGES = ["pulp", "tqdm", "scipy", "pandas", "interpret"]
+
+IMPORT_TIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| *(\S+)")
+
+
+def measure_import():
+    """Import gamcoach in a fresh interpreter and parse its `-X importtime`.
+
+    Returns:
+        dict: `package` -> cumulative import time (microseconds) of each
+            top-level package.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import gamcoach"],
+        cwd=REPO_PATH,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is None:
+            continue
+
+        cumulative, name = match.group(2, 3)
+        package = name.split(".")[0]
+
+        # The top module of a package includes the time of its submodules
+        times[package] = max(times.get(package, 0), int(cumulative))
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    runs = [measure_import() for _ in range(args.repeats)]
+    median_times = {
+        package: statistics.median(run.get(package, 0) for run in runs)
+        for package in runs[0]
+    }
+    heavy = [package for package in HEAVY_PACKAGES if package in median_times]
+
+    print("import gamcoach: {:.1f} ms".format(median_times["gamcoach"] / 1000))
+    print("heavy packages imported: {}".format(", ".join(heavy) or "none"))
+    print("\n{:>24} {:>12}".format("package", "time (ms)"))
+
+    top = sorted(median_times.items(), key=lambda x: x[1], reverse=True)
+    for package, cur_time in top[: args.top]:
+        print("{:>24} {:>12.1f}".format(package, cur_time / 1000))
+
+    if args.output is not None:
+        record = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeats": args.repeats,
+            "import_ms": median_times["gamcoach"] / 1000,
+            "heavy_packages": heavy,
+        }
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Memory and allocation benchmark of the option representations.
+
+Compare the columnar `OptionTable` with the nested list options
+`[target, score_gain, distance, bin_index, inter_score_gains]` used before. We
+generate the options of a few rejected lending club applicants, and then
+measure the retained bytes and the number of live memory blocks when we copy
+each representation. Options of all features are generated, but we only let
+two features vary to keep the MILP small.
+
+Usage:
+    python benchmarks/bench_option_table.py --num-examples 5
+"""
+
+import argparse
+import copy
+import json
+import tracemalloc
+from pathlib import Path
+from time import time
+
+import numpy as np
+from interpret.glassbox import ExplainableBoostingClassifier
+
+import gamcoach as coach
+
+SEED = 101221
+DATA_PATH = Path(__file__).parent.parent / "tests/data/lending-club-data-5000-ca.json"
+
+
+def measure_allocations(options):
+    """Measure the retained bytes and live blocks of a copy of `options`."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    options_copy = copy.deepcopy(options)
+
+    after = tracemalloc.take_snapshot()
+    cur_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    del options_copy
+
+    return cur_bytes, blocks
+
+
+class OptionRecordingCoach(coach.GAMCoach):
+    """GAMCoach that keeps the options of the last formulated MILP."""
+
+    last_options = None
+
+    def create_milp(
+        self,
+        cf_direction,
+        needed_score_gain,
+        features_to_vary,
+        options,
+        *args,
+        **kwargs
+    ):
+        self.last_options = options
+        return super().create_milp(
+            cf_direction, needed_score_gain, features_to_vary, options, *args, **kwargs
+        )
+
+
+def load_coach():
+    """Train a small EBM on the bundled lending club data."""
+    data = json.load(open(DATA_PATH, "r"))
+
+    x_all = np.array(data["x_all"], dtype=object)
+    y_all = np.array(data["y_all"])
+
+    feature_types = [
+        "continuous" if t == "continuous" else "nominal" for t in data["feature_types"]
+    ]
+    for i, t in enumerate(feature_types):
+        if t == "continuous":
+            x_all[:, i] = x_all[:, i].astype(float)
+
+    ebm = ExplainableBoostingClassifier(
+        feature_names=data["feature_names"],
+        feature_types=feature_types,
+        interactions=10,
+        random_state=SEED,
+    )
+    ebm.fit(x_all, y_all)
+
+    return OptionRecordingCoach(ebm, x_all), x_all[ebm.predict(x_all) == 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--num-examples", type=int, default=5)
+    args = parser.parse_args()
+
+    my_coach, x_reject = load_coach()
+    rs = np.random.RandomState(SEED)
+
+    print(
+        "{:>8} {:>10} {:>14} {:>14} {:>12} {:>12}".format(
+            "example",
+            "options",
+            "list bytes",
+            "table bytes",
+            "list blocks",
+            "table blocks",
+        )
+    )
+
+    for i in rs.choice(x_reject.shape[0], args.num_examples, replace=False):
+        start = time()
+        my_coach.generate_cfs(
+            x_reject[i],
+            total_cfs=1,
+            features_to_vary=["loan_amnt", "fico_score"],
+            verbose=0,
+        )
+        elapsed = time() - start
+
+        tables = my_coach.last_options
+        lists = {f_name: tables[f_name].to_list() for f_name in tables}
+
+        list_bytes, list_blocks = measure_allocations(lists)
+        table_bytes, table_blocks = measure_allocations(tables)
+
+        print(
+            "{:>8} {:>10} {:>14,} {:>14,} {:>12,} {:>12,}   ({:.2f}s)".format(
+                i,
+                sum(len(tables[f_name]) for f_name in tables),
+                list_bytes,
+                table_bytes,
+                list_blocks,
+                table_blocks,
+                elapsed,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Scaling benchmark of `generate_cfs()` on synthetic EBMs.
+
+Create synthetic EBMs with `make_synthetic_ebm()`, varying one model parameter
+(e.g., the number of bins) while keeping the others at their base values. For
+each model, generate CFs for a few rejected rows, and report the median option
+generation time, MILP build time, solve time, MILP size, and the peak traced
+memory of one call. The peak memory is measured in an extra call with
+tracemalloc, so it does not slow down the timed calls. It does not include the
+memory of the CBC subprocess.
+
+By default, we use `sim_threshold_factor='auto'`, which prunes the options of
+large models towards the variable budget, as a service would. Use
+`--sim-threshold-factor 0.005` to benchmark the library default instead.
+
+Usage:
+    python benchmarks/bench_scaling.py --param num_bins --values 16 64 256 1024
+    python benchmarks/bench_scaling.py --param num_features \\
+        --values 25 50 100 200 --output scaling.jsonl --plot scaling.png
+"""
+
+import argparse
+import json
+import platform
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+import gamcoach as coach
+from gamcoach.synthetic import make_synthetic_data, make_synthetic_ebm
+
+SEED = 101221
+
+# Model parameters that can be varied, and their base values
+BASE_PARAMS = {
+    "num_features": 30,
+    "categorical_ratio": 0.2,
+    "num_bins": 64,
+    "num_levels": 8,
+    "num_interactions": 10,
+    "interaction_bins": 32,
+    "score_scale": 1.0,
+    "interaction_scale": 0.5,
+}
+
+# Stages of option generation
+OPTION_STAGES = [
+    "generate_cont_options",
+    "generate_cat_options",
+    "generate_inter_options",
+]
+
+# Measured quantities: `name` -> plot label
+METRICS = {
+    "option_time": "option generation (s)",
+    "milp_build_time": "MILP build (s)",
+    "solve_time": "MILP solve (s)",
+    "peak_memory": "peak traced memory (MB)",
+    "num_variables": "MILP variables",
+}
+
+
+def measure_model(params, num_rows, num_examples, kwargs):
+    """Measure generate_cfs() on one synthetic model.
+
+    Args:
+        params (dict): Arguments of `make_synthetic_ebm()`.
+        num_rows (int): Number of synthetic training rows.
+        num_examples (int): Number of rejected rows to generate CFs for.
+        kwargs (dict): Extra `generate_cfs()` arguments.
+
+    Returns:
+        dict: Median times (seconds), MILP variables, and peak memory (MB).
+    """
+    ebm = make_synthetic_ebm(**params, random_state=SEED)
+    x_train = make_synthetic_data(ebm, num_rows, random_state=SEED)
+    my_coach = coach.GAMCoach(ebm, x_train)
+
+    x_reject = x_train[ebm.predict(x_train) == 0][:num_examples]
+
+    option_times, milp_build_times, solve_times, num_variables = [], [], [], []
+
+    for x in x_reject:
+        stats = my_coach.generate_cfs(x, verbose=0, **kwargs).stats
+        stage_times = stats.get_stage_times()
+
+        option_times.append(
+            sum(stage_times[s]["wall_time"] for s in OPTION_STAGES if s in stage_times)
+        )
+        milp_build_times.append(stage_times["create_milp"]["wall_time"])
+        solve_times.append(stage_times["solve_milp"]["wall_time"])
+        num_variables.append(max(milp["num_variables"] for milp in stats.milps))
+
+    tracemalloc.start()
+    my_coach.generate_cfs(x_reject[0], verbose=0, **kwargs)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "option_time": float(np.median(option_times)),
+        "milp_build_time": float(np.median(milp_build_times)),
+        "solve_time": float(np.median(solve_times)),
+        "num_variables": float(np.median(num_variables)),
+        "peak_memory": peak_bytes / 1e6,
+    }
+
+
+def plot_results(param, results, path):
+    """Plot each metric against the varied parameter. It requires matplotlib.
+
+    Args:
+        param (str): The varied parameter.
+        results (list): [(value, metrics)] of each model.
+        path (str): The output image path.
+    """
+    from matplotlib import pyplot as plt
+
+    fig, axes = plt.subplots(1, len(METRICS), figsize=(4 * len(METRICS), 3.5))
+    values = [value for value, _ in results]
+
+    for ax, (name, label) in zip(axes, METRICS.items()):
+        ax.plot(values, [cur_metrics[name] for _, cur_metrics in results], "o-")
+        ax.set_xlabel(param)
+        ax.set_ylabel(label)
+
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--param", choices=list(BASE_PARAMS), default="num_bins")
+    parser.add_argument("--values", type=float, nargs="+", default=[16, 64, 256, 1024])
+    parser.add_argument("--num-rows", type=int, default=2000)
+    parser.add_argument("--num-examples", type=int, default=5)
+    parser.add_argument("--total-cfs", type=int, default=1)
+    parser.add_argument("--sim-threshold-factor", type=str, default="auto")
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--plot", type=str, default=None)
+    args = parser.parse_args()
+
+    sim_threshold_factor = args.sim_threshold_factor
+    if sim_threshold_factor != "auto":
+        sim_threshold_factor = float(sim_threshold_factor)
+
+    kwargs = {
+        "total_cfs": args.total_cfs,
+        "sim_threshold_factor": sim_threshold_factor,
+    }
+
+    print(
+        "{:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+            args.param,
+            "options (s)",
+            "build (s)",
+            "solve (s)",
+            "memory (MB)",
+            "variables",
+        )
+    )
+
+    results = []
+    for value in args.values:
+        # Parameters other than the ratios are integers
+        if isinstance(BASE_PARAMS[args.param], int):
+            value = int(value)
+
+        params = {**BASE_PARAMS, args.param: value}
+        cur_metrics = measure_model(params, args.num_rows, args.num_examples, kwargs)
+        results.append((value, cur_metrics))
+
+        print(
+            "{:>12} {:>12.3f} {:>12.3f} {:>12.3f} {:>12.1f} {:>12.0f}".format(
+                value,
+                cur_metrics["option_time"],
+                cur_metrics["milp_build_time"],
+                cur_metrics["solve_time"],
+                cur_metrics["peak_memory"],
+                cur_metrics["num_variables"],
+            )
+        )
+
+        if args.output is not None:
+            record = {
+                "time": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "numpy": np.__version__,
+                "params": params,
+                "generate_cfs": {
+                    **kwargs,
+                    "num_rows": args.num_rows,
+                    "num_examples": args.num_examples,
+                },
+                **cur_metrics,
+            }
+            with open(args.output, "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    if args.plot is not None:
+        plot_results(args.param, results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
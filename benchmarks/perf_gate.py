@@ -0,0 +1,431 @@
+"""Performance regression gate with stored baselines.
+
+`run` measures a fixed set of workloads on the bundled lending club data:
+`GAMCoach.__init__`, `get_model_data()`, and `generate_cfs()` on a fixed
+sample of rejected rows. Each workload runs a warm-up call, `--repeats` timed
+runs, and one extra run with tracemalloc for its peak traced memory. The
+`generate_cfs` workload also records the total size of its MILPs. The results
+are saved as a versioned baseline JSON file, tagged with a machine fingerprint,
+the Python, numpy, interpret, pulp, and CBC versions, and the git commit.
+
+`compare` diffs a new result file against a baseline. For the latency, we
+bootstrap a confidence interval of the ratio of the median times (new /
+baseline) from the repeated runs. A workload regresses if the whole interval
+is above `1 + --threshold`, so noisy runs do not fail the gate. Peak memory
+and MILP sizes are (almost) deterministic, so we compare them directly with
+`--memory-threshold` and `--size-threshold`. The command exits with code 1 if
+any workload regresses. Baselines from another machine or other dependency
+versions are compared with a warning.
+
+`check` runs the workloads and compares them with a baseline in one step.
+
+Usage:
+    git checkout main
+    python benchmarks/perf_gate.py run --output perf-baseline.json
+    git checkout my-branch
+    python benchmarks/perf_gate.py check --baseline perf-baseline.json
+    python benchmarks/perf_gate.py compare perf-baseline.json perf-new.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pulp
+from interpret import __version__ as interpret_version
+from interpret.glassbox import ExplainableBoostingClassifier
+
+import gamcoach as coach
+
+SEED = 101221
+REPO_PATH = Path(__file__).parent.parent
+DATA_PATH = REPO_PATH / "tests/data/lending-club-data-5000-ca.json"
+
+# Name and version of the baseline format
+BASELINE_FORMAT = "gamcoach-perf-baseline"
+BASELINE_VERSION = 1
+
+# Environment fields that must match for a fair comparison
+ENVIRONMENT_FIELDS = ["fingerprint", "python", "numpy", "interpret", "pulp", "cbc"]
+
+# Number of bootstrap resamples of the latency ratio
+NUM_BOOTSTRAP = 2000
+
+
+def get_environment():
+    """Describe the machine and the dependency versions.
+
+    Returns:
+        dict: The environment. `fingerprint` is a hash of the machine fields.
+    """
+    machine = {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "node": platform.node(),
+    }
+
+    return {
+        **machine,
+        "fingerprint": hashlib.sha256(
+            json.dumps(machine, sort_keys=True).encode()
+        ).hexdigest()[:16],
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "interpret": interpret_version,
+        "pulp": pulp.__version__,
+        "cbc": _get_cbc_version(),
+        "gamcoach": coach.__version__,
+        "commit": _get_git_commit(),
+    }
+
+
+def _get_cbc_version():
+    """Get the version of pulp's CBC solver, or `None`."""
+    try:
+        result = subprocess.run(
+            [pulp.apis.PULP_CBC_CMD().path, "-quit"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    match = re.search(r"Version: (\S+)", result.stdout)
+    return match.group(1) if match is not None else None
+
+
+def _get_git_commit():
+    """Get the current git commit of the repository, or `None`."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_PATH,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+    return result.stdout.strip() or None
+
+
+def load_data():
+    """Train a small seeded EBM on the bundled lending club data.
+
+    Returns:
+        tuple: (ebm, x_all)
+    """
+    data = json.load(open(DATA_PATH, "r"))
+
+    x_all = np.array(data["x_all"], dtype=object)
+    y_all = np.array(data["y_all"])
+
+    feature_types = [
+        "continuous" if t == "continuous" else "nominal" for t in data["feature_types"]
+    ]
+    for i, t in enumerate(feature_types):
+        if t == "continuous":
+            x_all[:, i] = x_all[:, i].astype(float)
+
+    ebm = ExplainableBoostingClassifier(
+        feature_names=data["feature_names"],
+        feature_types=feature_types,
+        interactions=2,
+        random_state=SEED,
+    )
+    ebm.fit(x_all, y_all)
+
+    return ebm, x_all
+
+
+def get_workloads(ebm, x_all, num_examples):
+    """Create the workloads.
+
+    Args:
+        ebm (ExplainableBoostingClassifier): The trained EBM.
+        x_all (np.ndarray): The training data.
+        num_examples (int): Number of rejected rows for `generate_cfs`.
+
+    Returns:
+        dict: `name` -> a function that runs the workload once. It returns
+            the total MILP size, or `None` if it does not solve MILPs.
+    """
+    my_coach = coach.GAMCoach(ebm, x_all)
+
+    rs = np.random.RandomState(SEED)
+    x_reject = x_all[ebm.predict(x_all) == 0]
+    examples = x_reject[rs.choice(x_reject.shape[0], num_examples, replace=False)]
+
+    def run_init():
+        coach.GAMCoach(ebm, x_all)
+
+    def run_model_data():
+        coach.get_model_data(ebm, x_all, {"classes": ["rejection", "approval"]})
+
+    def run_generate_cfs():
+        size = {"num_variables": 0, "num_constraints": 0}
+
+        for x in examples:
+            stats = my_coach.generate_cfs(x, total_cfs=2, verbose=0).stats
+            for milp in stats.milps:
+                size["num_variables"] += milp["num_variables"]
+                size["num_constraints"] += milp["num_constraints"]
+
+        return size
+
+    return {
+        "init": run_init,
+        "get_model_data": run_model_data,
+        "generate_cfs": run_generate_cfs,
+    }
+
+
+def measure(workload, repeats, warmup=1):
+    """Time a workload, and measure its peak traced memory.
+
+    Args:
+        workload (Callable): A function that runs the workload once.
+        repeats (int): Number of timed runs.
+        warmup (int, optional): Number of untimed runs first.
+
+    Returns:
+        dict: The wall time of each run, the peak traced memory (bytes), and
+            the MILP size if the workload solves MILPs.
+    """
+    for _ in range(warmup):
+        workload()
+
+    wall_times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        milp = workload()
+        wall_times.append(perf_counter() - start)
+
+    tracemalloc.start()
+    workload()
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {"wall_times": wall_times, "peak_memory": peak_memory}
+    if milp is not None:
+        result["milp"] = milp
+
+    return result
+
+
+def run(args):
+    """Measure all workloads, and save the results as a baseline file."""
+    ebm, x_all = load_data()
+    workloads = get_workloads(ebm, x_all, args.num_examples)
+
+    results = {}
+    for name, workload in workloads.items():
+        results[name] = measure(workload, args.repeats, args.warmup)
+        print(
+            "{:>16} median {:.3f}s, peak memory {:.1f} MB".format(
+                name,
+                np.median(results[name]["wall_times"]),
+                results[name]["peak_memory"] / 1e6,
+            )
+        )
+
+    baseline = {
+        "format": BASELINE_FORMAT,
+        "version": BASELINE_VERSION,
+        "time": datetime.now(timezone.utc).isoformat(),
+        "environment": get_environment(),
+        "settings": {
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+            "num_examples": args.num_examples,
+            "seed": SEED,
+        },
+        "workloads": results,
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(baseline, f, indent=1)
+
+    return baseline
+
+
+def load_baseline(path):
+    """Load a baseline file and check its format."""
+    with open(path, "r") as f:
+        baseline = json.load(f)
+
+    if (
+        baseline.get("format") != BASELINE_FORMAT
+        or baseline["version"] > BASELINE_VERSION
+    ):
+        raise ValueError("Unsupported baseline file {}".format(path))
+
+    return baseline
+
+
+def get_ratio_interval(base_times, new_times, confidence, random_state=SEED):
+    """Bootstrap a confidence interval of the ratio of the median times.
+
+    Args:
+        base_times (list): Wall times of the baseline runs.
+        new_times (list): Wall times of the new runs.
+        confidence (float): The confidence level, e.g., 0.95.
+        random_state (int, optional): Seed of the resamples.
+
+    Returns:
+        tuple: (ratio, lower bound, upper bound) of new / baseline.
+    """
+    rs = np.random.RandomState(random_state)
+    base_times = np.asarray(base_times)
+    new_times = np.asarray(new_times)
+
+    base_samples = rs.choice(base_times, (NUM_BOOTSTRAP, len(base_times)))
+    new_samples = rs.choice(new_times, (NUM_BOOTSTRAP, len(new_times)))
+    ratios = np.median(new_samples, axis=1) / np.median(base_samples, axis=1)
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(ratios, [alpha, 1 - alpha])
+
+    return np.median(new_times) / np.median(base_times), low, high
+
+
+def compare(baseline, new, args):
+    """Compare new results with a baseline.
+
+    Args:
+        baseline (dict): The baseline results.
+        new (dict): The new results.
+        args (argparse.Namespace): The thresholds and the confidence level.
+
+    Returns:
+        list: Messages of the regressions.
+    """
+    mismatches = [
+        field
+        for field in ENVIRONMENT_FIELDS
+        if baseline["environment"].get(field) != new["environment"].get(field)
+    ]
+    if len(mismatches) > 0:
+        print(
+            "Warning: the baseline has a different {}\n".format(", ".join(mismatches))
+        )
+
+    print(
+        "{:>16} {:>10} {:>20} {:>10} {:>10}".format(
+            "workload",
+            "time",
+            "{:.0%} interval".format(args.confidence),
+            "memory",
+            "MILP",
+        )
+    )
+
+    regressions = []
+
+    for name, new_result in new["workloads"].items():
+        if name not in baseline["workloads"]:
+            continue
+
+        base_result = baseline["workloads"][name]
+        ratio, low, high = get_ratio_interval(
+            base_result["wall_times"], new_result["wall_times"], args.confidence
+        )
+        memory_ratio = new_result["peak_memory"] / max(base_result["peak_memory"], 1)
+
+        if low > 1 + args.threshold:
+            regressions.append(
+                "{}: {:.2f}x slower ({:.2f}x to {:.2f}x)".format(name, ratio, low, high)
+            )
+
+        if memory_ratio > 1 + args.memory_threshold:
+            regressions.append(
+                "{}: {:.2f}x peak memory ({:.1f} MB)".format(
+                    name, memory_ratio, new_result["peak_memory"] / 1e6
+                )
+            )
+
+        milp_ratio = None
+        if "milp" in new_result and "milp" in base_result:
+            for field in ["num_variables", "num_constraints"]:
+                cur_ratio = new_result["milp"][field] / max(
+                    base_result["milp"][field], 1
+                )
+                milp_ratio = max(milp_ratio or 0, cur_ratio)
+
+                if cur_ratio > 1 + args.size_threshold:
+                    regressions.append(
+                        "{}: {:.2f}x MILP {} ({})".format(
+                            name, cur_ratio, field, new_result["milp"][field]
+                        )
+                    )
+
+        print(
+            "{:>16} {:>9.2f}x {:>20} {:>9.2f}x {:>10}".format(
+                name,
+                ratio,
+                "{:.2f}x to {:.2f}x".format(low, high),
+                memory_ratio,
+                "{:.2f}x".format(milp_ratio) if milp_ratio is not None else "-",
+            )
+        )
+
+    if len(regressions) > 0:
+        print("\nRegressions:\n" + "\n".join(regressions))
+    else:
+        print("\nNo significant regressions")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=["run", "compare", "check"])
+    parser.add_argument("files", nargs="*", help="baseline and new files to compare")
+    parser.add_argument("--baseline", type=str, default=None)
+    parser.add_argument("--output", type=str, default="perf-new.json")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--num-examples", type=int, default=10)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--memory-threshold", type=float, default=0.1)
+    parser.add_argument("--size-threshold", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+        return
+
+    if args.command == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs a baseline file and a new file")
+        baseline, new = load_baseline(args.files[0]), load_baseline(args.files[1])
+    else:
+        if args.baseline is None:
+            parser.error("check needs --baseline")
+        baseline = load_baseline(args.baseline)
+        new = run(args)
+        print()
+
+    if len(compare(baseline, new, args)) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Golden-result replay of `generate_cfs()`.
+
+Replay a stored corpus of (model, example, constraints) cases, and compare the
+new CFs with the golden outputs: the objective values (total distances), the
+changed features, and whether the CFs flip the prediction. We use it to check
+that a performance change, such as new pruning or caching, does not change
+the answers.
+
+`record` builds the corpus. The examples are the original rows of the CFs
+stored in `examples/data/*-coach-cfs.pkl`. Their EBMs were not saved, so we
+use the seeded EBMs of `bench_generate_cfs.py` and save each model as a
+compiled coach (`GAMCoach.save()`) next to the corpus. Replays load these
+files, so the bin and score tables and the distances are the same across
+interpret versions. Each case uses one of the constraint profiles of
+`bench_generate_cfs.py`.
+
+The stored corpus was recorded with the code after the pruning, caching, and
+option table changes of the user-026 to user-045 requests, not with the
+original solver. It pins the answers from that point on, but it cannot detect
+an answer change that these earlier changes introduced.
+
+`replay` runs every case again. It fails (exit code 1) if a CF is missing or
+no longer valid, if an objective value is higher than the golden value beyond
+the tolerances, or if a case is slower than `--max-slowdown` times its
+baseline time. Each case runs `--repeats` times. As in `perf_gate.py`, we
+bootstrap a confidence interval of the ratio of the median times, and a case
+is only slower if the whole interval is above `--max-slowdown`, so a single
+noisy run does not fail the replay. Different changed features with the same
+objective value are reported as ties, because the MILP can have several
+optimal solutions. Use `--update-times` to store the new times as the
+baseline.
+
+Usage:
+    python benchmarks/replay_golden.py record --num-cases 10
+    python benchmarks/replay_golden.py replay --max-slowdown 1.5
+"""
+
+import argparse
+import json
+import pickle
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+import gamcoach as coach
+from bench_generate_cfs import (
+    PROFILES,
+    REPO_PATH,
+    SEED,
+    get_profile_kwargs,
+    load_coach,
+)
+from perf_gate import get_ratio_interval
+
+GOLDEN_PATH = REPO_PATH / "benchmarks/golden"
+
+# Datasets with stored CFs in `examples/data`
+GOLDEN_DATASETS = ["adult", "german"]
+
+# Name and version of the corpus format
+CORPUS_FORMAT = "gamcoach-golden"
+CORPUS_VERSION = 1
+
+
+def load_examples(dataset, my_coach):
+    """Load the original rows of the stored CFs of a dataset.
+
+    Args:
+        dataset (str): The dataset name.
+        my_coach (GAMCoach): The coach of the dataset.
+
+    Returns:
+        np.ndarray: The rows as an object array, with float values for
+            continuous features and level names for categorical features.
+    """
+    with open(REPO_PATH / "examples/data/{}-coach-cfs.pkl".format(dataset), "rb") as f:
+        pairs = pickle.load(f)
+
+    rows = [pair[0] for pair in pairs if pair is not None]
+    examples = np.empty((len(rows), len(my_coach.ebm.feature_types_in_)), dtype=object)
+
+    for i, f_type in enumerate(my_coach.ebm.feature_types_in_):
+        for j, row in enumerate(rows):
+            # The stored rows keep the leading spaces of the raw adult data
+            if f_type == "continuous":
+                examples[j, i] = float(row.iloc[i])
+            else:
+                examples[j, i] = str(row.iloc[i]).lstrip()
+
+    return examples
+
+
+def run_case(my_coach, case, repeats=1):
+    """Generate the CFs of a case.
+
+    Args:
+        my_coach (GAMCoach): The coach of the case's dataset.
+        case (dict): The case with its `example` and `kwargs`.
+        repeats (int, optional): Number of runs.
+
+    Returns:
+        dict: The objective values, changed main features, and validity of the
+            CFs, the wall time of each run, and their median (seconds).
+    """
+    example = np.array(case["example"], dtype=object)
+    wall_times = []
+
+    for _ in range(repeats):
+        start = perf_counter()
+        cfs = my_coach.generate_cfs(example, verbose=0, **case["kwargs"])
+        wall_times.append(perf_counter() - start)
+
+    changed_features = []
+    for i in range(len(cfs)):
+        start, end = cfs.change_offsets[i], cfs.change_offsets[i + 1]
+        f_ids = cfs.change_features[start:end]
+        changed_features.append(
+            sorted(
+                cfs.feature_names[f]
+                for f in f_ids
+                if cfs.feature_types[f] != "interaction"
+            )
+        )
+
+    return {
+        "values": cfs.values.tolist(),
+        "changed_features": changed_features,
+        "is_valid": cfs.is_valid.tolist(),
+        "wall_time": float(np.median(wall_times)),
+        "wall_times": wall_times,
+    }
+
+
+def compare_case(
+    golden, result, rtol, atol, max_slowdown, min_slowdown, confidence=0.95
+):
+    """Compare the new result of a case with its golden output.
+
+    Args:
+        golden (dict): The golden output.
+        result (dict): The new output of `run_case()`.
+        rtol (float): Relative tolerance of the objective values.
+        atol (float): Absolute tolerance of the objective values.
+        max_slowdown (float): Max ratio of the new median time to the
+            baseline median time.
+        min_slowdown (float): Slowdowns shorter than this many seconds are
+            ignored as noise.
+        confidence (float, optional): Confidence level of the ratio interval.
+
+    Returns:
+        tuple: (failures, notes), two lists of messages.
+    """
+    failures, notes = [], []
+
+    if len(result["values"]) < len(golden["values"]):
+        failures.append(
+            "{} of {} CFs".format(len(result["values"]), len(golden["values"]))
+        )
+
+    for i, (old, new) in enumerate(zip(golden["values"], result["values"])):
+        tolerance = atol + rtol * abs(old)
+
+        if new > old + tolerance:
+            failures.append("CF {} objective {:.6g} > {:.6g}".format(i, new, old))
+        elif new < old - tolerance:
+            notes.append("CF {} objective {:.6g} < {:.6g}".format(i, new, old))
+        elif golden["changed_features"][i] != result["changed_features"][i]:
+            notes.append(
+                "CF {} tie: {} instead of {}".format(
+                    i, result["changed_features"][i], golden["changed_features"][i]
+                )
+            )
+
+    for i, (old, new) in enumerate(zip(golden["is_valid"], result["is_valid"])):
+        if old and not new:
+            failures.append("CF {} is not valid".format(i))
+
+    # Older corpora only store one baseline time
+    base_times = golden.get("wall_times", [golden["wall_time"]])
+    ratio, low, _ = get_ratio_interval(base_times, result["wall_times"], confidence)
+
+    slowdown = result["wall_time"] - golden["wall_time"]
+    if low > max_slowdown and slowdown > min_slowdown:
+        failures.append(
+            "{:.2f}x slower ({:.3f}s vs {:.3f}s, at least {:.2f}x)".format(
+                ratio, result["wall_time"], golden["wall_time"], low
+            )
+        )
+
+    return failures, notes
+
+
+def record(args):
+    """Build the golden corpus and save it with the compiled coaches."""
+    golden_path = Path(args.golden_dir)
+    golden_path.mkdir(parents=True, exist_ok=True)
+
+    corpus = {
+        "format": CORPUS_FORMAT,
+        "version": CORPUS_VERSION,
+        "models": {},
+        "cases": [],
+    }
+    profiles = list(PROFILES)
+
+    for dataset in args.datasets:
+        my_coach, x_all, _ = load_coach(dataset)
+
+        # Replay with the saved coach, so recording and replaying use the same
+        # tables and distances
+        model_file = "{}-coach.npz".format(dataset)
+        my_coach.save(str(golden_path / model_file))
+        my_coach = coach.GAMCoach.load(str(golden_path / model_file))
+        corpus["models"][dataset] = {
+            "path": model_file,
+            "fingerprint": my_coach.model_fingerprint,
+        }
+
+        examples = load_examples(dataset, my_coach)
+        examples = examples[my_coach.ebm.predict(examples) == 0]
+
+        rs = np.random.RandomState(SEED)
+        num_cases = min(args.num_cases, examples.shape[0])
+
+        for i, row in enumerate(rs.choice(examples.shape[0], num_cases, replace=False)):
+            profile = profiles[i % len(profiles)]
+            case = {
+                "id": "{}-{}-{}".format(dataset, row, profile),
+                "dataset": dataset,
+                "profile": profile,
+                "example": examples[row].tolist(),
+                "kwargs": get_profile_kwargs(profile, my_coach, x_all),
+            }
+            case["golden"] = run_case(my_coach, case, args.repeats)
+            corpus["cases"].append(case)
+
+            print(
+                "{:>32} {:>10.3f}s {}".format(
+                    case["id"], case["golden"]["wall_time"], case["golden"]["values"]
+                )
+            )
+
+    with open(golden_path / "corpus.json", "w") as f:
+        json.dump(corpus, f, indent=1)
+
+
+def replay(args):
+    """Replay the golden corpus, and return the number of failed cases."""
+    golden_path = Path(args.golden_dir)
+    with open(golden_path / "corpus.json", "r") as f:
+        corpus = json.load(f)
+
+    if corpus.get("format") != CORPUS_FORMAT or corpus["version"] > CORPUS_VERSION:
+        raise ValueError("Unsupported golden corpus {}".format(golden_path))
+
+    coaches = {}
+    for dataset, model in corpus["models"].items():
+        coaches[dataset] = coach.GAMCoach.load(str(golden_path / model["path"]))
+
+        if coaches[dataset].model_fingerprint != model["fingerprint"]:
+            raise ValueError(
+                "The model of {} does not match the corpus".format(dataset)
+            )
+
+    num_failed = 0
+    records = []
+
+    for case in corpus["cases"]:
+        if args.datasets is not None and case["dataset"] not in args.datasets:
+            continue
+
+        result = run_case(coaches[case["dataset"]], case, args.repeats)
+        failures, notes = compare_case(
+            case["golden"],
+            result,
+            args.rtol,
+            args.atol,
+            args.max_slowdown,
+            args.min_slowdown,
+            args.confidence,
+        )
+        num_failed += len(failures) > 0
+
+        print(
+            "{:>32} {:>5} {:>10.3f}s {:>7.2f}x  {}".format(
+                case["id"],
+                "FAIL" if failures else "ok",
+                result["wall_time"],
+                result["wall_time"] / case["golden"]["wall_time"],
+                "; ".join(failures + notes),
+            )
+        )
+
+        records.append(
+            {
+                "id": case["id"],
+                "wall_time": result["wall_time"],
+                "baseline_time": case["golden"]["wall_time"],
+                "failures": failures,
+                "notes": notes,
+            }
+        )
+
+        if args.update_times:
+            case["golden"]["wall_time"] = result["wall_time"]
+            case["golden"]["wall_times"] = result["wall_times"]
+
+    print("\n{} of {} cases failed".format(num_failed, len(records)))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=1)
+
+    if args.update_times:
+        with open(golden_path / "corpus.json", "w") as f:
+            json.dump(corpus, f, indent=1)
+
+    return num_failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=["record", "replay"])
+    parser.add_argument("--golden-dir", type=str, default=str(GOLDEN_PATH))
+    parser.add_argument("--datasets", nargs="+", choices=GOLDEN_DATASETS, default=None)
+    parser.add_argument("--num-cases", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--rtol", type=float, default=1e-6)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    parser.add_argument("--min-slowdown", type=float, default=0.05)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--update-times", action="store_true")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.datasets is None:
+            args.datasets = GOLDEN_DATASETS
+        record(args)
+    elif replay(args) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
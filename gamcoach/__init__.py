@@ -148,3 +148,9 @@ __version__ = "0.1.4"
 
 from gamcoach.gamcoach import *
 from gamcoach.counterfactuals import *
+from gamcoach.payload import *
+from gamcoach.timing import *
+from gamcoach.metrics import *
+from gamcoach.policy import *
+from gamcoach.profiling import *
+from gamcoach.synthetic import *
@@ -0,0 +1,277 @@
+"""ColumnarData Class.
+
+This module implements the ColumnarData class. We use it to hold data that
+users pass as a pandas DataFrame or a dictionary of typed column arrays,
+without building an object matrix that mixes floats and strings.
+
+Continuous columns are float64 arrays (views of the input when it is already
+float64). Categorical columns are integer codes that match the EBM's `bins_`:
+0 is a missing value, 1 to n are the EBM's levels, and n + 1 is the unknown
+bin. Levels that the EBM has not seen get their own codes after n + 1, so the
+original values can still be recovered.
+"""
+
+import sys
+import json
+import hashlib
+import numpy as np
+
+
+class ColumnarData:
+    """Class to represent the main feature columns of a dataset."""
+
+    def __init__(
+        self,
+        feature_names: list,
+        feature_types: list,
+        columns: list,
+        levels: list,
+    ):
+        """Initialize a ColumnarData object.
+
+        Args:
+            feature_names (list): Names of the main features.
+            feature_types (list): EBM types of the main features ('continuous'
+                or 'nominal').
+            columns (list): One array for each feature: float64 values for
+                continuous features and integer codes for categorical features.
+            levels (list): Level names of each categorical feature, indexed by
+                their codes (`None` for the missing and unknown codes). It is
+                `None` for continuous features.
+        """
+        self.feature_names: list = list(feature_names)
+        """Names of the main features."""
+
+        self.feature_types: list = list(feature_types)
+        """EBM types of the main features."""
+
+        self.columns: list = columns
+        """Float64 values or integer level codes of each feature."""
+
+        self.levels: list = levels
+        """Level names of each categorical feature, indexed by their codes."""
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return "ColumnarData with {} rows and {} features".format(*self.shape)
+
+    @property
+    def shape(self):
+        """The (number of rows, number of features) of the data."""
+        num_rows = len(self.columns[0]) if len(self.columns) > 0 else 0
+        return (num_rows, len(self.columns))
+
+    @property
+    def nbytes(self):
+        """Total bytes used by the column arrays."""
+        return sum(column.nbytes for column in self.columns)
+
+    def get_column(self, feature_index):
+        """Returns the float64 values or the level codes of one feature."""
+        return self.columns[feature_index]
+
+    def get_bin_indexes(self, feature_index):
+        """Returns the EBM bin indexes of one categorical feature. Levels that
+        the EBM has not seen are in the unknown bin."""
+        # The unknown code is the first unnamed code after the missing code
+        unknown = self.levels[feature_index].index(None, 1)
+        return np.minimum(self.columns[feature_index], unknown)
+
+    def get_values(self, feature_index):
+        """Returns the original values of one feature. Categorical values are
+        level names (`None` if missing)."""
+        column = self.columns[feature_index]
+
+        if self.levels[feature_index] is None:
+            return column
+
+        level_names = np.empty(len(self.levels[feature_index]), dtype=object)
+        level_names[:] = self.levels[feature_index]
+        return level_names[column]
+
+    def count_levels(self, feature_index):
+        """Count the occurrences of each level of one categorical feature.
+
+        Returns:
+            dict: `level_name` -> `count`. Missing values are not counted.
+        """
+        levels = self.levels[feature_index]
+        counts = np.bincount(self.columns[feature_index], minlength=len(levels))
+
+        return {
+            level: int(count)
+            for level, count in zip(levels, counts)
+            if level is not None and count > 0
+        }
+
+    def take(self, rows):
+        """Create a new ColumnarData with the given rows.
+
+        Args:
+            rows (Union[slice, np.ndarray]): A slice (columns are views), or
+                integer row indexes or a boolean mask.
+
+        Returns:
+            ColumnarData: The selected rows.
+        """
+        return ColumnarData(
+            self.feature_names,
+            self.feature_types,
+            [column[rows] for column in self.columns],
+            self.levels,
+        )
+
+    def get_fingerprint(self):
+        """Compute a SHA-256 fingerprint of the feature metadata and columns.
+
+        Returns:
+            str: The hex digest.
+        """
+        sha = hashlib.sha256()
+        metadata = [self.feature_names, self.feature_types, self.levels]
+        sha.update(json.dumps(metadata).encode())
+
+        for column in self.columns:
+            dtype = "<f8" if column.dtype.kind == "f" else "<i8"
+            sha.update(np.ascontiguousarray(column, dtype=dtype).tobytes())
+
+        return sha.hexdigest()
+
+    def to_numpy(self):
+        """Convert the data to an object matrix, the same as the array inputs
+        of GAM Coach. It is only meant for a few rows, such as one example."""
+        x = np.empty(self.shape, dtype=object)
+
+        for i in range(len(self.columns)):
+            x[:, i] = self.get_values(i)
+
+        return x
+
+    @staticmethod
+    def from_data(ebm, data):
+        """Encode a DataFrame or a dictionary of column arrays.
+
+        Args:
+            ebm (Union[ExplainableBoostingClassifier,
+                ExplainableBoostingRegressor, CompiledEBM]): The trained EBM.
+            data (Union[pd.DataFrame, dict, ColumnarData]): The data, with one
+                column for each main feature. A dictionary maps feature names
+                to arrays (or scalars for one example). Categorical columns can
+                be pandas categoricals, or arrays of level values.
+
+        Returns:
+            ColumnarData: The encoded data. `data` is returned as is if it is
+                already a ColumnarData.
+        """
+        if isinstance(data, ColumnarData):
+            return data
+
+        columns = []
+        levels = []
+
+        for i, f_name in enumerate(ebm.feature_names_in_):
+            if f_name not in data:
+                raise ValueError("The data does not have the column {}".format(f_name))
+
+            values = data[f_name]
+            if np.ndim(values) == 0:
+                values = [values]
+
+            if ebm.feature_types_in_[i] == "continuous":
+                columns.append(np.asarray(values, dtype=np.float64))
+                levels.append(None)
+            else:
+                codes, level_names = _encode_levels(values, ebm.bins_[i][0])
+                columns.append(codes)
+                levels.append(level_names)
+
+        return ColumnarData(
+            ebm.feature_names_in_, ebm.feature_types_in_, columns, levels
+        )
+
+
+def is_columnar(x):
+    """True if `x` is a DataFrame, a dictionary of columns, or a ColumnarData."""
+    return isinstance(x, (dict, ColumnarData)) or _is_dataframe(x)
+
+
+def _encode_levels(values, level_to_bin):
+    """Encode a categorical column as the EBM's bin indexes.
+
+    Each distinct value is looked up once: pandas categoricals already have
+    their categories, other pandas columns are factorized with a hash table,
+    object arrays are hashed in a dictionary, and typed arrays use
+    `np.unique()`.
+
+    Args:
+        values (Union[np.ndarray, pd.Series, list]): The categorical values.
+        level_to_bin (dict): `level_name` -> `bin index` of the EBM.
+
+    Returns:
+        tuple: (`codes`, `level_names`), where `level_names` are the names of
+            all codes, including levels that the EBM has not seen.
+    """
+    if hasattr(values, "cat"):
+        # The categorical accessor of a pandas Series
+        values = values.cat
+
+    if hasattr(values, "categories"):
+        uniques = values.categories.tolist()
+        inverse = np.asarray(values.codes)
+    elif _is_series(values):
+        inverse, uniques = sys.modules["pandas"].factorize(values)
+        uniques = list(uniques)
+    else:
+        values = np.asarray(values)
+        if values.dtype == object:
+            unique_indexes = {}
+            inverse = np.fromiter(
+                (
+                    unique_indexes.setdefault(value, len(unique_indexes))
+                    for value in values.tolist()
+                ),
+                dtype=np.int64,
+                count=len(values),
+            )
+            uniques = list(unique_indexes)
+        else:
+            uniques, inverse = np.unique(values, return_inverse=True)
+            uniques = uniques.tolist()
+
+    num_levels = len(level_to_bin)
+    level_names = [None] * (num_levels + 2)
+    for level, code in level_to_bin.items():
+        level_names[code] = level
+
+    # The last code maps -1 (missing values in pandas) to the missing bin
+    unique_codes = np.zeros(len(uniques) + 1, dtype=np.int64)
+    level_to_bin = dict(level_to_bin)
+
+    for j, value in enumerate(uniques):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+
+        level = str(value)
+        if level not in level_to_bin:
+            # Give unseen levels new codes after the unknown bin
+            level_to_bin[level] = len(level_names)
+            level_names.append(level)
+
+        unique_codes[j] = level_to_bin[level]
+
+    return unique_codes[np.ravel(inverse)], level_names
+
+
+def _is_dataframe(x):
+    """True if `x` is a pandas DataFrame. Objects cannot be DataFrames if
+    pandas has not been imported, so we do not import it here."""
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(x, pandas.DataFrame)
+
+
+def _is_series(x):
+    """True if `x` is a pandas Series, without importing pandas."""
+    pandas = sys.modules.get("pandas")
+    return pandas is not None and isinstance(x, pandas.Series)
@@ -0,0 +1,498 @@
+"""CompiledEBM Class.
+
+This module implements the CompiledEBM class. It holds only the bin and score
+tables of a trained EBM, and it can score data without interpret. We use it to
+save a GAMCoach as a compact artifact and to load it back in milliseconds.
+
+The artifact is an uncompressed `.npz` file (a zip of `.npy` arrays) with an
+extra `header.json` member. The header holds the format version, the model
+fingerprint, the feature metadata, and the coach's distance statistics. All
+arrays are stored without compression, so they can be memory-mapped.
+"""
+
+import hashlib
+import json
+import struct
+import zipfile
+
+import numpy as np
+
+from .discretizer import Discretizer
+
+# Name and version of the compiled coach format
+FORMAT_NAME = "gamcoach-compiled"
+FORMAT_VERSION = 1
+
+# Name of the JSON header member in the .npz file
+HEADER_NAME = "header.json"
+
+
+class CompiledEBM:
+    """Class to represent the bin and score tables of a binary classification
+    or regression EBM.
+
+    It has the same attributes as interpret's EBMs that GAM Coach uses
+    (`feature_names_in_`, `feature_types_in_`, `bins_`, `term_features_`,
+    `term_scores_`, `intercept_`, `feature_bounds_`, and `classes_` for
+    classifiers), and it scores data with numpy.
+    """
+
+    def __init__(
+        self,
+        feature_names: list,
+        feature_types: list,
+        bins: list,
+        term_features: list,
+        term_scores: list,
+        intercept: float,
+        feature_bounds: np.ndarray,
+        classes: np.ndarray = None,
+        fingerprint: str = None,
+    ):
+        """Initialize a CompiledEBM object.
+
+        Args:
+            feature_names (list): Names of the main features.
+            feature_types (list): EBM types of the main features ('continuous'
+                or 'nominal').
+            bins (list): Bins of each main feature, in interpret's `bins_`
+                format. Continuous features have a list of cut arrays (main
+                effect cuts first, then coarser interaction cuts). Categorical
+                features have a list with one `level` -> `bin index` dict.
+            term_features (list): Feature indexes of each term.
+            term_scores (list): Additive score table of each term.
+            intercept (float): The intercept.
+            feature_bounds (np.ndarray): A (n_features, 2) array of the min and
+                max of continuous features (NaN for categorical features).
+            classes (np.ndarray, optional): Class labels if the EBM is a
+                binary classifier. The EBM is a regressor if it is `None`.
+            fingerprint (str, optional): The model fingerprint. By default, we
+                compute it from the tables.
+        """
+        self.feature_names_in_: list = list(feature_names)
+        """Names of the main features."""
+
+        self.feature_types_in_: list = list(feature_types)
+        """EBM types of the main features."""
+
+        self.bins_: list = bins
+        """Bins of each main feature."""
+
+        self.term_features_: list = [tuple(t) for t in term_features]
+        """Feature indexes of each term."""
+
+        self.term_scores_: list = term_scores
+        """Additive score table of each term."""
+
+        self.feature_bounds_: np.ndarray = feature_bounds
+        """Min and max of each continuous feature."""
+
+        if classes is not None:
+            self.classes_: np.ndarray = np.asarray(classes)
+            """Class labels of the binary classifier."""
+
+            self.intercept_ = np.array([intercept], dtype=float)
+        else:
+            self.intercept_ = float(intercept)
+
+        self.fingerprint: str = (
+            fingerprint if fingerprint is not None else self.get_fingerprint()
+        )
+        """SHA-256 fingerprint of the model tables."""
+
+        self.discretizer: Discretizer = Discretizer(self)
+        """Maps feature values to the bins of this model."""
+
+    def __repr__(self) -> str:
+        return "CompiledEBM with {} features and {} terms ({})".format(
+            len(self.feature_names_in_),
+            len(self.term_features_),
+            self.fingerprint[:12],
+        )
+
+    @property
+    def is_classifier(self):
+        """True if the model is a binary classifier."""
+        return hasattr(self, "classes_")
+
+    @staticmethod
+    def from_ebm(ebm):
+        """Compile a trained interpret EBM.
+
+        Args:
+            ebm (Union[ExplainableBoostingClassifier,
+                ExplainableBoostingRegressor]): The trained EBM model.
+
+        Returns:
+            CompiledEBM: The compiled model.
+        """
+        if isinstance(ebm, CompiledEBM):
+            return ebm
+
+        is_classifier = hasattr(ebm, "classes_")
+        if is_classifier and len(ebm.classes_) != 2:
+            raise ValueError("Only binary classifiers and regressors are supported.")
+
+        bins = []
+        for i, f_type in enumerate(ebm.feature_types_in_):
+            if f_type == "continuous":
+                bins.append([np.asarray(cuts, dtype=float) for cuts in ebm.bins_[i]])
+            elif f_type == "nominal":
+                bins.append([dict(ebm.bins_[i][0])])
+            else:
+                raise ValueError("Unsupported feature type {}".format(f_type))
+
+        return CompiledEBM(
+            ebm.feature_names_in_,
+            ebm.feature_types_in_,
+            bins,
+            ebm.term_features_,
+            [np.asarray(scores, dtype=float) for scores in ebm.term_scores_],
+            ebm.intercept_[0] if is_classifier else ebm.intercept_,
+            np.asarray(ebm.feature_bounds_, dtype=float),
+            classes=ebm.classes_ if is_classifier else None,
+        )
+
+    @staticmethod
+    def from_model_data(data):
+        """Rebuild the bin and score tables from the output of `get_model_data()`.
+
+        The model data only has the additive scores of the known bins, rounded
+        to 6 decimals. Missing values and unknown levels get a score of 0.
+        Classifiers predict the class index (0 or 1), following the order of
+        `modelInfo['classes']`.
+
+        Args:
+            data (dict): The model data dictionary.
+
+        Returns:
+            CompiledEBM: The compiled model.
+        """
+        feature_names = data["featureNames"]
+        num_features = len(feature_names)
+        main_features = data["features"][:num_features]
+        inter_features = data["features"][num_features:]
+
+        feature_types = []
+        bins = []
+        feature_bounds = np.full((num_features, 2), np.nan)
+
+        for i, feature in enumerate(main_features):
+            if feature["type"] == "continuous":
+                feature_types.append("continuous")
+                bins.append([np.asarray(feature["binEdge"][1:-1], dtype=float)])
+                feature_bounds[i] = [feature["binEdge"][0], feature["binEdge"][-1]]
+            elif feature["type"] == "categorical":
+                feature_types.append("nominal")
+                label_encoder = data["labelEncoder"][feature["name"]]
+                bins.append(
+                    [{label_encoder[str(k)]: int(k) for k in feature["binLabel"]}]
+                )
+            else:
+                raise ValueError("Unsupported feature type {}".format(feature["type"]))
+
+        # Continuous features can have coarser bins for interaction terms
+        for feature in inter_features:
+            for f, label_key in zip(feature["id"], ["binLabel1", "binLabel2"]):
+                if feature_types[f] == "continuous" and len(bins[f]) == 1:
+                    cuts = np.asarray(feature[label_key][1:-1], dtype=float)
+                    bins[f].append(cuts)
+
+        term_features = []
+        term_scores = []
+
+        for feature in main_features:
+            f = feature["id"][0]
+            bin_labels = feature.get("binEdge", feature.get("binLabel"))
+            bin_indexes = _get_model_data_bin_indexes(bin_labels, feature_types[f])
+            scores = np.zeros(_get_num_bins(bins[f], 0))
+            scores[bin_indexes] = feature["additive"]
+
+            term_features.append((f,))
+            term_scores.append(scores)
+
+        for feature in inter_features:
+            f_1, f_2 = feature["id"]
+            indexes_1 = _get_model_data_bin_indexes(
+                feature["binLabel1"], feature_types[f_1]
+            )
+            indexes_2 = _get_model_data_bin_indexes(
+                feature["binLabel2"], feature_types[f_2]
+            )
+            scores = np.zeros(
+                (_get_num_bins(bins[f_1], 1), _get_num_bins(bins[f_2], 1))
+            )
+            scores[np.ix_(indexes_1, indexes_2)] = feature["additive"]
+
+            term_features.append((f_1, f_2))
+            term_scores.append(scores)
+
+        return CompiledEBM(
+            feature_names,
+            feature_types,
+            bins,
+            term_features,
+            term_scores,
+            data["intercept"],
+            feature_bounds,
+            classes=np.array([0, 1]) if data["isClassifier"] else None,
+        )
+
+    def get_fingerprint(self):
+        """Compute a SHA-256 fingerprint of the feature metadata and tables.
+
+        Returns:
+            str: The hex digest.
+        """
+        sha = hashlib.sha256()
+        sha.update(json.dumps(self._get_metadata(), sort_keys=True).encode())
+
+        for f_bins in self.bins_:
+            if isinstance(f_bins[0], dict):
+                continue
+            for cuts in f_bins:
+                sha.update(np.ascontiguousarray(cuts, dtype="<f8").tobytes())
+
+        for scores in self.term_scores_:
+            sha.update(np.ascontiguousarray(scores, dtype="<f8").tobytes())
+
+        return sha.hexdigest()
+
+    def _get_metadata(self):
+        """Returns the JSON-serializable model metadata."""
+        levels = [
+            (
+                {str(k): int(v) for k, v in f_bins[0].items()}
+                if isinstance(f_bins[0], dict)
+                else None
+            )
+            for f_bins in self.bins_
+        ]
+        return {
+            "feature_names": self.feature_names_in_,
+            "feature_types": self.feature_types_in_,
+            "levels": levels,
+            "term_features": [list(map(int, t)) for t in self.term_features_],
+            "intercept": float(np.ravel(self.intercept_)[0]),
+            "classes": self.classes_.tolist() if self.is_classifier else None,
+        }
+
+    def eval_terms(self, x):
+        """Compute the additive score of each term.
+
+        Args:
+            x (Union[np.ndarray, pd.DataFrame, dict, ColumnarData]): A (n,
+                n_features) data array, one data point, or columnar data.
+
+        Returns:
+            np.ndarray: A (n, n_terms) array of term scores.
+        """
+        return self.discretizer.eval_terms(x, self.term_features_, self.term_scores_)
+
+    def decision_function(self, x):
+        """Compute the total additive score (logit for classifiers)."""
+        return np.sum(self.eval_terms(x), axis=1) + np.ravel(self.intercept_)[0]
+
+    def predict_proba(self, x):
+        """Predict the probability of each class (classifier only)."""
+        if not self.is_classifier:
+            raise AttributeError("A regressor does not have predict_proba().")
+
+        probs = 1 / (1 + np.exp(-self.decision_function(x)))
+        return np.column_stack((1 - probs, probs))
+
+    def predict(self, x):
+        """Predict the class (classifier) or the value (regressor)."""
+        scores = self.decision_function(x)
+
+        if self.is_classifier:
+            return self.classes_[(scores > 0).astype(int)]
+
+        return scores
+
+
+def save_compiled(path, ebm, coach_info):
+    """Save a compiled EBM and the coach statistics as a `.npz` file.
+
+    Args:
+        path (str): The output path.
+        ebm (CompiledEBM): The compiled model.
+        coach_info (dict): JSON-serializable coach statistics and settings.
+    """
+    cut_arrays = []
+    cut_ranges = []
+    start = 0
+
+    for f_bins in ebm.bins_:
+        if isinstance(f_bins[0], dict):
+            cut_ranges.append(None)
+            continue
+
+        cur_ranges = []
+        for cuts in f_bins:
+            cut_arrays.append(np.asarray(cuts, dtype="<f8"))
+            cur_ranges.append([start, start + len(cuts)])
+            start += len(cuts)
+        cut_ranges.append(cur_ranges)
+
+    score_arrays = []
+    score_shapes = []
+    start = 0
+
+    for scores in ebm.term_scores_:
+        score_arrays.append(np.asarray(scores, dtype="<f8").ravel())
+        score_shapes.append([start, list(scores.shape)])
+        start += scores.size
+
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "fingerprint": ebm.fingerprint,
+        "model": ebm._get_metadata(),
+        "cut_ranges": cut_ranges,
+        "score_shapes": score_shapes,
+        "coach": coach_info,
+    }
+
+    arrays = {
+        "cuts": _concatenate(cut_arrays),
+        "scores": _concatenate(score_arrays),
+        "feature_bounds": np.asarray(ebm.feature_bounds_, dtype="<f8"),
+    }
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr(HEADER_NAME, json.dumps(header))
+
+        for name, array in arrays.items():
+            with zip_file.open(name + ".npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, array, allow_pickle=False)
+
+
+def load_compiled(path, mmap_mode="r", verify=False):
+    """Load a compiled EBM and the coach statistics from a `.npz` file.
+
+    Args:
+        path (str): The path of a file created by `save_compiled()`.
+        mmap_mode (str, optional): Memory-map the arrays with this mode
+            ('r' or 'c'). If it is `None`, the arrays are read into memory.
+        verify (bool, optional): If true, recompute the fingerprint and raise
+            a ValueError if the file is corrupted.
+
+    Returns:
+        tuple: The `CompiledEBM` and the coach statistics dictionary.
+    """
+    header, arrays = _read_npz(path, mmap_mode)
+
+    if header.get("format") != FORMAT_NAME:
+        raise ValueError("{} is not a compiled GAM Coach file.".format(path))
+
+    if header["version"] > FORMAT_VERSION:
+        raise ValueError(
+            "Compiled coach version {} is newer than the supported version {}.".format(
+                header["version"], FORMAT_VERSION
+            )
+        )
+
+    model = header["model"]
+
+    bins = []
+    for levels, cur_ranges in zip(model["levels"], header["cut_ranges"]):
+        if levels is not None:
+            bins.append([levels])
+        else:
+            bins.append([arrays["cuts"][start:end] for start, end in cur_ranges])
+
+    term_scores = []
+    for start, shape in header["score_shapes"]:
+        end = start + int(np.prod(shape))
+        term_scores.append(arrays["scores"][start:end].reshape(shape))
+
+    ebm = CompiledEBM(
+        model["feature_names"],
+        model["feature_types"],
+        bins,
+        model["term_features"],
+        term_scores,
+        model["intercept"],
+        arrays["feature_bounds"],
+        classes=model["classes"],
+        fingerprint=header["fingerprint"],
+    )
+
+    if verify and ebm.get_fingerprint() != header["fingerprint"]:
+        raise ValueError("The fingerprint of {} does not match.".format(path))
+
+    return ebm, header["coach"]
+
+
+def _read_npz(path, mmap_mode):
+    """Read the header and memory-map the arrays of an uncompressed `.npz`."""
+    arrays = {}
+
+    with zipfile.ZipFile(path) as zip_file, open(path, "rb") as f:
+        header = json.loads(zip_file.read(HEADER_NAME))
+
+        for info in zip_file.infolist():
+            if not info.filename.endswith(".npy"):
+                continue
+
+            name = info.filename[:-4]
+
+            if mmap_mode is None or info.compress_type != zipfile.ZIP_STORED:
+                with zip_file.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            # Skip the zip local file header to find the .npy data
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+                continue
+
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode=mmap_mode,
+                offset=f.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+
+    return header, arrays
+
+
+def _concatenate(arrays):
+    """Concatenate 1D float arrays (an empty array if there is none)."""
+    if len(arrays) == 0:
+        return np.zeros(0, dtype="<f8")
+    return np.concatenate(arrays)
+
+
+def _get_num_bins(f_bins, level):
+    """Returns the score table size of one feature, including the missing and
+    unknown bins."""
+    if isinstance(f_bins[0], dict):
+        return len(f_bins[0]) + 2
+    return len(f_bins[min(level, len(f_bins) - 1)]) + 3
+
+
+def _get_model_data_bin_indexes(bin_labels, feature_type):
+    """Find the score table indexes of the known bins in the model data.
+
+    Continuous features have bin edges as labels, and their known bins are
+    1, ..., len(edges) - 1. Categorical features have level codes as labels,
+    and the code of a level is its bin index.
+    """
+    if feature_type == "continuous":
+        return np.arange(1, len(bin_labels))
+    return np.asarray(bin_labels, dtype=np.int64)
@@ -4,19 +4,19 @@ This module implements the Counterfactuals class. We use it to represent the
 generated counterfactual explanations.
 """
 
+import time
 import numpy as np
-import pandas as pd
-import re
-import pulp
-
-from tqdm import tqdm
-from interpret.glassbox import (
-    ExplainableBoostingClassifier,
-    ExplainableBoostingRegressor,
-)
-from time import time
-from collections import Counter
-from typing import Union
+
+from typing import TYPE_CHECKING, Union
+
+from .metrics import METRICS
+from .options import as_option_tables
+
+if TYPE_CHECKING:  # pragma: no cover
+    from interpret.glassbox import (
+        ExplainableBoostingClassifier,
+        ExplainableBoostingRegressor,
+    )
 
 SEED = 922
 
@@ -44,223 +44,367 @@ def _get_main_bin_labels(ebm, feature_index):
         raise Exception("Unknown column type")
 
 
+def _infer_option_type(option_table):
+    """Infer the feature type from its OptionTable."""
+    if option_table.bins.ndim == 2:
+        return "interaction"
+    elif option_table.targets.dtype == object:
+        return "categorical"
+    else:
+        return "continuous"
+
+
 class Counterfactuals:
-    """Class to represent GAM counterfactual explanations."""
+    """Class to represent GAM counterfactual explanations.
+
+    We only keep the changes of each CF in flat arrays. The changes of the
+    i-th CF are at `change_offsets[i]:change_offsets[i + 1]`. The MILP model,
+    options, and EBM are not stored, so the object is cheap to keep and pickle.
+    """
+
+    __slots__ = [
+        "cur_example",
+        "feature_names",
+        "feature_types",
+        "values",
+        "change_offsets",
+        "change_features",
+        "change_values",
+        "change_ranges",
+        "change_gains",
+        "change_distances",
+        "target",
+        "predictions",
+        "probabilities",
+        "is_valid",
+        "model_stats",
+        "solver_stats",
+        "sim_thresholds",
+        "stats",
+        "degradation",
+    ]
 
     def __init__(
         self,
         solutions: list,
-        model: pulp.LpProblem,
-        variables: dict,
-        ebm: Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor],
+        model,
+        ebm: "Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor]",
         cur_example: np.ndarray,
         options: dict,
+        sim_thresholds: dict = None,
+        feature_names: list = None,
+        feature_types: list = None,
+        solver_stats: dict = None,
+        target=None,
+        verify: bool = True,
+        stats=None,
+        degradation: dict = None,
     ):
         """Initialize a Counterfactuals object.
 
         Args:
-            solutions (list): List of generated `(active_variables, optimal value)`.
-                If successful, it should have `total_cfs` items.
-            model (LpProblem): Linear programming model
-            variables (dict): Dictionary containing all MILP variables,
-                `feature_name` -> [`variables`],
+            solutions (list): List of generated `(active_options, optimal value)`,
+                where `active_options` is an array of (`feature_id`,
+                `option_row`) pairs. If successful, it should have `total_cfs`
+                items.
+            model (LpProblem): Linear programming model. We only keep its
+                number of variables and constraints.
             ebm (Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor]):
-                The trained EBM model.
+                The trained EBM model. It is used to find the target bin ranges
+                and the new predictions, but it is not stored.
             cur_example (np.ndarray): The original data point.
             options (dict): Dictionary containing all eligible options for each
-                selected features. `feature_name` -> `[[target, score_gain,
-                distance, bin_id]]`
+                selected features. `feature_name` -> `OptionTable`. Lists of
+                options `[[target, score_gain, distance, bin_id]]` are also
+                accepted.
+            sim_thresholds (dict, optional): `feature_name` -> similarity
+                threshold used to remove redundant options of each continuous
+                feature.
+            feature_names (list, optional): Names of all features, including
+                interaction terms. A feature id is the index in this list. By
+                default, we use the keys of `options`.
+            feature_types (list, optional): Types of all features ('continuous',
+                'categorical', or 'interaction'). By default, we infer the types
+                from `options`.
+            solver_stats (dict, optional): Statistics of the MILP solver runs.
+            target (optional): The desired class for classifiers, or the
+                desired `(min, max)` prediction range for regressors. If it is
+                `None`, we do not check if the CFs are valid.
+            verify (bool, optional): If true, we predict the CFs right away.
+                Otherwise, the predictions are `None` until the result is passed
+                to `verify_cfs()`, which can predict many results at once.
+            stats (GenerationStats, optional): Stage timings and sizes of the
+                generation.
+            degradation (dict, optional): Predicted and final MILP sizes and
+                the degradations applied by the resource policy of the
+                generation.
         """
-        self.model = model
-        """MILP program model."""
+        options = as_option_tables(options)
 
-        self.variables = variables
-        """MILP program variabels."""
+        if feature_names is None:
+            feature_names = list(options.keys())
 
-        self.ebm = ebm
-        """The trained EBM model."""
+        if feature_types is None:
+            feature_types = [
+                _infer_option_type(options[f_name]) for f_name in feature_names
+            ]
 
-        self.cur_example = cur_example[0]
+        self.cur_example: np.ndarray = np.asarray(cur_example).reshape(1, -1)[0]
         """The original data point."""
 
-        self.options = options
-        """All possible options."""
+        self.feature_names: list = feature_names
+        """Names of all features, including interaction terms."""
 
-        self.solutions = solutions
-        """Solutions for MILP."""
+        self.feature_types: list = feature_types
+        """Types of all features, including interaction terms."""
 
-        self.data: np.ndarray
-        """Generated CFs in the original data dataformat."""
+        self.sim_thresholds: dict = sim_thresholds
+        """Similarity threshold used to prune the options of each continuous
+        feature."""
 
-        self.target_bins: list
-        """New bins used in each row of `data`."""
+        self.values: np.ndarray = np.array(
+            [value for _, value in solutions], dtype=float
+        )
+        """Corresponding objective values (total distance) of each CF."""
 
-        self.values: list
-        """Corresponding objective values (total distance) of each `data` row."""
+        self.change_offsets: np.ndarray
+        """Start index of each CF's changes, followed by the total number of
+        changes."""
 
-        self.convert_cfs_to_data(solutions)
+        self.change_features: np.ndarray
+        """Feature id of each change. Triggered interaction terms are included."""
 
-    def convert_cfs_to_data(self, solutions):
-        """Convert optimal CF solutions to the original dataformat."""
+        self.change_values: np.ndarray
+        """New value of each change (`None` for interaction terms)."""
 
-        self.data = []
-        self.values = []
-        self.target_ranges = []
+        self.change_ranges: np.ndarray
+        """Target bin range of each change. It is the new level for
+        categorical features and an empty string for interaction terms."""
 
-        for active_variables, value in solutions:
-            cur_cf = self.cur_example.copy()
-            cur_target_ranges = []
+        self.change_gains: np.ndarray
+        """Score gain of each change."""
 
-            for var in active_variables:
-                # Skip interaction vars (included)
-                # In EBM, interaction names are `f1 x f2`, pulp's variable name
-                # is `f1_x_f2`
-                if "_x_" not in var.name:
-                    f_name = re.sub(r"(.+):\d+", r"\1", var.name)
-                    bin_i = int(re.sub(r".+:(\d+)", r"\1", var.name))
+        self.change_distances: np.ndarray
+        """Distance cost of each change."""
 
-                    # Find the original value
-                    org_value = self.cur_example[self.ebm.feature_names.index(f_name)]
+        self._convert_solutions(solutions, options, ebm)
 
-                    # Find the target bin
-                    f_index = self.ebm.feature_names.index(f_name)
-                    f_type = self.ebm.feature_types[f_index]
+        self.model_stats: dict = {
+            "num_variables": int(model.numVariables()) if model is not None else 0,
+            "num_constraints": (
+                int(model.numConstraints()) if model is not None else 0
+            ),
+        }
+        """Size of the last solved MILP model."""
 
-                    if f_type == "continuous":
-                        bin_starts = _get_main_bin_labels(self.ebm, f_index)[:-1]
+        self.solver_stats: dict = solver_stats if solver_stats is not None else {}
+        """Statistics of the MILP solver runs."""
 
-                        target_bin = "[{},".format(bin_starts[bin_i])
+        self.stats = stats
+        """Wall and CPU time of each stage, option counts, and MILP sizes of
+        the generation (`GenerationStats`), or `None` if they are not
+        collected."""
 
-                        if bin_i + 1 < len(bin_starts):
-                            target_bin += " {})".format(bin_starts[bin_i + 1])
-                        else:
-                            target_bin += " inf)"
-                    else:
-                        target_bin = ""
-                        org_value = '"{}"'.format(org_value)
+        self.degradation: dict = degradation
+        """The resource policy, the predicted and final MILP sizes, and the
+        applied degradation `steps` (e.g., 'coarsen_bins', 'prune_interactions',
+        or 'approximate'), or `None` if the generation has no resource policy.
+        See `gamcoach.policy`."""
 
-                    for option in self.options[f_name]:
-                        if option[3] == bin_i:
-                            target_value = option[0]
-                            cur_cf[f_index] = target_value
+        self.target = target
+        """The desired class (classifier) or prediction range (regressor)."""
 
-                            if f_type == "continuous":
-                                cur_target_ranges.append(target_bin)
-                            else:
-                                cur_target_ranges.append(option[0])
-                            break
+        self.predictions: np.ndarray = None
+        """New prediction of each CF."""
 
-            self.data.append(cur_cf)
-            self.values.append(value)
-            self.target_ranges.append(cur_target_ranges)
+        self.probabilities: np.ndarray = None
+        """New predicted class probabilities of each CF (classifier only)."""
 
-        if len(self.data) > 0:
-            self.data = np.vstack(self.data)
+        self.is_valid: np.ndarray = None
+        """True if the new prediction of the CF reaches the `target`."""
+
+        if verify:
+            verify_cfs(ebm, [self])
+
+    def _convert_solutions(self, solutions, options, ebm):
+        """Collect the changes of all CF solutions into flat arrays."""
+        feature_ids = []
+        rows = []
+        counts = []
+
+        for active_options, _ in solutions:
+            active_options = np.asarray(active_options, dtype=np.int64).reshape(-1, 2)
+            feature_ids.append(active_options[:, 0])
+            rows.append(active_options[:, 1])
+            counts.append(len(active_options))
+
+        self.change_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        if len(feature_ids) > 0:
+            self.change_features = np.concatenate(feature_ids)
+            rows = np.concatenate(rows)
+        else:
+            self.change_features = np.zeros(0, dtype=np.int64)
+            rows = np.zeros(0, dtype=np.int64)
+
+        n = len(self.change_features)
+        self.change_values = np.empty(n, dtype=object)
+        self.change_ranges = np.empty(n, dtype=object)
+        self.change_gains = np.zeros(n)
+        self.change_distances = np.zeros(n)
+
+        for i in range(n):
+            f_index = self.change_features[i]
+            f_type = self.feature_types[f_index]
+            option_table = options[self.feature_names[f_index]]
+            row = rows[i]
+
+            self.change_gains[i] = option_table.gains[row]
+
+            if f_type == "interaction":
+                self.change_ranges[i] = ""
+                continue
+
+            self.change_values[i] = option_table.targets[row]
+            self.change_distances[i] = option_table.distances[row]
+
+            if f_type == "continuous":
+                self.change_ranges[i] = _get_target_bin(
+                    ebm, f_index, option_table.bins[row]
+                )
+            else:
+                self.change_ranges[i] = option_table.targets[row]
+
+    def __len__(self):
+        return len(self.values)
+
+    def _get_main_changes(self):
+        """Returns the CF index, feature id, and new value of all changes to
+        main features."""
+        cf_indexes = np.repeat(np.arange(len(self)), np.diff(self.change_offsets))
+        is_main = np.array(
+            [self.feature_types[f] != "interaction" for f in self.change_features],
+            dtype=bool,
+        )
+        return (
+            cf_indexes[is_main],
+            self.change_features[is_main],
+            self.change_values[is_main],
+        )
+
+    def to_numpy(self):
+        """Returns the CFs in the original data format.
+
+        Returns:
+            np.ndarray: A (n_cfs, n_features) array, one CF for each row.
+        """
+        data = np.repeat(self.cur_example.reshape(1, -1), len(self), axis=0)
+
+        cf_indexes, f_indexes, new_values = self._get_main_changes()
+        data[cf_indexes, f_indexes] = new_values
+
+        return data
+
+    @property
+    def data(self):
+        """Generated CFs in the original data dataformat."""
+        return self.to_numpy()
+
+    @property
+    def target_ranges(self):
+        """Target bin ranges of the changed main features in each CF."""
+        target_ranges = []
+
+        for i in range(len(self)):
+            start, end = self.change_offsets[i], self.change_offsets[i + 1]
+            target_ranges.append(
+                [
+                    self.change_ranges[j]
+                    for j in range(start, end)
+                    if self.feature_types[self.change_features[j]] != "interaction"
+                ]
+            )
+
+        return target_ranges
 
     def show(self):
         """
         Print the optimal solutions.
         """
-        count = 0
+        for i in range(len(self)):
+            print("## Strategy {} ##".format(i + 1))
 
-        for active_variables, value in self.solutions:
-            count += 1
-            print("## Strategy {} ##".format(count))
-
-            for var in active_variables:
-                # Skip interaction vars (included)
-                if "_x_" not in var.name:
-                    f_name = re.sub(r"(.+):\d+", r"\1", var.name)
-                    bin_i = int(re.sub(r".+:(\d+)", r"\1", var.name))
+            for j in range(self.change_offsets[i], self.change_offsets[i + 1]):
+                f_index = self.change_features[j]
+                f_name = self.feature_names[f_index]
+                f_type = self.feature_types[f_index]
 
+                if f_type != "interaction":
                     # Find the original value
-                    org_value = self.cur_example[self.ebm.feature_names.index(f_name)]
+                    org_value = self.cur_example[f_index]
+                    new_value = self.change_values[j]
 
                     # Find the target bin
-                    f_index = self.ebm.feature_names.index(f_name)
-                    f_type = self.ebm.feature_types[f_index]
-
                     if f_type == "continuous":
-                        bin_starts = _get_main_bin_labels(self.ebm, f_index)[:-1]
-
-                        target_bin = "[{},".format(bin_starts[bin_i])
-
-                        if bin_i + 1 < len(bin_starts):
-                            target_bin += " {})".format(bin_starts[bin_i + 1])
-                        else:
-                            target_bin += " inf)"
+                        target_bin = self.change_ranges[j]
                     else:
                         target_bin = ""
                         org_value = '"{}"'.format(org_value)
+                        new_value = '"{}"'.format(new_value)
 
-                    for option in self.options[f_name]:
-                        if option[3] == bin_i:
-                            new_value = (
-                                option[0]
-                                if f_type == "continuous"
-                                else '"{}"'.format(option[0])
-                            )
-
-                            print(
-                                "Change <{}> from {} to {} {}".format(
-                                    f_name, org_value, new_value, target_bin
-                                )
-                            )
-                            print(
-                                "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
-                                    option[1], option[2]
-                                )
-                            )
-                            break
+                    print(
+                        "Change <{}> from {} to {} {}".format(
+                            f_name, org_value, new_value, target_bin
+                        )
+                    )
 
                 else:
-                    f_name = re.sub(r"(.+):.+", r"\1", var.name)
-                    f_name = f_name.replace("_x_", " x ")
-                    bin_0 = int(re.sub(r".+:(\d+),\d+", r"\1", var.name))
-                    bin_1 = int(re.sub(r".+:\d+,(\d+)", r"\1", var.name))
-
-                    for option in self.options[f_name]:
-                        if option[3][0] == bin_0 and option[3][1] == bin_1:
-                            print("Trigger interaction term: <{}>".format(f_name))
-                            print(
-                                "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
-                                    option[1], 0
-                                )
-                            )
-                            break
+                    print("Trigger interaction term: <{}>".format(f_name))
+
+                print(
+                    "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
+                        self.change_gains[j], self.change_distances[j]
+                    )
+                )
             print()
 
     def model_summary(self, verbose=True):
         """Print out a summary of the MILP model."""
+        import pandas as pd
 
         if verbose:
             print(
                 "Top {} solution to a MILP model with {} variables and {} constraints.".format(
-                    self.data.shape[0],
-                    self.model.numVariables(),
-                    self.model.numConstraints(),
+                    len(self),
+                    self.model_stats["num_variables"],
+                    self.model_stats["num_constraints"],
                 )
             )
 
-        if len(self.data) == 0:
+        if len(self) == 0:
             return pd.DataFrame()
 
-        data_df = pd.DataFrame(self.data)
-        data_df.columns = np.array(self.ebm.feature_names)[
-            [
-                i
-                for i in range(len(self.ebm.feature_types))
-                if self.ebm.feature_types[i] != "interaction"
-            ]
+        data_df = pd.DataFrame(self.to_numpy())
+        data_df.columns = [
+            self.feature_names[i]
+            for i in range(len(self.cur_example))
+            if self.feature_types[i] != "interaction"
         ]
 
-        new_predictions = self.ebm.predict(self.data)
-        data_df["new_prediction"] = new_predictions
+        if self.predictions is not None:
+            data_df["new_prediction"] = self.predictions
+
+        if verbose and self.is_valid is not None and not np.all(self.is_valid):
+            print(
+                "Warning: CF {} do not reach the target prediction.".format(
+                    np.flatnonzero(~self.is_valid).tolist()
+                )
+            )
 
         return data_df
 
     def __repr__(self) -> str:
-        if len(self.data) == 0:
+        if len(self) == 0:
             return "The optimization is infeasible."
 
         summary = self.model_summary()
@@ -269,3 +413,79 @@ class Counterfactuals:
     def to_df(self):
         summary = self.model_summary(False)
         return summary
+
+
+def verify_cfs(
+    ebm: "Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor]",
+    results: list,
+):
+    """Predict the CFs of many results in one pass and check if they are valid.
+
+    The predictions, probabilities, and validity flags are stored on each
+    result, so later calls to `to_df()` or `__repr__()` do not predict again.
+
+    Args:
+        ebm (Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor]):
+            The trained EBM model.
+        results ([Counterfactuals]): The results to verify.
+
+    Returns:
+        np.ndarray: The validity flag of each CF of all results, concatenated.
+    """
+    sizes = [len(result) for result in results]
+
+    if np.sum(sizes) == 0:
+        for result in results:
+            result.predictions = np.zeros(0)
+            result.is_valid = np.zeros(0, dtype=bool)
+        return np.zeros(0, dtype=bool)
+
+    start_time = time.perf_counter()
+    data = np.vstack([result.to_numpy() for result in results if len(result) > 0])
+
+    is_classifier = hasattr(ebm, "classes_")
+    if is_classifier:
+        probabilities = ebm.predict_proba(data)
+        predictions = ebm.classes_[np.argmax(probabilities, axis=1)]
+    else:
+        probabilities = None
+        predictions = ebm.predict(data)
+
+    is_valid = np.ones(len(data), dtype=bool)
+    start = 0
+
+    for result, size in zip(results, sizes):
+        end = start + size
+        result.predictions = predictions[start:end]
+
+        if probabilities is not None:
+            result.probabilities = probabilities[start:end]
+
+        if result.target is not None:
+            if is_classifier:
+                is_valid[start:end] = result.predictions == result.target
+            else:
+                is_valid[start:end] = (result.predictions >= result.target[0]) & (
+                    result.predictions <= result.target[1]
+                )
+
+        result.is_valid = is_valid[start:end]
+        start = end
+
+    METRICS.record_verify(len(data), time.perf_counter() - start_time)
+
+    return is_valid
+
+
+def _get_target_bin(ebm, f_index, bin_i):
+    """Returns the range of a continuous feature's main effect bin."""
+    bin_starts = _get_main_bin_labels(ebm, f_index)[:-1]
+
+    target_bin = "[{},".format(bin_starts[bin_i])
+
+    if bin_i + 1 < len(bin_starts):
+        target_bin += " {})".format(bin_starts[bin_i + 1])
+    else:
+        target_bin += " inf)"
+
+    return target_bin
@@ -0,0 +1,154 @@
+"""Discretizer Class.
+
+This module implements the Discretizer class. We use it to map feature values
+to the bins of an EBM's main effects and pair effects, for whole matrices or
+many values of one feature at once.
+
+Bin indexes follow the EBM's score tables: 0 is the missing bin, 1 to n are the
+known bins, and n + 1 is the unknown bin. For continuous features, a value `x`
+is in bin `i + 1` if `cuts[i - 1] <= x < cuts[i]`. The known bins of the
+tables' `[1:-1]` slices (e.g., the additive scores in `get_model_data()`) are
+therefore at `index - 1`, which is the same index as the binary search over
+bin starts in `search_sorted_lower_index()`.
+"""
+
+import numpy as np
+
+from .columns import ColumnarData, is_columnar, _encode_levels
+
+
+class Discretizer:
+    """Class to map feature values to the bins of an EBM."""
+
+    def __init__(self, ebm):
+        """Initialize a Discretizer object.
+
+        Args:
+            ebm (Union[ExplainableBoostingClassifier,
+                ExplainableBoostingRegressor, CompiledEBM]): The trained EBM.
+        """
+        self.ebm = ebm
+        """The EBM, to encode DataFrames and dictionaries of columns."""
+
+        self.feature_types: list = list(ebm.feature_types_in_)
+        """EBM types of the main features."""
+
+        self.cuts: list = []
+        """[main effect cuts, pair effect cuts] of each continuous feature
+        (`None` for categorical features)."""
+
+        self.level_to_bin: list = []
+        """`level_name` -> `bin index` of each categorical feature (`None` for
+        continuous features)."""
+
+        for i, f_type in enumerate(self.feature_types):
+            f_bins = ebm.bins_[i]
+
+            if f_type == "continuous":
+                # Pair effects use the coarser cuts in `bins_[i][1]` if there
+                # are any
+                main_cuts = np.asarray(f_bins[0], dtype=float)
+                pair_cuts = main_cuts
+                if len(f_bins) > 1:
+                    pair_cuts = np.asarray(f_bins[1], dtype=float)
+                self.cuts.append([main_cuts, pair_cuts])
+                self.level_to_bin.append(None)
+            else:
+                self.cuts.append(None)
+                self.level_to_bin.append(f_bins[0])
+
+    def __repr__(self) -> str:
+        return "Discretizer of {} features".format(len(self.feature_types))
+
+    def discretize(self, values, feature_index, level=0):
+        """Find the bin index of each value of one feature.
+
+        Args:
+            values (Union[np.ndarray, list, float, str]): Values of the
+                feature, or one value.
+            feature_index (int): The index of the feature.
+            level (int, optional): 0 for main effect bins, 1 for pair effect
+                bins.
+
+        Returns:
+            np.ndarray: The bin index of each value.
+        """
+        values = np.atleast_1d(values)
+
+        if self.cuts[feature_index] is not None:
+            values = np.asarray(values, dtype=float)
+            indexes = np.searchsorted(
+                self.cuts[feature_index][level], values, side="right"
+            )
+            indexes += 1
+            indexes[np.isnan(values)] = 0
+            return indexes
+
+        # Unknown levels are in the unknown bin after all known levels
+        level_to_bin = self.level_to_bin[feature_index]
+        codes, _ = _encode_levels(values, level_to_bin)
+        return np.minimum(codes, len(level_to_bin) + 1)
+
+    def transform(self, x):
+        """Find the main effect and pair effect bins of all features at once.
+
+        Args:
+            x (Union[np.ndarray, pd.DataFrame, dict, ColumnarData]): A (n,
+                n_features) data array, one data point, or columnar data.
+
+        Returns:
+            tuple: (`main_bins`, `pair_bins`), two (n, n_features) arrays of
+                bin indexes. Their columns are the same for features that have
+                the same main and pair effect bins.
+        """
+        if not isinstance(x, ColumnarData) and is_columnar(x):
+            x = ColumnarData.from_data(self.ebm, x)
+
+        if not isinstance(x, ColumnarData):
+            x = np.asarray(x)
+            if x.ndim == 1:
+                x = x.reshape(1, -1)
+
+        num_rows = x.shape[0]
+        main_bins = np.empty((num_rows, len(self.feature_types)), dtype=np.int64)
+        pair_bins = np.empty_like(main_bins)
+
+        for i in range(len(self.feature_types)):
+            if isinstance(x, ColumnarData):
+                if self.cuts[i] is None:
+                    main_bins[:, i] = x.get_bin_indexes(i)
+                    pair_bins[:, i] = main_bins[:, i]
+                    continue
+                column = x.get_column(i)
+            else:
+                column = x[:, i]
+
+            main_bins[:, i] = self.discretize(column, i, 0)
+
+            if self.cuts[i] is None or self.cuts[i][0] is self.cuts[i][1]:
+                pair_bins[:, i] = main_bins[:, i]
+            else:
+                pair_bins[:, i] = self.discretize(column, i, 1)
+
+        return main_bins, pair_bins
+
+    def eval_terms(self, x, term_features, term_scores):
+        """Compute the additive score of each term.
+
+        Args:
+            x (Union[np.ndarray, pd.DataFrame, dict, ColumnarData]): A (n,
+                n_features) data array, one data point, or columnar data.
+            term_features (list): Feature indexes of each term.
+            term_scores (list): Additive score table of each term.
+
+        Returns:
+            np.ndarray: A (n, n_terms) array of term scores.
+        """
+        main_bins, pair_bins = self.transform(x)
+        scores = np.zeros((main_bins.shape[0], len(term_features)))
+
+        for t, term in enumerate(term_features):
+            bins = main_bins if len(term) == 1 else pair_bins
+            scores[:, t] = term_scores[t][tuple(bins[:, f] for f in term)]
+
+        return scores
@@ -4,34 +4,81 @@ GAM Coach implements a simple and flexible method to generate counterfactual
 explanations for generalized additive models (GAMs).
 """
 
+import os
+import json
+import hashlib
 import numpy as np
-import re
-import pulp
 from copy import copy
-from tqdm import tqdm
-from scipy.stats import gaussian_kde
-from interpret.glassbox import (
-    ExplainableBoostingClassifier,
-    ExplainableBoostingRegressor,
-)
-from collections import Counter
-from typing import Union
+from bisect import bisect_left
+from concurrent.futures import Executor
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Callable, Iterable, Union
 
 from .counterfactuals import Counterfactuals
+from .statistics import (
+    CHUNK_SIZE,
+    SKETCH_ERROR,
+    FeatureStatistics,
+    compute_mads,
+    count_levels,
+    _counts_to_frequency_distance,
+)
+from .columns import ColumnarData, is_columnar
+from .compiled import CompiledEBM, save_compiled, load_compiled
+from .discretizer import Discretizer
+from .payload import load_model_payload, is_model_payload
+from .options import OptionTable, VariableRegistry, as_option_tables
+from .timing import STATS_HOOKS, GenerationStats, time_round, time_stage
+from .metrics import METRICS
+from .policy import ResourceLimitError, ResourcePolicy, as_resource_policy
+from .solver import SolveRequest, is_time_limited, run_steps, run_steps_async
+
+# Heavy dependencies (pulp, tqdm, scipy, pandas) are imported when they are
+# first used, and interpret is only imported for type checking
+if TYPE_CHECKING:  # pragma: no cover
+    from interpret.glassbox import (
+        ExplainableBoostingClassifier,
+        ExplainableBoostingRegressor,
+    )
 
 SEED = 922
 
+# Max number of rounds to tighten the automatic similarity thresholds
+MAX_SIM_THRESHOLD_ROUNDS = 3
+
+# Number of bisection steps to search the automatic similarity thresholds
+SIM_THRESHOLD_SEARCH_STEPS = 20
+
+# Tolerance to compare the optimal distances when certifying the thresholds
+CERTIFY_TOLERANCE = 1e-6
+
+# Use the exact KDE in get_model_data() if a column has at most this many rows
+KDE_EXACT_MAX_ROWS = 10000
+
+# Grid step of the binned KDE, relative to the kernel bandwidth
+KDE_GRID_STEP = 1 / 16
+
+# Max number of grid points of the binned KDE (otherwise use the exact KDE)
+KDE_MAX_GRID_SIZE = 2**18
+
+# Version of the cached model data sections, included in their fingerprints
+MODEL_DATA_CACHE_VERSION = 1
+
 
 class GAMCoach:
     """Main class for GAM Coach."""
 
     def __init__(
         self,
-        ebm: Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor],
-        x_train: np.ndarray,
+        ebm: "Union[ExplainableBoostingClassifier, ExplainableBoostingRegressor]",
+        x_train: Union[np.ndarray, dict, str, Iterable],
         cont_mads=None,
         cat_distances=None,
         adjust_cat_distance=True,
+        chunk_size=CHUNK_SIZE,
+        mad_method="auto",
+        mad_error=SKETCH_ERROR,
     ):
         """Initialize a GAMCoach object.
 
@@ -40,8 +87,16 @@ class GAMCoach:
             ExplainableBoostingRegressor]):
                 The trained EBM model. It can be either a classifier or a
                 regressor.
-            x_train (np.ndarray): The training data. It is used to compute the
-                distance for different features.
+            x_train (Union[np.ndarray, pd.DataFrame, dict, str, Iterable]): The
+                training data. It is used to compute the distance for different
+                features. Besides an array, it can be a DataFrame or a
+                dictionary of typed column arrays (continuous columns are used
+                as float64 views, and categorical columns are encoded as the
+                EBM's bin indexes), a `np.memmap`, a path to a CSV or Parquet
+                file with one column for each feature, or an iterable of chunks
+                (arrays or DataFrames). Memmaps, files, and chunks are read
+                `chunk_size` rows at a time. The coach does not keep the data.
+                It can be `None` if `cont_mads` and `cat_distances` are given.
             cont_mads (dict, optional): `feature_name` -> `median absolute
                 deviation score`. If it is provided, it is used to overwrite the
                 computed MADs for continuous variables. It is useful when you
@@ -56,6 +111,14 @@ class GAMCoach:
             adjust_cat_distance (bool, optional): If true, we use (1 -
                 frequency(level)) for each level. Otherwise, we give distance =
                 1 for different levels and 0 for the same level.
+            chunk_size (int, optional): Number of rows to read at once when
+                `x_train` is a memmap or a file path.
+            mad_method (str, optional): How to compute the MADs of out-of-core
+                data. 'exact' reads the data twice, 'sketch' reads it once and
+                estimates the MADs with a streaming quantile sketch, and 'auto'
+                uses 'exact' unless `x_train` can only be iterated once.
+            mad_error (float, optional): Relative rank error of the sketch.
+                The error bound of each MAD is in `feature_stats.mad_errors`.
         """
 
         self.ebm: Union[
@@ -63,8 +126,6 @@ class GAMCoach:
         ] = ebm
         """The trained EBM model."""
 
-        self.x_train: np.ndarray = x_train
-
         self.cont_mads: dict = cont_mads
         """Median absolute deviation (MAD) of continuous variables."""
 
@@ -101,58 +162,154 @@ class GAMCoach:
 
         self.feature_groups = copy(self.ebm.term_features_)
 
-        self.adjust_cat_distance: bool = adjust_cat_distance
+        self.discretizer: Discretizer = getattr(self.ebm, "discretizer", None)
+        """Maps feature values to the main effect and pair effect bins."""
 
-        # If cont_mads is not given, we compute it from the training data
-        if self.cont_mads is None:
-            ebm_cont_indexes = np.array(
-                [
-                    i
-                    for i in range(len(self.ebm.feature_names_in_))
-                    if self.ebm.feature_types_in_[i] == "continuous"
-                ]
-            )
+        if self.discretizer is None:
+            self.discretizer = Discretizer(self.ebm)
 
-            self.cont_mads = {}
+        self.adjust_cat_distance: bool = adjust_cat_distance
+
+        # Compute the missing statistics from the training data in one pass
+        self.feature_stats: FeatureStatistics = None
+        """MADs and categorical level counts of the training data. It is `None`
+        if both `cont_mads` and `cat_distances` are provided."""
 
-            for i in ebm_cont_indexes:
-                self.cont_mads[ebm.feature_names_in_[i]] = self.compute_mad(
-                    self.x_train[:, i]
+        if self.cont_mads is None or self.cat_distances is None:
+            if x_train is None:
+                raise ValueError(
+                    "x_train is required unless both cont_mads and "
+                    "cat_distances are provided"
                 )
 
-        # If cat_distance is not given, we compute it from the training data
-        if self.cat_distances is None:
-            ebm_cat_indexes = np.array(
-                [
-                    i
-                    for i in range(len(self.ebm.feature_names_in_))
-                    if self.ebm.feature_types_in_[i] == "nominal"
-                ]
+            self.feature_stats = FeatureStatistics.from_source(
+                self.ebm,
+                x_train,
+                continuous=self.cont_mads is None,
+                categorical=self.cat_distances is None,
+                chunk_size=chunk_size,
+                mad_method=mad_method,
+                mad_error=mad_error,
             )
 
-            self.cat_distances = {}
+        # If cont_mads is not given, we use the MADs of the training data
+        if self.cont_mads is None:
+            self.cont_mads = self.feature_stats.cont_mads
 
+        # If cat_distance is not given, we compute it from the level counts
+        if self.cat_distances is None:
             if self.adjust_cat_distance:
-                for i in ebm_cat_indexes:
-                    self.cat_distances[
-                        self.ebm.feature_names_in_[i]
-                    ] = GAMCoach.compute_frequency_distance(self.x_train[:, i])
+                self.cat_distances = self.feature_stats.get_frequency_distances()
             else:
-                for i in ebm_cat_indexes:
-                    self.cat_distances[
-                        self.ebm.feature_names_in_[i]
-                    ] = GAMCoach.compute_naive_cat_distance(self.x_train[:, i])
+                self.cat_distances = self.feature_stats.get_naive_cat_distances()
 
         # Determine if the ebm is a classifier or a regressor
         self.is_classifier = isinstance(self.ebm.intercept_, np.ndarray)
         """True if the ebm model is a classifier, false if it is a regressor."""
 
+        self._model_fingerprint = None
+
+    @property
+    def model_fingerprint(self) -> str:
+        """SHA-256 fingerprint of the EBM's bin and score tables. It is computed
+        on first use."""
+        if self._model_fingerprint is None:
+            self._model_fingerprint = getattr(self.ebm, "fingerprint", None)
+
+        if self._model_fingerprint is None:
+            self._model_fingerprint = CompiledEBM.from_ebm(self.ebm).fingerprint
+
+        return self._model_fingerprint
+
+    def save(self, path: str):
+        """Save the coach as a compact, versioned `.npz` file.
+
+        The file holds the EBM's bin and score tables, the MADs, the
+        categorical distances, and a model fingerprint. It does not include
+        the training data or any pickled interpret objects.
+
+        Args:
+            path (str): The output path.
+        """
+        coach_info = {
+            "cont_mads": {k: float(v) for k, v in self.cont_mads.items()},
+            "cat_distances": {
+                f_name: {str(k): float(v) for k, v in distances.items()}
+                for f_name, distances in self.cat_distances.items()
+            },
+            "adjust_cat_distance": self.adjust_cat_distance,
+        }
+
+        save_compiled(path, CompiledEBM.from_ebm(self.ebm), coach_info)
+
+    @staticmethod
+    def load(path: str, mmap_mode: str = "r", verify: bool = False):
+        """Load a coach saved by `GAMCoach.save()`.
+
+        The loaded coach uses a `CompiledEBM`, so it does not need interpret
+        or the training data.
+
+        Args:
+            path (str): The path of the saved coach.
+            mmap_mode (str, optional): Memory-map the bin and score tables
+                with this mode. If it is `None`, read them into memory.
+            verify (bool, optional): If true, recompute the model fingerprint
+                to check the file. Default to false.
+
+        Returns:
+            GAMCoach: The loaded coach.
+        """
+        ebm, coach_info = load_compiled(path, mmap_mode=mmap_mode, verify=verify)
+
+        return GAMCoach(
+            ebm,
+            None,
+            cont_mads=coach_info["cont_mads"],
+            cat_distances=coach_info["cat_distances"],
+            adjust_cat_distance=coach_info["adjust_cat_distance"],
+        )
+
+    @staticmethod
+    def from_model_data(model_data: Union[dict, str]):
+        """Create a coach from the output of `get_model_data()`.
+
+        The coach uses a `CompiledEBM` rebuilt from the additive tables, bin
+        edges, and label encoder, and it uses the exported `contMads` and
+        `catDistances`. It does not need interpret or the training data.
+
+        Note that the exported scores are rounded to 6 decimals. Also, the
+        model data must be exported with `resort_categorical=False` if it has
+        interaction terms with categorical features, because these terms keep
+        the original level codes.
+
+        Args:
+            model_data (Union[dict, str]): The model data dictionary, or the
+                path to its JSON file or its binary payload file (see
+                `save_model_payload()`).
+
+        Returns:
+            GAMCoach: The coach.
+        """
+        if not isinstance(model_data, dict):
+            if is_model_payload(model_data):
+                model_data = load_model_payload(model_data)
+            else:
+                with open(model_data, "r") as f:
+                    model_data = json.load(f)
+
+        return GAMCoach(
+            CompiledEBM.from_model_data(model_data),
+            None,
+            cont_mads=model_data["contMads"],
+            cat_distances=model_data["catDistances"],
+        )
+
     def generate_cfs(
         self,
-        cur_example: np.ndarray,
+        cur_example: Union[np.ndarray, dict],
         total_cfs: int = 1,
         target_range: tuple = None,
-        sim_threshold_factor: float = 0.005,
+        sim_threshold_factor: Union[float, str] = 0.005,
         sim_threshold: float = None,
         categorical_weight: Union[float, str] = "auto",
         features_to_vary: list = None,
@@ -160,6 +317,14 @@ class GAMCoach:
         feature_ranges: dict = None,
         continuous_integer_features: list = None,
         verbose: int = 1,
+        variable_budget: int = 2000,
+        constraint_budget: int = None,
+        verify: bool = True,
+        collect_stats: bool = True,
+        stats_callback: Callable = None,
+        track_memory: bool = False,
+        resource_policy: Union[ResourcePolicy, dict] = None,
+        time_budget: float = None,
     ) -> Counterfactuals:
         """Generate counterfactual examples.
 
@@ -167,9 +332,10 @@ class GAMCoach:
         examples for the given data point.
 
         Args:
-            cur_example (np.ndarray): The data point of interest. This function
-                aims to find similar examples that the model gives different
-                predictions.
+            cur_example (Union[np.ndarray, pd.DataFrame, dict]): The data point
+                of interest. This function aims to find similar examples that
+                the model gives different predictions. It can also be a
+                one-row DataFrame or a dictionary of feature values.
             total_cfs (int, optional): The total number of counterfactuals to,
                 generate. Default to 1.
             target_range (tuple, optional): The targetted prediction range. This
@@ -181,7 +347,14 @@ class GAMCoach:
                 * average additive score range of all continuous features. If
                 `sim_threshold_factor` is too small, it takes longer time to
                 generate CFs. If `sim_threshold_factor` is too large, the
-                algorithm might miss some optimal CFs.
+                algorithm might miss some optimal CFs. If it is 'auto', we pick
+                a threshold for each continuous feature, proportional to the
+                spread of its score gains, so that the MILP fits in
+                `variable_budget` and `constraint_budget`. We then tighten the
+                thresholds when the pruning might have changed the optimal CF,
+                as long as the MILP stays in the budgets.
+                `solver_stats['certified']` of the result is true if the first
+                CF is certified to be optimal with all options.
             sim_threshold (float, optional): A positive float to determine how we
                 decide if two bins of a continuous feature have similar scores.
                 Two bins $b_1$ and $b_2$ are similar (the distant one will be
@@ -193,7 +366,8 @@ class GAMCoach:
                 comparable range. To do that, we multiply the categorical feature's
                 distances by `categorical_weight`. By default ('auto'), we scale
                 the distances of categorical features so that they have the mean
-                distance as continuous features.
+                distance as continuous features, or use 1 if the options only
+                have one of the two feature types.
             features_to_vary ([str], optional): A list of feature names that
                 the CFs can change. If it is `None`, this function will use all
                 features.
@@ -207,13 +381,150 @@ class GAMCoach:
                 continuous features that need to be integers (e.g., age, FICO score)
             verbose (int): 0: no any output, 1: show progress bar, 2: show internal
                 optimization details
+            variable_budget (int, optional): The target max number of MILP
+                variables. It is only used when `sim_threshold_factor` is
+                'auto'. Default to 2000.
+            constraint_budget (int, optional): The target max number of MILP
+                constraints. It is only used when `sim_threshold_factor` is
+                'auto'. Default is no maximum.
+            verify (bool, optional): If true, predict the generated CFs and
+                flag the ones that do not reach the target prediction. Set it
+                to false when generating many CFs, and then call
+                `verify_cfs()` once for all results. Default to true.
+            collect_stats (bool, optional): If true, record the wall and CPU
+                time of each stage, the number of options after each filter,
+                and the size of each MILP in `Counterfactuals.stats`. Default
+                to true.
+            stats_callback (Callable, optional): A function to call with the
+                `GenerationStats` after the CFs are generated. Stats are
+                collected if it is given. Functions added with
+                `add_stats_hook()` are also called.
+            track_memory (bool, optional): If true, trace the memory of each
+                stage with tracemalloc, and record the peak bytes, the largest
+                allocation sites, and the estimated bytes per option and per
+                MILP variable in `Counterfactuals.stats`. It slows down the
+                generation. Default to false.
+            resource_policy (Union[ResourcePolicy, dict], optional): Limits of
+                the MILP size, or a dictionary of `ResourcePolicy` arguments.
+                We predict the MILP size from the main effect options. If it
+                exceeds the limits, we coarsen the options, drop interaction
+                variables, or vary fewer features until it fits, and record
+                the changes in `Counterfactuals.degradation`. Default is no
+                limit.
+            time_budget (float, optional): Max number of seconds of the call.
+                Each MILP solve is stopped when the budget runs out, and we
+                stop generating more CFs. The CFs found within the budget are
+                returned, and `solver_stats['timed_out']` is true. CFs of a
+                stopped solve can be further from the optimal CFs. Default is
+                no limit.
 
         Returns:
             Counterfactuals: The generated counterfactual examples with their
                 associated distances and change information.
+
+        Raises:
+            ResourceLimitError: If the predicted MILP exceeds `resource_policy`
+                and the policy refuses it or cannot degrade it enough.
         """
+        return run_steps(
+            self._generate_cfs_steps(
+                cur_example,
+                total_cfs=total_cfs,
+                target_range=target_range,
+                sim_threshold_factor=sim_threshold_factor,
+                sim_threshold=sim_threshold,
+                categorical_weight=categorical_weight,
+                features_to_vary=features_to_vary,
+                max_num_features_to_vary=max_num_features_to_vary,
+                feature_ranges=feature_ranges,
+                continuous_integer_features=continuous_integer_features,
+                verbose=verbose,
+                variable_budget=variable_budget,
+                constraint_budget=constraint_budget,
+                verify=verify,
+                collect_stats=collect_stats,
+                stats_callback=stats_callback,
+                track_memory=track_memory,
+                resource_policy=resource_policy,
+                time_budget=time_budget,
+            )
+        )
+
+    async def generate_cfs_async(
+        self,
+        cur_example: Union[np.ndarray, dict],
+        executor: Executor = None,
+        **kwargs,
+    ) -> Counterfactuals:
+        """Generate counterfactual examples without blocking the event loop.
+
+        It is the asyncio version of `generate_cfs()`. We run the option
+        generation and MILP building steps in `executor`, and wait for each
+        MILP solver as an asyncio subprocess. Cancelling the task (e.g., with
+        `asyncio.wait_for()`) kills the running solver and stops the
+        generation after its current step. Use `time_budget` to get the CFs
+        found within a deadline instead.
+
+        Args:
+            cur_example (Union[np.ndarray, pd.DataFrame, dict]): The data point
+                of interest.
+            executor (concurrent.futures.Executor, optional): Executor to run
+                the CPU steps. By default, we use the loop's default executor.
+            **kwargs: Other arguments of `generate_cfs()`, such as
+                `total_cfs`, `features_to_vary`, and `time_budget`.
+
+        Returns:
+            Counterfactuals: The generated counterfactual examples with their
+                associated distances and change information.
+        """
+        return await run_steps_async(
+            self._generate_cfs_steps(cur_example, **kwargs), executor
+        )
+
+    def _generate_cfs_steps(
+        self,
+        cur_example: Union[np.ndarray, dict],
+        total_cfs: int = 1,
+        target_range: tuple = None,
+        sim_threshold_factor: Union[float, str] = 0.005,
+        sim_threshold: float = None,
+        categorical_weight: Union[float, str] = "auto",
+        features_to_vary: list = None,
+        max_num_features_to_vary: int = None,
+        feature_ranges: dict = None,
+        continuous_integer_features: list = None,
+        verbose: int = 1,
+        variable_budget: int = 2000,
+        constraint_budget: int = None,
+        verify: bool = True,
+        collect_stats: bool = True,
+        stats_callback: Callable = None,
+        track_memory: bool = False,
+        resource_policy: Union[ResourcePolicy, dict] = None,
+        time_budget: float = None,
+    ):
+        """Step generator of `generate_cfs()`. It yields a `SolveRequest` for
+        each MILP, expects the MILP to be solved when it resumes, and returns
+        the `Counterfactuals`. See `gamcoach.solver` to run it."""
+        import pulp
+        from tqdm import tqdm
+
+        stats = None
+        if collect_stats or stats_callback is not None or track_memory:
+            stats = GenerationStats(track_memory=track_memory)
+            stats.metadata["model_fingerprint"] = self.model_fingerprint
+
+        resource_policy = as_resource_policy(resource_policy)
+
+        # Deadline of the time budget in `perf_counter()` seconds
+        deadline = None
+        if time_budget is not None:
+            deadline = perf_counter() + time_budget
 
         # Transforming some parameters
+        if is_columnar(cur_example):
+            cur_example = ColumnarData.from_data(self.ebm, cur_example).to_numpy()
+
         if len(cur_example.shape) == 1:
             cur_example = cur_example.reshape(1, -1)
 
@@ -225,62 +536,76 @@ class GAMCoach:
             ]
 
         # Step 1: Find the current score for each feature
-        # This is done by ebm.explain_local()
-        cur_scores = {}
+        # This is done by ebm.eval_terms()
+        with time_stage(stats, "explain_local"):
+            cur_scores = {}
 
-        if self.is_classifier:
-            cur_scores["intercept"] = self.ebm.intercept_[0]
-        else:
-            cur_scores["intercept"] = self.ebm.intercept_
+            if self.is_classifier:
+                cur_scores["intercept"] = self.ebm.intercept_[0]
+            else:
+                cur_scores["intercept"] = self.ebm.intercept_
 
-        local_data = self.ebm.explain_local(cur_example)._internal_obj
+            term_scores = self.discretizer.eval_terms(
+                cur_example, self.ebm.term_features_, self.ebm.term_scores_
+            )[0]
 
-        for i in range(len(self.feature_names)):
-            cur_feature_name = self.feature_names[i]
-            cur_feature_type = self.feature_types[i]
-            cur_scores[cur_feature_name] = local_data["specific"][0]["scores"][i]
+            for i in range(len(self.feature_names)):
+                cur_feature_name = self.feature_names[i]
+                cur_scores[cur_feature_name] = term_scores[i]
 
-        # Find the CF direction
+            # Find the CF direction
 
-        # Binary classification
-        # Predicted 0 => +1
-        # Predicted 1 => -1
-        if self.is_classifier:
-            cf_direction = self.ebm.predict(cur_example)[0] * (-2) + 1
-            total_score = np.sum([cur_scores[k] for k in cur_scores])
-            needed_score_gain = -total_score
-            score_gain_bound = None
+            # Binary classification
+            # Predicted 0 => +1
+            # Predicted 1 => -1
+            if self.is_classifier:
+                cf_direction = self.ebm.predict(cur_example)[0] * (-2) + 1
+                total_score = np.sum([cur_scores[k] for k in cur_scores])
+                needed_score_gain = -total_score
+                score_gain_bound = None
+                cf_target = self.ebm.classes_[int(cf_direction == 1)]
 
-        else:
-            # Regression
-            # Increase +1
-            # Decrease -1
-            if target_range is None:
-                raise ValueError(
-                    "target_range cannot be None when the model is a regressor"
-                )
+            else:
+                # Regression
+                # Increase +1
+                # Decrease -1
+                if target_range is None:
+                    raise ValueError(
+                        "target_range cannot be None when the model is a regressor"
+                    )
 
-            predicted_value = self.ebm.predict(cur_example)[0]
-            if (
-                predicted_value >= target_range[0]
-                and predicted_value <= target_range[1]
-            ):
-                raise ValueError("The target_range cannot cover the current prediction")
+                predicted_value = self.ebm.predict(cur_example)[0]
+                if (
+                    predicted_value >= target_range[0]
+                    and predicted_value <= target_range[1]
+                ):
+                    raise ValueError(
+                        "The target_range cannot cover the current prediction"
+                    )
 
-            elif predicted_value < target_range[0]:
-                cf_direction = 1
-                needed_score_gain = target_range[0] - predicted_value
-                score_gain_bound = target_range[1] - predicted_value
-            else:
-                cf_direction = -1
-                needed_score_gain = target_range[1] - predicted_value
-                score_gain_bound = target_range[0] - predicted_value
+                elif predicted_value < target_range[0]:
+                    cf_direction = 1
+                    needed_score_gain = target_range[0] - predicted_value
+                    score_gain_bound = target_range[1] - predicted_value
+                else:
+                    cf_direction = -1
+                    needed_score_gain = target_range[1] - predicted_value
+                    score_gain_bound = target_range[0] - predicted_value
+
+                cf_target = tuple(target_range)
 
         # Step 2: Generate continuous and categorical options
         options = {}
 
         # Generate a similarity threshold if it is not provided
-        if sim_threshold is None:
+        auto_sim_threshold = sim_threshold is None and sim_threshold_factor == "auto"
+
+        if auto_sim_threshold:
+            # Keep all options for now, we prune them after knowing the size of
+            # the MILP
+            sim_threshold = 0
+
+        elif sim_threshold is None:
             additive_ranges = []
 
             for i in range(len(self.feature_names)):
@@ -330,18 +655,19 @@ class GAMCoach:
                 ):
                     need_to_be_int = True
 
-                cur_cont_options = self.generate_cont_options(
-                    cf_direction,
-                    cur_feature_index,
-                    cur_feature_name,
-                    cur_feature_value,
-                    cur_feature_score,
-                    self.cont_mads,
-                    cur_example[0],
-                    score_gain_bound,
-                    epsilon,
-                    need_to_be_int,
-                )
+                with time_stage(stats, "generate_cont_options"):
+                    cur_cont_options = self.generate_cont_options(
+                        cf_direction,
+                        cur_feature_index,
+                        cur_feature_name,
+                        cur_feature_value,
+                        cur_feature_score,
+                        self.cont_mads,
+                        cur_example[0],
+                        score_gain_bound,
+                        epsilon,
+                        need_to_be_int,
+                    )
 
                 options[cur_feature_name] = cur_cont_options
 
@@ -350,43 +676,338 @@ class GAMCoach:
                 cur_feature_value = str(cur_example[0][cur_feature_id])
                 cur_cat_distance = self.cat_distances[cur_feature_name]
 
-                cur_cat_options = self.generate_cat_options(
-                    cf_direction,
-                    cur_feature_index,
-                    cur_feature_value,
-                    cur_feature_score,
-                    cur_cat_distance,
-                    cur_example[0],
-                    score_gain_bound,
-                )
+                with time_stage(stats, "generate_cat_options"):
+                    cur_cat_options = self.generate_cat_options(
+                        cf_direction,
+                        cur_feature_index,
+                        cur_feature_value,
+                        cur_feature_score,
+                        cur_cat_distance,
+                        cur_example[0],
+                        score_gain_bound,
+                    )
 
                 options[cur_feature_name] = cur_cat_options
 
+        if stats is not None:
+            stats.record_options("generated", options)
+
         # Step 2.2: Filter out undesired options (based on the feature_range)
         if feature_ranges is not None:
-            for f_name in feature_ranges:
-                cur_range = feature_ranges[f_name]
+            with time_stage(stats, "filter_feature_ranges"):
+                for f_name in feature_ranges:
+                    cur_range = feature_ranges[f_name]
+                    f_index = self.feature_names.index(f_name)
+                    f_type = self.feature_types[f_index]
+                    cur_targets = options[f_name].targets
+
+                    if f_type == "continuous":
+                        # Delete options that use out-of-range options
+                        is_in_range = (cur_targets >= cur_range[0]) & (
+                            cur_targets <= cur_range[1]
+                        )
+                        options[f_name] = options[f_name].take(is_in_range)
+                    elif f_type == "categorical":
+                        is_in_range = np.array(
+                            [t in cur_range for t in cur_targets], dtype=bool
+                        )
+                        options[f_name] = options[f_name].take(is_in_range)
+
+            if stats is not None:
+                stats.record_options("feature_ranges", options)
+
+        # Step 2.3: Rescale categorical distances so that they have the same mean
+        # as continuous variables (default)
+        with time_stage(stats, "scale_categorical_distances"):
+            if categorical_weight == "auto":
+                cont_distances = []
+                cat_distances = []
+
+                for f_name in options:
+                    f_index = self.feature_names.index(f_name)
+                    f_type = self.feature_types[f_index]
+
+                    if f_type == "continuous":
+                        cont_distances.append(options[f_name].distances)
+                    elif f_type == "categorical":
+                        cat_distances.append(options[f_name].distances)
+
+                # Nothing to balance if one of the feature types has no options
+                cont_distances = np.concatenate(cont_distances or [np.empty(0)])
+                cat_distances = np.concatenate(cat_distances or [np.empty(0)])
+
+                if len(cont_distances) > 0 and np.sum(cat_distances) > 0:
+                    categorical_weight = np.mean(cont_distances) / np.mean(
+                        cat_distances
+                    )
+                else:
+                    categorical_weight = 1
+
+            for f_name in options:
                 f_index = self.feature_names.index(f_name)
                 f_type = self.feature_types[f_index]
 
-                if f_type == "continuous":
-                    # Delete options that use out-of-range options
-                    for o in range(len(options[f_name]) - 1, -1, -1):
-                        cur_target = options[f_name][o][0]
-                        if cur_target < cur_range[0] or cur_target > cur_range[1]:
-                            options[f_name].pop(o)
-                elif f_type == "categorical":
-                    for o in range(len(options[f_name]) - 1, -1, -1):
-                        if options[f_name][o][0] not in cur_range:
-                            options[f_name].pop(o)
-
-        # Step 2.3: Compute the interaction offsets for all possible options
+                if f_type == "categorical":
+                    options[f_name].distances *= categorical_weight
+
+        # Step 2.4: Predict the MILP size from the option counts, and degrade
+        # the problem (or refuse it) if it exceeds the resource policy
+        skipped_terms = []
+        degradation = None
+
+        if resource_policy is not None:
+            with time_stage(stats, "apply_resource_policy"):
+                (
+                    options,
+                    features_to_vary,
+                    skipped_terms,
+                    degradation,
+                ) = self._apply_resource_policy(
+                    options,
+                    features_to_vary,
+                    resource_policy,
+                    max_num_features_to_vary,
+                )
+
+            if stats is not None:
+                stats.metadata["degradations"] = [
+                    step["action"] for step in degradation["steps"]
+                ]
+
+        # Step 2.5: Remove redundant continuous options with feature-specific
+        # thresholds (auto mode), and compute the interaction offsets for all
+        # possible options
+        sim_thresholds = {}
+        first_milp = None
+        is_certified = None
+
+        if auto_sim_threshold:
+            full_options = options
+            with time_stage(stats, "tune_sim_thresholds"):
+                scale = self._tune_sim_threshold_scale(
+                    full_options,
+                    features_to_vary,
+                    variable_budget,
+                    constraint_budget,
+                    max_num_features_to_vary,
+                    skipped_terms,
+                )
+
+            for round_index in range(MAX_SIM_THRESHOLD_ROUNDS):
+                first_milp = None
+                with time_stage(stats, "prune_options"):
+                    options, sim_thresholds = self._prune_options(full_options, scale)
+
+                if stats is not None:
+                    stats.record_options("pruned", options)
+
+                with time_stage(stats, "generate_inter_options"):
+                    self._add_inter_options(options, cur_scores, skipped_terms)
+
+                # Nothing is pruned with scale 0
+                if scale == 0:
+                    is_certified = True
+                    break
+
+                # We skip the certificate if the time budget is used up
+                if _get_time_limit(deadline) == 0:
+                    is_certified = False
+                    break
+
+                # Check if the pruning could have affected the optimal CF. If
+                # so, we tighten all thresholds and try again.
+                is_certified, first_milp = yield from self._certify_sim_thresholds(
+                    cf_direction,
+                    needed_score_gain,
+                    features_to_vary,
+                    options,
+                    full_options,
+                    cur_example,
+                    max_num_features_to_vary,
+                    verbose,
+                    stats,
+                    deadline,
+                )
+
+                if (
+                    is_certified
+                    or round_index == MAX_SIM_THRESHOLD_ROUNDS - 1
+                    or _get_time_limit(deadline) == 0
+                ):
+                    break
+
+                # Tighten the thresholds only if the MILP stays in the budgets.
+                # Otherwise, we keep the uncertified CF of this round.
+                next_options, _ = self._prune_options(full_options, scale / 2)
+                next_size = self._estimate_milp_size(
+                    next_options,
+                    features_to_vary,
+                    max_num_features_to_vary,
+                    skipped_terms,
+                )
+                if not _fits_budget(next_size, variable_budget, constraint_budget):
+                    break
+
+                scale /= 2
+
+        else:
+            for f_name in options:
+                if self.feature_types[self.feature_names.index(f_name)] == "continuous":
+                    sim_thresholds[f_name] = sim_threshold
+
+            with time_stage(stats, "generate_inter_options"):
+                self._add_inter_options(options, cur_scores, skipped_terms)
+
+        # Thresholds of the policy's coarsening add up with the ones above
+        if degradation is not None:
+            for f_name, threshold in degradation["sim_thresholds"].items():
+                sim_thresholds[f_name] = sim_thresholds.get(f_name, 0) + threshold
+
+        if stats is not None:
+            stats.record_options("final", options)
+
+        # Step 3. Formulate the MILP model and solve it
+
+        # Find diverse solutions by accumulatively muting the optimal solutions
+        solutions = []
+        muted_variables = []
+        solver_stats = {
+            "statuses": [],
+            "sol_statuses": [],
+            "solution_times": [],
+            "timed_out": False,
+            "certified": is_certified,
+        }
+        model = None
+
+        for i in tqdm(range(total_cfs), disable=verbose == 0):
+            # Stop when the time budget is used up, but keep the first MILP
+            # that has been solved when certifying the thresholds
+            if _get_time_limit(deadline) == 0 and (i > 0 or first_milp is None):
+                solver_stats["timed_out"] = True
+                break
+
+            with time_round(stats, i):
+                if i == 0 and first_milp is not None:
+                    # The first MILP has been solved when certifying the thresholds
+                    model, variables = first_milp
+                else:
+                    with time_stage(stats, "create_milp"):
+                        new_model, variables = self.create_milp(
+                            cf_direction,
+                            needed_score_gain,
+                            features_to_vary,
+                            options,
+                            max_num_features_to_vary,
+                            muted_variables=muted_variables,
+                            feature_names=self.feature_names,
+                            feature_groups=self.feature_groups,
+                        )
+
+                    # The budget can run out while creating the MILP. We do
+                    # not send the MILP to the solver then.
+                    time_limit = _get_time_limit(deadline)
+                    if time_limit == 0:
+                        solver_stats["timed_out"] = True
+                        break
+
+                    model = new_model
+                    with time_stage(stats, "solve_milp"):
+                        yield SolveRequest(model, verbose > 1, time_limit)
+
+                    if stats is not None:
+                        stats.record_milp("cf", model, time_limit is not None)
+
+                solver_stats["statuses"].append(int(model.status))
+                solver_stats["sol_statuses"].append(int(model.sol_status))
+                solver_stats["solution_times"].append(float(model.solutionTime))
+
+                # A solve stopped by the time budget uses it up, so we keep
+                # its solution if it has one, and stop there
+                timed_out = is_time_limited(model, deadline is not None)
+                if timed_out:
+                    solver_stats["timed_out"] = True
+
+                if model.status != 1:
+                    if timed_out:
+                        break
+                    continue
+
+                if verbose == 2:
+                    print("solver runs for {:.2f} seconds".format(model.solutionTime))
+                    print("status: {}".format(pulp.LpStatus[model.status]))
+
+                # (feature id, option row) of the used options
+                active_options = variables.get_active_options()
+
+                # Print the optimal solution
+                if verbose == 2:
+                    print("\nFound solutions:")
+                    self.print_solution(cur_example, active_options, options)
+
+                # Collect the current solution and mute the associated variables
+                solutions.append([active_options, pulp.value(model.objective)])
+
+                for f_id, row in active_options:
+                    if self.feature_types[f_id] != "interaction":
+                        muted_variables.append((f_id, row))
+
+                if timed_out:
+                    break
+
+        with time_stage(stats, "collect_cfs"):
+            cfs = Counterfactuals(
+                solutions,
+                model,
+                self.ebm,
+                cur_example,
+                options,
+                sim_thresholds=sim_thresholds,
+                feature_names=self.feature_names,
+                feature_types=self.feature_types,
+                solver_stats=solver_stats,
+                target=cf_target,
+                verify=verify,
+                stats=stats,
+                degradation=degradation,
+            )
+
+        if stats is not None:
+            stats.finish(len(cfs))
+            METRICS.record_generation(stats)
+
+            if verbose == 2:
+                print(stats)
+
+            for hook in STATS_HOOKS:
+                hook(stats)
+
+            if stats_callback is not None:
+                stats_callback(stats)
+
+        return cfs
+
+    def _add_inter_options(self, options, cur_scores, skipped_terms=()):
+        """
+        Compute the interaction offsets for all possible options, and add them
+        to `options` in place.
+
+        Args:
+            options (dict): The current option list, feature_name ->
+                [`target`, `score_gain`, `distance`, `bin_id`].
+            cur_scores (dict): The current score of each feature.
+            skipped_terms (list[str], optional): Names of interaction terms to
+                leave out of the MILP.
+        """
         for cur_feature_id in range(len(self.feature_names)):
 
             cur_feature_name = self.feature_names[cur_feature_id]
             cur_feature_type = self.feature_types[cur_feature_id]
 
-            if cur_feature_type == "interaction":
+            if (
+                cur_feature_type == "interaction"
+                and cur_feature_name not in skipped_terms
+            ):
 
                 cur_feature_index_1 = self.feature_groups[cur_feature_id][0]
                 cur_feature_index_2 = self.feature_groups[cur_feature_id][1]
@@ -400,82 +1021,534 @@ class GAMCoach:
                     options,
                 )
 
-        # Step 2.4: Rescale categorical distances so that they have the same mean
-        # as continuous variables (default)
-        if categorical_weight == "auto":
-            cont_distances = []
-            cat_distances = []
+    def _estimate_milp_size(
+        self,
+        options,
+        features_to_vary,
+        max_num_features_to_vary=None,
+        skipped_terms=(),
+    ):
+        """
+        Count the variables, constraints, and interaction cells of the MILP
+        that `create_milp()` would build from the given main effect options.
 
-            for f_name in options:
-                f_index = self.feature_names.index(f_name)
-                f_type = self.feature_types[f_index]
+        Args:
+            options (dict): Options of continuous and categorical features.
+            features_to_vary (list[str]): Feature names of features that the
+                generated CF can change.
+            max_num_features_to_vary (int, optional): Max number of features
+                that the generated CF can change.
+            skipped_terms (list[str], optional): Names of interaction terms
+                that are left out of the MILP.
 
-                if f_type == "continuous":
-                    for option in options[f_name]:
-                        cont_distances.append(option[2])
-                elif f_type == "categorical":
-                    for option in options[f_name]:
-                        cat_distances.append(option[2])
+        Returns:
+            dict: 'num_variables', 'num_constraints', and
+                'num_interaction_cells' (number of interaction variables).
+        """
+        num_variables = 0
+        num_constraints = len(features_to_vary) + 1
+        num_cells = 0
+
+        for f_name in features_to_vary:
+            num_variables += len(options[f_name])
+
+        if max_num_features_to_vary is not None:
+            num_constraints += 1
+
+        for cur_feature_id in range(len(self.feature_names)):
+            if (
+                self.feature_types[cur_feature_id] == "interaction"
+                and self.feature_names[cur_feature_id] not in skipped_terms
+            ):
+                f1_name = self.feature_names[self.feature_groups[cur_feature_id][0]]
+                f2_name = self.feature_names[self.feature_groups[cur_feature_id][1]]
+
+                if f1_name in features_to_vary and f2_name in features_to_vary:
+                    num_cells += len(options[f1_name]) * len(options[f2_name])
 
-            categorical_weight = np.mean(cont_distances) / np.mean(cat_distances)
+        # Each interaction variable comes with three constraints
+        return {
+            "num_variables": num_variables + num_cells,
+            "num_constraints": num_constraints + 3 * num_cells,
+            "num_interaction_cells": num_cells,
+        }
+
+    def _prune_options(self, options, scale):
+        """
+        Remove redundant continuous options with feature-specific similarity
+        thresholds. The threshold of a feature is `scale` * the spread of its
+        options' score gains.
+
+        Args:
+            options (dict): Options of continuous and categorical features.
+                This dictionary is not modified.
+            scale (float): A non-negative float to scale the score gain spread.
+
+        Returns:
+            A tuple (`pruned_options`, `sim_thresholds`), where
+            `sim_thresholds` maps continuous feature names to their thresholds.
+        """
+        pruned_options = {}
+        sim_thresholds = {}
 
         for f_name in options:
-            f_index = self.feature_names.index(f_name)
-            f_type = self.feature_types[f_index]
+            f_type = self.feature_types[self.feature_names.index(f_name)]
+
+            if f_type == "continuous":
+                epsilon = scale * _get_score_gain_spread(options[f_name])
+                sim_thresholds[f_name] = epsilon
+                pruned_options[f_name] = _remove_redundant_options(
+                    options[f_name], epsilon
+                )
+            else:
+                pruned_options[f_name] = options[f_name]
 
-            if f_type == "categorical":
-                for option in options[f_name]:
-                    option[2] = option[2] * categorical_weight
+        return pruned_options, sim_thresholds
 
-        # Step 3. Formulate the MILP model and solve it
+    def _tune_sim_threshold_scale(
+        self,
+        options,
+        features_to_vary,
+        variable_budget=None,
+        constraint_budget=None,
+        max_num_features_to_vary=None,
+        skipped_terms=(),
+        resource_policy=None,
+    ):
+        """
+        Find the smallest threshold scale (see `_prune_options()`) so that the
+        MILP fits in the variable and constraint budgets, and in the resource
+        policy if it is given.
 
-        # Find diverse solutions by accumulatively muting the optimal solutions
-        solutions = []
-        muted_variables = []
+        Args:
+            options (dict): Options of continuous and categorical features
+                without any redundancy pruning.
+            features_to_vary (list[str]): Feature names of features that the
+                generated CF can change.
+            variable_budget (int, optional): Max number of MILP variables.
+            constraint_budget (int, optional): Max number of MILP constraints.
+            max_num_features_to_vary (int, optional): Max number of features
+                that the generated CF can change.
+            skipped_terms (list[str], optional): Names of interaction terms
+                that are left out of the MILP.
+            resource_policy (ResourcePolicy, optional): Limits of the MILP size.
+
+        Returns:
+            float: The threshold scale between 0 and 1. If even scale 1 does not
+                fit in the budgets, we return 1.
+        """
+
+        def fits_budget(scale):
+            pruned_options, _ = self._prune_options(options, scale)
+            size = self._estimate_milp_size(
+                pruned_options,
+                features_to_vary,
+                max_num_features_to_vary,
+                skipped_terms,
+            )
+            return _fits_budget(
+                size, variable_budget, constraint_budget, resource_policy
+            )
 
-        for _ in tqdm(range(total_cfs), disable=verbose == 0):
+        if fits_budget(0):
+            return 0
+
+        if not fits_budget(1):
+            return 1
+
+        # Bisection search, the number of kept options decreases with the scale
+        low, high = 0, 1
+        for _ in range(SIM_THRESHOLD_SEARCH_STEPS):
+            mid = (low + high) / 2
+            if fits_budget(mid):
+                high = mid
+            else:
+                low = mid
+
+        return high
+
+    def _apply_resource_policy(
+        self,
+        options,
+        features_to_vary,
+        resource_policy,
+        max_num_features_to_vary=None,
+    ):
+        """
+        Predict the MILP size from the main effect options, and degrade the
+        problem until it fits in the resource policy. See `gamcoach.policy` for
+        the degradations.
+
+        Args:
+            options (dict): Options of continuous and categorical features.
+                This dictionary is not modified.
+            features_to_vary (list[str]): Feature names of features that the
+                generated CF can change.
+            resource_policy (ResourcePolicy): Limits of the MILP size.
+            max_num_features_to_vary (int, optional): Max number of features
+                that the generated CF can change.
+
+        Returns:
+            A tuple (`options`, `features_to_vary`, `skipped_terms`,
+            `degradation`), where `skipped_terms` lists the interaction terms to
+            leave out of the MILP, and `degradation` records the policy, the
+            predicted size, the applied steps with their sizes, the final
+            size, and the thresholds of the coarsened options.
+
+        Raises:
+            ResourceLimitError: If the policy refuses the MILP, or if the MILP
+                still exceeds the policy after all degradations.
+        """
+        features_to_vary = list(features_to_vary)
+        skipped_terms = []
+
+        size = self._estimate_milp_size(
+            options, features_to_vary, max_num_features_to_vary, skipped_terms
+        )
+
+        degradation = {
+            "policy": resource_policy.to_dict(),
+            "predicted_size": size,
+            "steps": [],
+            "size": size,
+            "sim_thresholds": {},
+        }
+
+        if resource_policy.fits(size):
+            METRICS.record_admission("admitted")
+            return options, features_to_vary, skipped_terms, degradation
+
+        if resource_policy.on_exceed == "refuse":
+            METRICS.record_admission("refused")
+            raise ResourceLimitError(
+                "The predicted MILP exceeds the resource policy: {}".format(
+                    "; ".join(resource_policy.get_violations(size))
+                ),
+                size,
+                resource_policy,
+            )
+
+        for action in resource_policy.degradations:
+            if resource_policy.fits(size):
+                break
+
+            if action == "coarsen_bins":
+                scale = self._tune_sim_threshold_scale(
+                    options,
+                    features_to_vary,
+                    max_num_features_to_vary=max_num_features_to_vary,
+                    skipped_terms=skipped_terms,
+                    resource_policy=resource_policy,
+                )
+                options, degradation["sim_thresholds"] = self._prune_options(
+                    options, scale
+                )
+                step = {"action": action, "scale": scale}
+
+            elif action == "prune_interactions":
+                # Drop the pair terms with the smallest score range first
+                candidates = []
+                for cur_feature_id in range(len(self.feature_names)):
+                    if self.feature_types[cur_feature_id] != "interaction":
+                        continue
+
+                    f1_id, f2_id = self.feature_groups[cur_feature_id]
+                    if (
+                        self.feature_names[f1_id] in features_to_vary
+                        and self.feature_names[f2_id] in features_to_vary
+                    ):
+                        additives = self.ebm.term_scores_[cur_feature_id][1:-1, 1:-1]
+                        candidates.append(
+                            (np.ptp(additives), self.feature_names[cur_feature_id])
+                        )
+
+                step = {"action": action, "terms": []}
+                for _, term_name in sorted(candidates):
+                    skipped_terms.append(term_name)
+                    step["terms"].append(term_name)
+
+                    size = self._estimate_milp_size(
+                        options,
+                        features_to_vary,
+                        max_num_features_to_vary,
+                        skipped_terms,
+                    )
+                    if resource_policy.fits(size):
+                        break
+
+            elif action == "approximate":
+                # Keep the features with the largest possible score gains, and
+                # skip the ones that do not fit
+                def get_max_gain(f_name):
+                    gains = options[f_name].gains
+                    return np.max(np.abs(gains)) if len(gains) > 0 else 0
+
+                kept_features = []
+                for f_name in sorted(features_to_vary, key=get_max_gain, reverse=True):
+                    cur_size = self._estimate_milp_size(
+                        options,
+                        kept_features + [f_name],
+                        max_num_features_to_vary,
+                        skipped_terms,
+                    )
+                    if resource_policy.fits(cur_size):
+                        kept_features.append(f_name)
+
+                step = {
+                    "action": action,
+                    "features": [f for f in features_to_vary if f not in kept_features],
+                }
+                features_to_vary = [f for f in features_to_vary if f in kept_features]
+
+            size = self._estimate_milp_size(
+                options, features_to_vary, max_num_features_to_vary, skipped_terms
+            )
+            step["size"] = size
+            degradation["steps"].append(step)
+
+        degradation["size"] = size
+
+        if not resource_policy.fits(size):
+            METRICS.record_admission("refused")
+            raise ResourceLimitError(
+                "The MILP exceeds the resource policy after degrading it with "
+                "{}: {}".format(
+                    [step["action"] for step in degradation["steps"]],
+                    "; ".join(resource_policy.get_violations(size)),
+                ),
+                size,
+                resource_policy,
+            )
+
+        METRICS.record_admission("degraded")
+        return options, features_to_vary, skipped_terms, degradation
+
+    def _certify_sim_thresholds(
+        self,
+        cf_direction,
+        needed_score_gain,
+        features_to_vary,
+        options,
+        full_options,
+        cur_example,
+        max_num_features_to_vary=None,
+        verbose=1,
+        stats=None,
+        deadline=None,
+    ):
+        """
+        Check if removing redundant options could have changed the optimal CF.
+
+        Each removed option can be replaced by a kept option of the same
+        feature that has a lower distance. If we give each kept option the
+        best score gain of the options it replaces, and each interaction
+        variable the best pair score of these options (see
+        `_get_relaxed_options()`), any CF with all options maps to a CF with
+        kept options, a lower distance, and a higher relaxed score gain. The
+        MILP with the relaxed gains therefore gives a lower bound of the
+        optimal distance. If this lower bound matches the optimal distance
+        found with the pruned options, the optimal CF is certified.
+
+        Args:
+            cf_direction (int): Integer +1 if 0 => 1, -1 if 1 => 0
+                (classification), +1 if we need to incrase the prediction, -1
+                if decrease (regression).
+            needed_score_gain (float): The score gain needed to achieve the CF
+                goal.
+            features_to_vary (list[str]): Feature names of features that the
+                generated CF can change.
+            options (dict): Pruned options, including interaction options.
+            full_options (dict): Options of continuous and categorical
+                features without any redundancy pruning.
+            cur_example (np.ndarray): The original data point, as a (1,
+                n_features) array.
+            max_num_features_to_vary (int, optional): Max number of features
+                that the generated CF can change.
+            verbose (int): 0: no any output, 1: show progress bar, 2: show
+                internal optimization details
+            stats (GenerationStats, optional): Record the MILP timings and
+                sizes in this object.
+            deadline (float, optional): Deadline of the time budget in
+                `perf_counter()` seconds.
+
+        Returns:
+            A tuple (`is_certified`, (`model`, `variables`)), where `model` is
+            the solved MILP with the pruned options, or (False, None) if the
+            time budget runs out before solving it. It is the return value of
+            this step generator (see `_generate_cfs_steps()`), so call it with
+            `yield from`.
+        """
+        import pulp
+
+        with time_stage(stats, "create_milp"):
             model, variables = self.create_milp(
                 cf_direction,
                 needed_score_gain,
                 features_to_vary,
                 options,
                 max_num_features_to_vary,
-                muted_variables=muted_variables,
+                feature_names=self.feature_names,
+                feature_groups=self.feature_groups,
             )
 
-            model.solve(pulp.apis.PULP_CBC_CMD(msg=verbose > 1, warmStart=True))
+        # The budget can run out while creating the MILP
+        time_limit = _get_time_limit(deadline)
+        if time_limit == 0:
+            return False, None
 
-            if model.status != 1:
-                continue
+        with time_stage(stats, "solve_milp"):
+            yield SolveRequest(model, verbose > 1, time_limit)
 
-            if verbose == 2:
-                print("solver runs for {:.2f} seconds".format(model.solutionTime))
-                print("status: {}".format(pulp.LpStatus[model.status]))
+        if stats is not None:
+            stats.record_milp("certify", model, time_limit is not None)
 
-            active_variables = []
+        if model.status != 1:
+            return False, (model, variables)
 
-            # Print the optimal solution
-            for key in variables:
-                for x in variables[key]:
-                    if x.varValue > 0:
-                        active_variables.append(x)
+        relaxed_options = self._get_relaxed_options(
+            cf_direction, cur_example, features_to_vary, full_options, options
+        )
 
-            if verbose == 2:
-                print("\nFound solutions:")
-                self.print_solution(cur_example, active_variables, options)
+        with time_stage(stats, "create_milp"):
+            relaxed_model, _ = self.create_milp(
+                cf_direction,
+                needed_score_gain,
+                features_to_vary,
+                relaxed_options,
+                max_num_features_to_vary,
+                feature_names=self.feature_names,
+                feature_groups=self.feature_groups,
+            )
 
-            # Collect the current solution and mute the associated variables
-            solutions.append([active_variables, pulp.value(model.objective)])
+        time_limit = _get_time_limit(deadline)
+        if time_limit == 0:
+            return False, (model, variables)
 
-            for var in active_variables:
-                if " x " not in var.name:
-                    muted_variables.append(var.name)
+        with time_stage(stats, "solve_milp"):
+            yield SolveRequest(relaxed_model, verbose > 1, time_limit)
 
-        cfs = Counterfactuals(
-            solutions, model, variables, self.ebm, cur_example, options
+        if stats is not None:
+            stats.record_milp("certify_relaxed", relaxed_model, time_limit is not None)
+
+        # The objective of a stopped solve is not a lower bound
+        is_certified = (
+            relaxed_model.status == 1
+            and not is_time_limited(relaxed_model, time_limit is not None)
+            and pulp.value(relaxed_model.objective)
+            >= pulp.value(model.objective) - CERTIFY_TOLERANCE
         )
 
-        return cfs
+        if verbose == 2:
+            print(
+                "similarity thresholds are {}certified".format(
+                    "" if is_certified else "not "
+                )
+            )
+
+        return is_certified, (model, variables)
+
+    def _get_relaxed_options(
+        self, cf_direction, cur_example, features_to_vary, full_options, options
+    ):
+        """
+        Give each kept option the best score gain of the options it replaces.
+
+        We replace each removed option by the kept option of the same feature
+        that has a lower distance and the most similar score gain. A kept
+        option gets the best main effect score gain of its replaced options
+        (including itself). The interaction variable of two kept options gets
+        the best pair offset $s(b_1, b_2) - s(b_1, c_2) - s(c_1, b_2) + s(c_1,
+        c_2)$ over the pair bins of their replaced options, where $c_1, c_2$
+        are the current bins.
+
+        Args:
+            cf_direction (int): Integer +1 if we need to increase the score, -1
+                if decrease.
+            cur_example (np.ndarray): The original data point, as a (1,
+                n_features) array.
+            features_to_vary (list[str]): Feature names of features that the
+                generated CF can change.
+            full_options (dict): Options of continuous and categorical
+                features without any redundancy pruning.
+            options (dict): Pruned options, including interaction options.
+
+        Returns:
+            dict: Copies of the option tables in `options` with the relaxed
+                score gains.
+        """
+        relaxed_options = dict(options)
+
+        # Kept option row of each full option row
+        replacements = {}
+
+        for f_name in features_to_vary:
+            full_table, table = full_options[f_name], options[f_name]
+            kept_rows = np.full(len(full_table), -1, dtype=np.int64)
+
+            # Kept options replace themselves
+            table_rows = {t: i for i, t in enumerate(table.targets.tolist())}
+            for row, target in enumerate(full_table.targets.tolist()):
+                kept_rows[row] = table_rows.get(target, -1)
+
+            for row in np.flatnonzero(kept_rows < 0):
+                gaps = np.abs(table.gains - full_table.gains[row])
+                gaps[table.distances > full_table.distances[row]] = np.inf
+                kept_rows[row] = np.argmin(gaps)
+
+            replacements[f_name] = kept_rows
+
+            # The best score gain of the replaced options
+            best_gains = np.full(len(table), -np.inf)
+            np.maximum.at(best_gains, kept_rows, cf_direction * full_table.gains)
+
+            relaxed_table = table.take(np.arange(len(table)))
+            relaxed_table.gains = cf_direction * best_gains
+            relaxed_options[f_name] = relaxed_table
+
+        for cur_feature_id in range(len(self.feature_names)):
+            cur_feature_name = self.feature_names[cur_feature_id]
+
+            if (
+                self.feature_types[cur_feature_id] != "interaction"
+                or cur_feature_name not in options
+            ):
+                continue
+
+            f1_id, f2_id = self.feature_groups[cur_feature_id]
+            f1_name, f2_name = self.feature_names[f1_id], self.feature_names[f2_id]
+
+            if f1_name not in features_to_vary or f2_name not in features_to_vary:
+                continue
+
+            # The first column and row are reserved for missing values
+            additives = self.ebm.term_scores_[cur_feature_id][1:-1, 1:-1]
+            c1 = self._get_pair_bins(f1_id, cur_example[:, f1_id])[0]
+            c2 = self._get_pair_bins(f2_id, cur_example[:, f2_id])[0]
+
+            offsets = cf_direction * (
+                additives - additives[:, [c2]] - additives[[c1], :] + additives[c1, c2]
+            )
+
+            bins_1 = self._get_pair_bins(f1_id, full_options[f1_name].targets)
+            bins_2 = self._get_pair_bins(f2_id, full_options[f2_name].targets)
+            num_1, num_2 = len(options[f1_name]), len(options[f2_name])
+
+            # Best offsets of the replaced options of the first feature, then
+            # of the second feature
+            best_offsets_1 = np.full((num_1, offsets.shape[1]), -np.inf)
+            np.maximum.at(best_offsets_1, replacements[f1_name], offsets[bins_1])
+
+            best_offsets = np.full((num_1, num_2), -np.inf)
+            np.maximum.at(
+                best_offsets.T, replacements[f2_name], best_offsets_1[:, bins_2].T
+            )
+
+            # Interaction options iterate the first feature in the outer loop
+            relaxed_table = options[cur_feature_name].take(np.arange(num_1 * num_2))
+            relaxed_table.gains = cf_direction * best_offsets.reshape(-1)
+            relaxed_options[cur_feature_name] = relaxed_table
+
+        return relaxed_options
 
     def generate_cont_options(
         self,
@@ -525,7 +1598,8 @@ class GAMCoach:
                 score gain from two main effects, and adjusting the distance penalty.
 
         Returns:
-            list: List of option tuples (target, score gain, distance, bin_index)
+            OptionTable: Options (target, score gain, distance, bin_index,
+                interaction score gain offsets) sorted by distance.
         """
 
         # For each continuous feature, each bin is a variable
@@ -539,12 +1613,10 @@ class GAMCoach:
         # Get the bin edges of this feature
         bin_starts = _get_main_bin_labels(self.ebm, cur_feature_index)[:-1]
 
-        # Create "options", each option is a tuple (target, score_gain, distance,
-        # bin_index)
-        cont_options = []
-
-        # Identify which bin this value falls into
-        cur_bin_id = search_sorted_lower_index(bin_starts, cur_feature_value)
+        # Identify which bin this value falls into (the additives skip the
+        # missing bin)
+        cur_bin_id = self.discretizer.discretize(cur_feature_value, cur_feature_index)
+        cur_bin_id = cur_bin_id[0] - 1
         assert additives[cur_bin_id] == cur_feature_score
 
         # Identify interaction terms that we need to consider
@@ -561,32 +1633,20 @@ class GAMCoach:
 
                     other_position = 1 - feature_position
                     other_index = indexes[other_position]
-                    other_type = self.feature_types[other_index]
 
                     # Get the current additive scores and bin edges
                     inter_additives = self.ebm.term_scores_[cur_feature_id][1:-1, 1:-1]
 
-                    # Have to skip the max edge if it is continuous
-                    bin_starts_feature = _get_pair_bin_labels(
-                        self.ebm, cur_feature_index
-                    )[:-1]
-
-                    bin_starts_other = _get_pair_bin_labels(self.ebm, other_index)
-                    if other_type == "continuous":
-                        bin_starts_other = bin_starts_other[:-1]
-
                     # Get the current interaction term score
-                    other_bin = None
-                    if other_type == "continuous":
-                        other_bin = search_sorted_lower_index(
-                            bin_starts_other, float(cur_example[other_index])
-                        )
-                    else:
-                        other_bin = bin_starts_other.index(cur_example[other_index])
+                    other_bin = self.discretizer.discretize(
+                        cur_example[other_index], other_index, level=1
+                    )[0]
+                    other_bin -= 1
 
-                    feature_bin = search_sorted_lower_index(
-                        bin_starts_feature, cur_feature_value
-                    )
+                    feature_bin = self.discretizer.discretize(
+                        cur_feature_value, cur_feature_index, level=1
+                    )[0]
+                    feature_bin -= 1
 
                     feature_inter_score = 0
 
@@ -597,7 +1657,6 @@ class GAMCoach:
 
                     # Extract the row or column where we fix the other feature and
                     # vary the current feature
-                    feature_inter_bin_starts = bin_starts_feature
                     feature_inter_additives = []
 
                     if feature_position == 0:
@@ -617,121 +1676,99 @@ class GAMCoach:
                             "inter_index": indexes,
                             "cur_interaction_id": cur_feature_id,
                             "feature_inter_score": feature_inter_score,
-                            "feature_inter_bin_starts": feature_inter_bin_starts,
                             "feature_inter_additives": feature_inter_additives,
                         }
                     )
 
-        for i in range(len(additives)):
-            # Because of the special binning structure of EBM, the distance of
-            # bins on the left to the current value is different from the bins
-            # that are on the right
-            #
-            # For bins on the left, the raw distance is abs(bin_start[i + 1] - x)
-            # For bins on the right, the raw distance is abs(bin_start[i] - x)
-            target = cur_feature_value
-            distance = 0
-
-            if i < cur_bin_id:
-                # First need to consider if it is need to be an integer
-                # If so, it would be the closest integer to the right point
-                if need_to_be_int:
-                    target = float(int(bin_starts[i + 1]))
-                    if target == bin_starts[i + 1]:
-                        target -= 1
-
-                    # Skip this option if it is not possible to find an int value
-                    if target < bin_starts[i]:
-                        continue
+        # Because of the special binning structure of EBM, the distance of
+        # bins on the left to the current value is different from the bins
+        # that are on the right
+        #
+        # For bins on the left, the raw distance is abs(bin_start[i + 1] - x)
+        # For bins on the right, the raw distance is abs(bin_start[i] - x)
+        num_bins = len(additives)
+        bin_indexes = np.arange(num_bins)
+        bin_lefts = np.array(bin_starts, dtype=float)
+        bin_rights = np.append(bin_lefts[1:], np.inf)
 
-                    distance = np.abs(target - cur_feature_value)
+        targets = np.full(num_bins, cur_feature_value, dtype=float)
+        is_valid = np.ones(num_bins, dtype=bool)
+        is_left = bin_indexes < cur_bin_id
+        is_right = bin_indexes > cur_bin_id
 
-                else:
-                    target = bin_starts[i + 1]
-                    distance = np.abs(target - cur_feature_value)
-
-                    # Subtract a very smaller value to make the target
-                    # technically fall into the left bin
-                    target -= 1e-4
-
-            elif i > cur_bin_id:
-                # First need to consider if it should be an integer value
-                # If so, it would be the closest integer to the left point
-                if need_to_be_int:
-                    target = float(np.ceil(bin_starts[i]))
-                    if target == bin_starts[i]:
-                        target += 1
-
-                    # Skip this option if it is not possible to find an int value
-                    if i + 1 < len(additives) and target >= bin_starts[i + 1]:
-                        continue
+        if need_to_be_int:
+            # If the target needs to be an integer, it would be the closest
+            # integer to the right point (left bins) or to the left point (right
+            # bins)
+            left_targets = np.trunc(bin_rights)
+            left_targets[left_targets == bin_rights] -= 1
 
-                    distance = np.abs(target - cur_feature_value)
+            right_targets = np.ceil(bin_lefts)
+            right_targets[right_targets == bin_lefts] += 1
 
-                else:
-                    target = bin_starts[i]
-                    distance = np.abs(target - cur_feature_value)
-
-            # Scale the distance based on the deviation of the feature (how
-            # changeable it is)
-            if cont_mads[cur_feature_name] > 0:
-                distance /= cont_mads[cur_feature_name]
-
-            # Compute score gain which has two parts:
-            # (1) gain from the change of main effect
-            # (2) gain from the change of interaction effect
-
-            # Main effect
-            main_score_gain = additives[i] - cur_feature_score
-
-            # Interaction terms
-            # A list to track all interaction score gain offsets
-            # [[interaction id, interaction score gain]]
-            inter_score_gain = 0
-            inter_score_gains = []
-
-            for d in associated_interactions:
-                inter_bin_id = search_sorted_lower_index(
-                    d["feature_inter_bin_starts"], target
-                )
-                inter_score_gain += (
-                    d["feature_inter_additives"][inter_bin_id]
-                    - d["feature_inter_score"]
-                )
-                inter_score_gains.append(
-                    [
-                        d["cur_interaction_id"],
-                        d["feature_inter_additives"][inter_bin_id]
-                        - d["feature_inter_score"],
-                    ]
-                )
+            targets[is_left] = left_targets[is_left]
+            targets[is_right] = right_targets[is_right]
 
-            score_gain = main_score_gain + inter_score_gain
+            # Skip options if it is not possible to find an int value
+            is_valid[is_left & (left_targets < bin_lefts)] = False
+            is_valid[is_right & (right_targets >= bin_rights)] = False
 
-            if cf_direction * score_gain <= 0 and skip_unhelpful:
-                continue
+            distances = np.abs(targets - cur_feature_value)
 
-            # Filter out of bound options
-            if score_gain_bound and skip_unhelpful:
-                if cf_direction == 1 and score_gain > score_gain_bound:
-                    continue
-                if cf_direction == -1 and score_gain < score_gain_bound:
-                    continue
+        else:
+            targets[is_left] = bin_rights[is_left]
+            targets[is_right] = bin_lefts[is_right]
+            distances = np.abs(targets - cur_feature_value)
+
+            # Subtract a very smaller value to make the target technically
+            # fall into the left bin
+            targets[is_left] -= 1e-4
+
+        # Scale the distance based on the deviation of the feature (how
+        # changeable it is)
+        if cont_mads[cur_feature_name] > 0:
+            distances /= cont_mads[cur_feature_name]
+
+        # Compute score gain which has two parts:
+        # (1) gain from the change of main effect
+        # (2) gain from the change of interaction effect
+        main_score_gains = additives - cur_feature_score
+
+        # Interaction terms: a matrix to track all interaction score gain
+        # offsets, one column for each associated interaction term
+        inter_ids = np.array(
+            [d["cur_interaction_id"] for d in associated_interactions], dtype=np.int64
+        )
+        inter_score_gains = np.zeros((num_bins, len(associated_interactions)))
+
+        # Pair effect bins of all targets
+        inter_bin_ids = self.discretizer.discretize(targets, cur_feature_index, 1) - 1
+
+        for j, d in enumerate(associated_interactions):
+            inter_score_gains[:, j] = (
+                np.array(d["feature_inter_additives"])[inter_bin_ids]
+                - d["feature_inter_score"]
+            )
+
+        score_gains = main_score_gains + np.sum(inter_score_gains, axis=1)
 
-            cont_options.append([target, score_gain, distance, i, inter_score_gains])
+        is_valid &= _get_helpful_mask(
+            score_gains, cf_direction, score_gain_bound, skip_unhelpful
+        )
+
+        cont_options = OptionTable(
+            targets[is_valid],
+            score_gains[is_valid],
+            distances[is_valid],
+            bin_indexes[is_valid],
+            inter_ids,
+            inter_score_gains[is_valid],
+        )
 
         # Now we can apply the second round of filtering to remove redundant options
         # Redundant options refer to bins that give similar score gain with larger
         # distance
-        cont_options = sorted(cont_options, key=lambda x: x[2])
-
-        start = 0
-        while start < len(cont_options):
-            for i in range(len(cont_options) - 1, start, -1):
-                if np.abs(cont_options[i][1] - cont_options[start][1]) < epsilon:
-                    cont_options.pop(i)
-
-            start += 1
+        cont_options = _remove_redundant_options(cont_options, epsilon)
 
         return cont_options
 
@@ -770,7 +1807,8 @@ class GAMCoach:
                 score gain from two main effects, and adjusting the distance penalty.
 
         Returns:
-            list: List of option tuples (target, score_gain, distance, bin_index).
+            OptionTable: Options (target, score gain, distance, bin_index,
+                interaction score gain offsets).
         """
 
         # Find other options for this categorical variable
@@ -787,10 +1825,6 @@ class GAMCoach:
         # Get the bin edges of this feature
         levels = _get_main_bin_labels(self.ebm, cur_feature_index)
 
-        # Create "options", each option is a tuple (target, score_gain,
-        # distance, bin_index)
-        cat_options = []
-
         # Identify interaction terms that we need to consider
         associated_interactions = []
 
@@ -805,30 +1839,20 @@ class GAMCoach:
 
                     other_position = 1 - feature_position
                     other_index = indexes[other_position]
-                    other_type = self.feature_types[other_index]
 
                     # Get the current additive scores and bin edges
                     inter_additives = self.ebm.term_scores_[cur_feature_id][1:-1, 1:-1]
 
-                    bin_starts_feature = _get_pair_bin_labels(
-                        self.ebm, cur_feature_index
-                    )
-                    bin_starts_other = _get_pair_bin_labels(self.ebm, other_index)
-
-                    # Have to skip the max edge if it is continuous
-                    if other_type == "continuous":
-                        bin_starts_other = bin_starts_other[:-1]
-
                     # Get the current interaction term score
-                    other_bin = None
-                    if other_type == "continuous":
-                        other_bin = search_sorted_lower_index(
-                            bin_starts_other, float(cur_example[other_index])
-                        )
-                    else:
-                        other_bin = bin_starts_other.index(cur_example[other_index])
+                    other_bin = self.discretizer.discretize(
+                        cur_example[other_index], other_index, level=1
+                    )[0]
+                    other_bin -= 1
 
-                    feature_bin = bin_starts_feature.index(cur_feature_value)
+                    feature_bin = self.discretizer.discretize(
+                        cur_feature_value, cur_feature_index, level=1
+                    )[0]
+                    feature_bin -= 1
 
                     feature_inter_score = 0
 
@@ -839,7 +1863,6 @@ class GAMCoach:
 
                     # Extract the row or column where we fix the other features and
                     # vary the current feature
-                    feature_inter_bin_starts = bin_starts_feature
                     feature_inter_additives = []
 
                     if feature_position == 0:
@@ -859,57 +1882,55 @@ class GAMCoach:
                             "inter_index": indexes,
                             "cur_interaction_id": cur_feature_id,
                             "feature_inter_score": feature_inter_score,
-                            "feature_inter_bin_starts": feature_inter_bin_starts,
                             "feature_inter_additives": feature_inter_additives,
                         }
                     )
 
-        for i in range(len(additives)):
-            if levels[i] != cur_feature_value:
-                target = levels[i]
-                distance = cur_cat_distance[target]
-
-                # Compute score gain which has two parts:
-                # (1) gain from the change of main effect
-                # (2) gain from the change of interaction effect
-
-                # Main effect
-                main_score_gain = additives[i] - cur_feature_score
-
-                # Interaction terms
-                # A list to track all interaction score gain offsets
-                # [[interaction id, interaction score gain]]
-                inter_score_gain = 0
-                inter_score_gains = []
-
-                for d in associated_interactions:
-                    inter_bin_id = d["feature_inter_bin_starts"].index(target)
-                    inter_score_gain += (
-                        d["feature_inter_additives"][inter_bin_id]
-                        - d["feature_inter_score"]
-                    )
-                    inter_score_gains.append(
-                        [
-                            d["cur_interaction_id"],
-                            d["feature_inter_additives"][inter_bin_id]
-                            - d["feature_inter_score"],
-                        ]
-                    )
+        bin_indexes = np.array(
+            [i for i in range(len(additives)) if levels[i] != cur_feature_value],
+            dtype=np.int64,
+        )
 
-                score_gain = main_score_gain + inter_score_gain
+        targets = np.empty(len(bin_indexes), dtype=object)
+        targets[:] = [levels[i] for i in bin_indexes]
+        distances = np.array([cur_cat_distance[t] for t in targets], dtype=float)
 
-                # Skip unhelpful options
-                if cf_direction * score_gain <= 0 and skip_unhelpful:
-                    continue
+        # Compute score gain which has two parts:
+        # (1) gain from the change of main effect
+        # (2) gain from the change of interaction effect
+        main_score_gains = np.array(additives)[bin_indexes] - cur_feature_score
 
-                # Filter out of bound options
-                if score_gain_bound and skip_unhelpful:
-                    if cf_direction == 1 and score_gain > score_gain_bound:
-                        continue
-                    if cf_direction == -1 and score_gain < score_gain_bound:
-                        continue
+        # Interaction terms: a matrix to track all interaction score gain
+        # offsets, one column for each associated interaction term
+        inter_ids = np.array(
+            [d["cur_interaction_id"] for d in associated_interactions], dtype=np.int64
+        )
+        inter_score_gains = np.zeros((len(bin_indexes), len(associated_interactions)))
+
+        # Pair effect bins of all targets
+        inter_bin_ids = self.discretizer.discretize(targets, cur_feature_index, 1) - 1
+
+        for j, d in enumerate(associated_interactions):
+            inter_score_gains[:, j] = (
+                np.array(d["feature_inter_additives"])[inter_bin_ids]
+                - d["feature_inter_score"]
+            )
+
+        score_gains = main_score_gains + np.sum(inter_score_gains, axis=1)
+
+        # Skip unhelpful and out of bound options
+        is_valid = _get_helpful_mask(
+            score_gains, cf_direction, score_gain_bound, skip_unhelpful
+        )
 
-                cat_options.append([target, score_gain, distance, i, inter_score_gains])
+        cat_options = OptionTable(
+            targets[is_valid],
+            score_gains[is_valid],
+            distances[is_valid],
+            bin_indexes[is_valid],
+            inter_ids,
+            inter_score_gains[is_valid],
+        )
 
         return cat_options
 
@@ -943,17 +1964,14 @@ class GAMCoach:
             cur_feature_index_1 (int): The index of the first main effect.
             cur_feature_index_2 (int): The index of the second main effect.
             cur_feature_score (float): The score for the current feature value.
-            options (dict): The current option list, feature_name ->
-                [`target`, `score_gain`, `distance`, `bin_id`].
+            options (dict): The current option tables, feature_name ->
+                `OptionTable`.
 
         Returns:
-            List of option tuples (target, score_gain, distance, bin_index)
+            OptionTable: Options ([target_1, target_2], score_gain, 0,
+                [bin_index_1, bin_index_2]).
         """
 
-        # Get the sub-types for this interaction term
-        cur_feature_type_1 = self.feature_types[cur_feature_index_1]
-        cur_feature_type_2 = self.feature_types[cur_feature_index_2]
-
         # Get the sub-names for this interaction term
         cur_feature_name_1 = self.feature_names[cur_feature_index_1]
         cur_feature_name_2 = self.feature_names[cur_feature_index_2]
@@ -962,81 +1980,58 @@ class GAMCoach:
         # categorical features)
         additives = self.ebm.term_scores_[cur_feature_id][1:-1, 1:-1]
 
+        options_1 = options[cur_feature_name_1]
+        options_2 = options[cur_feature_name_2]
+
         # Four possibilities here: cont x cont, cont x cat, cat x cont, cat x cat.
-        # Each has a different way to lookup the bin table.
-        inter_options = []
+        # The discretizer locates the pair bins of all option values of each
+        # feature at once.
+        bins_1 = self._get_pair_bins(cur_feature_index_1, options_1.targets)
+        bins_2 = self._get_pair_bins(cur_feature_index_2, options_2.targets)
 
         # Iterate through all possible combinations of options from these two
-        # variables
-        for opt_1 in options[cur_feature_name_1]:
-            for opt_2 in options[cur_feature_name_2]:
-
-                bin_starts_1 = _get_pair_bin_labels(self.ebm, cur_feature_index_1)
-                bin_starts_2 = _get_pair_bin_labels(self.ebm, cur_feature_index_2)
-
-                bin_1 = None
-                bin_2 = None
-
-                if cur_feature_type_1 == "continuous":
-                    if cur_feature_type_2 == "continuous":
-                        # cont x cont
-                        bin_starts_1 = bin_starts_1[:-1]
-                        bin_starts_2 = bin_starts_2[:-1]
+        # variables (the first feature is the outer loop)
+        new_scores = additives[np.ix_(bins_1, bins_2)]
+        score_gains = new_scores - cur_feature_score
 
-                        # locate the bin for each option value
-                        bin_1 = search_sorted_lower_index(bin_starts_1, opt_1[0])
-                        bin_2 = search_sorted_lower_index(bin_starts_2, opt_2[0])
-
-                    else:
-                        # cont x cat
-                        bin_starts_1 = bin_starts_1[:-1]
-
-                        # locate the bin for each option value
-                        bin_1 = search_sorted_lower_index(bin_starts_1, opt_1[0])
-                        bin_2 = bin_starts_2.index(opt_2[0])
-
-                else:
-                    if cur_feature_type_2 == "continuous":
-                        # cat x cont
-                        bin_starts_2 = bin_starts_2[:-1]
-
-                        # locate the bin for each option value
-                        bin_1 = bin_starts_1.index(opt_1[0])
-                        bin_2 = search_sorted_lower_index(bin_starts_2, opt_2[0])
-
-                    else:
-                        # cat x cat
+        # The score gain on the interaction term need to offset the interaction
+        # score gain we have already counted on the main effect options. That
+        # score is saved in the option tables, keyed by the interaction id.
+        score_gains -= options_1.get_inter_gains(cur_feature_id)[:, np.newaxis]
+        score_gains -= options_2.get_inter_gains(cur_feature_id)[np.newaxis, :]
 
-                        # locate the bin for each option value
-                        bin_1 = bin_starts_1.index(opt_1[0])
-                        bin_2 = bin_starts_2.index(opt_2[0])
+        num_1, num_2 = len(options_1), len(options_2)
 
-                new_score = additives[bin_1, bin_2]
-                score_gain = new_score - cur_feature_score
+        targets = np.empty((num_1 * num_2, 2), dtype=object)
+        targets[:, 0] = np.repeat(options_1.targets, num_2)
+        targets[:, 1] = np.tile(options_2.targets, num_1)
 
-                # The score gain on the interaction term need to offset the interaction
-                # score gain we have already counted on the main effect options. That
-                # score is saved in the option tuple.
+        bins = np.column_stack(
+            (np.repeat(options_1.bins, num_2), np.tile(options_2.bins, num_1))
+        )
 
-                # We first need to find the common interaction id
-                common_index = [-1, -1]
-                for m in range(len(opt_1[4])):
-                    for n in range(len(opt_2[4])):
-                        if opt_1[4][m][0] == opt_2[4][n][0]:
-                            common_index = [m, n]
-                            break
+        inter_options = OptionTable(
+            targets,
+            score_gains.reshape(-1),
+            np.zeros(num_1 * num_2),
+            bins.reshape(-1, 2),
+        )
 
-                    if common_index[0] != -1 and common_index[1] != -1:
-                        break
+        return inter_options
 
-                score_gain -= opt_1[4][common_index[0]][1]
-                score_gain -= opt_2[4][common_index[1]][1]
+    def _get_pair_bins(self, feature_index, targets):
+        """
+        Locate the pair interaction bin of each target value.
 
-                inter_options.append(
-                    [[opt_1[0], opt_2[0]], score_gain, 0, [opt_1[3], opt_2[3]], 0]
-                )
+        Args:
+            feature_index (int): The index of the main effect.
+            targets (np.ndarray): Target values of the options.
 
-        return inter_options
+        Returns:
+            np.ndarray: Pair interaction bin index of each target value.
+        """
+        # The additive scores skip the missing bin
+        return self.discretizer.discretize(targets, feature_index, level=1) - 1
 
     @staticmethod
     def create_milp(
@@ -1046,6 +2041,8 @@ class GAMCoach:
         options,
         max_num_features_to_vary=None,
         muted_variables=[],
+        feature_names=None,
+        feature_groups=None,
     ):
         """
         Create a MILP to find counterfactuals (CF) using PuLP.
@@ -1056,20 +2053,46 @@ class GAMCoach:
             needed_score_gain (float): The score gain needed to achieve the CF goal.
             features_to_vary (list[str]): Feature names of features that the
                 generated CF can change.
-            options (dict): Possible options for each variable. Each option is a
-                list [target, score_gain, distance, bin_index].
+            options (dict): Possible options for each variable, `feature_name` =>
+                `OptionTable`. Lists of options [target, score_gain, distance,
+                bin_index] are also accepted.
             max_num_features_to_vary (int, optional): Max number of features that the
                 generated CF can change. If the value is `None`, the CFs can
                 change any number of features.
-            muted_variables (list[str], optional): Variables that this MILP should
-                not use. This is useful to mute optimal variables so we can explore
-                diverse solutions. This list should not include interaction variables.
+            muted_variables (list[tuple], optional): Options that this MILP should
+                not use, as (`feature_id`, `option_row`) pairs. This is useful to
+                mute optimal variables so we can explore diverse solutions. This
+                list should not include interaction variables.
+            feature_names (list[str], optional): Names of all features, including
+                interaction terms. A feature id is the index in this list. By
+                default, we use the keys of `options`.
+            feature_groups (list[list[int]], optional): Main effect feature ids of
+                each feature. By default, we split interaction names
+                `f1 x f2` to find their main effects.
 
         Returns:
             A tuple (`model`, `variables`), where `model` is a pulp.LpProblem
-            model that encodes the MILP problem, and `variables` is a dict of
-            variables used in the `model`: `feature_name` => [`variables`].
+            model that encodes the MILP problem, and `variables` is a
+            `VariableRegistry` that maps each variable column to its feature id
+            and option row.
         """
+        import pulp
+
+        options = as_option_tables(options)
+
+        if feature_names is None:
+            feature_names = list(options.keys())
+
+        if feature_groups is None:
+            feature_groups = []
+            for f_name in feature_names:
+                if " x " in f_name:
+                    f1_name, f2_name = f_name.split(" x ")
+                    feature_groups.append(
+                        [feature_names.index(f1_name), feature_names.index(f2_name)]
+                    )
+                else:
+                    feature_groups.append([feature_names.index(f_name)])
 
         # Create a model (minimizing the distance)
         model = pulp.LpProblem("ebmCounterfactual", pulp.LpMinimize)
@@ -1077,31 +2100,48 @@ class GAMCoach:
         distance = 0
         score_gain = 0
 
-        muted_variables_set = set(muted_variables)
+        muted_variables_set = set(
+            (int(f_id), int(row)) for f_id, row in muted_variables
+        )
 
         # Create variables
-        variables = {}
+        variables = VariableRegistry()
+        main_variables = []
+
+        # Track the variable of each main effect bin: `feature_id` =>
+        # {`bin_index` => `variable`}
+        bin_variables = {}
+
         for f in features_to_vary:
+            f_id = feature_names.index(f)
+
             # Each variable encodes an option (0: not use this option,
             # 1: use this option)
             cur_variables = []
+            bin_variables[f_id] = {}
 
-            for option in options[f]:
-                var_name = "{}:{}".format(f, option[3])
+            cur_gains = options[f].gains.tolist()
+            cur_distances = options[f].distances.tolist()
+            cur_bins = options[f].bins.tolist()
 
+            for i in range(len(options[f])):
                 # Skip the muted variables
-                if var_name in muted_variables_set:
+                if (f_id, i) in muted_variables_set:
                     continue
 
-                x = pulp.LpVariable(var_name, lowBound=0, upBound=1, cat="Binary")
+                x = pulp.LpVariable(
+                    "x{}".format(len(variables)), lowBound=0, upBound=1, cat="Binary"
+                )
                 x.setInitialValue(0)
+                variables.add(x, f_id, i)
 
-                score_gain += option[1] * x
-                distance += option[2] * x
+                score_gain += cur_gains[i] * x
+                distance += cur_distances[i] * x
 
                 cur_variables.append(x)
+                bin_variables[f_id][cur_bins[i]] = x
 
-            variables[f] = cur_variables
+            main_variables.extend(cur_variables)
 
             # A local constraint is that we can only at most selection one option from
             # one feature
@@ -1110,58 +2150,40 @@ class GAMCoach:
         # Users can also set `max_num_features_to_vary` to control the total
         # number of features to vary
         if max_num_features_to_vary is not None:
-            main_variables = []
-            for f in variables:
-                main_variables.extend(variables[f])
-
             model += pulp.lpSum(main_variables) <= max_num_features_to_vary
 
         # Create variables for interaction effects
         for opt_name in options:
-            if " x " in opt_name:
-                f1_name = re.sub(r"(.+)\sx\s.+", r"\1", opt_name)
-                f2_name = re.sub(r".+\sx\s(.+)", r"\1", opt_name)
+            f_id = feature_names.index(opt_name)
 
-                if f1_name in features_to_vary and f2_name in features_to_vary:
+            if len(feature_groups[f_id]) == 2:
+                f1_id, f2_id = feature_groups[f_id]
+
+                if f1_id in bin_variables and f2_id in bin_variables:
 
                     # We need to include this interaction effect
-                    cur_variables = []
+                    cur_gains = options[opt_name].gains.tolist()
+                    cur_bins = options[opt_name].bins.tolist()
+
+                    for i in range(len(options[opt_name])):
+                        bin_1, bin_2 = cur_bins[i]
+
+                        # Skip if this interaction variable involves muted main
+                        # variable
+                        x_f1 = bin_variables[f1_id].get(bin_1)
+                        x_f2 = bin_variables[f2_id].get(bin_2)
+
+                        if x_f1 is None or x_f2 is None:
+                            continue
 
-                    for option in options[opt_name]:
                         z = pulp.LpVariable(
-                            "{}:{},{}".format(opt_name, option[3][0], option[3][1]),
+                            "x{}".format(len(variables)),
                             lowBound=0,
                             upBound=1,
                             cat="Continuous",
                         )
                         z.setInitialValue(0)
-
-                        # Need to iterate through existing variables for f1 and f2
-                        # to find the corresponding variables
-                        x_f1 = None
-                        x_f2 = None
-
-                        # Skp if this interaction variable involves muted main variable
-                        x_f1_name = "{}:{}".format(f1_name, option[3][0])
-                        x_f2_name = "{}:{}".format(f2_name, option[3][1])
-
-                        if (
-                            x_f1_name in muted_variables_set
-                            or x_f2_name in muted_variables_set
-                        ):
-                            continue
-
-                        for x in variables[f1_name]:
-                            if x.name == x_f1_name:
-                                x_f1 = x
-                                break
-
-                        for x in variables[f2_name]:
-                            if x.name == x_f2_name:
-                                x_f2 = x
-                                break
-
-                        assert x_f1 is not None and x_f2 is not None
+                        variables.add(z, f_id, i)
 
                         # variable z is actually the product of x_f1 and x_f2
                         # We can linearize it by 3 constraints
@@ -1172,11 +2194,7 @@ class GAMCoach:
                         # Need to add the interaction offset
                         # For more details, check out the paper appendix and
                         # our JavaScript implementation
-                        score_gain += option[1] * z
-
-                        cur_variables.append(z)
-
-                    variables[opt_name] = cur_variables
+                        score_gain += cur_gains[i] * z
 
         # Use constraint to express counterfactual
         if cf_direction == 1:
@@ -1189,31 +2207,33 @@ class GAMCoach:
 
         return model, variables
 
-    def print_solution(self, cur_example, active_variables, options):
+    def print_solution(self, cur_example, active_options, options):
         """
         Print the optimal solution.
 
         Args:
             cur_example (np.ndarray): the original data point.
-            active_variables (list[variable]): binary variables with value 1.
-            options (dict): all the possible options for all features.
+            active_options (np.ndarray): (`feature_id`, `option_row`) pairs of
+                variables with value 1, see `VariableRegistry.get_active_options()`.
+            options (dict): all the possible options for all features,
+                `feature_name` => `OptionTable`.
         """
+        options = as_option_tables(options)
 
-        for var in active_variables:
-            # Skip interaction vars (included)
-            if "_x_" not in var.name:
-                f_name = re.sub(r"(.+):\d+", r"\1", var.name)
-                bin_i = int(re.sub(r".+:(\d+)", r"\1", var.name))
+        for f_id, row in active_options:
+            f_name = self.feature_names[f_id]
+            f_type = self.feature_types[f_id]
+            option_table = options[f_name]
 
+            if f_type != "interaction":
                 # Find the original value
-                org_value = cur_example[0][self.feature_names.index(f_name)]
+                org_value = cur_example[0][f_id]
 
                 # Find the target bin
-                f_index = self.feature_names.index(f_name)
-                f_type = self.feature_types[f_index]
+                bin_i = option_table.bins[row]
 
                 if f_type == "continuous":
-                    bin_starts = _get_main_bin_labels(self.ebm, f_index)[:-1]
+                    bin_starts = _get_main_bin_labels(self.ebm, f_id)[:-1]
 
                     target_bin = "[{},".format(bin_starts[bin_i])
 
@@ -1225,35 +2245,24 @@ class GAMCoach:
                     target_bin = ""
                     org_value = '"{}"'.format(org_value)
 
-                for option in options[f_name]:
-                    if option[3] == bin_i:
-                        print(
-                            "Change <{}> from {} to {} {}".format(
-                                f_name, org_value, option[0], target_bin
-                            )
-                        )
-                        print(
-                            "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
-                                option[1], option[2]
-                            )
-                        )
-                        break
+                print(
+                    "Change <{}> from {} to {} {}".format(
+                        f_name, org_value, option_table.targets[row], target_bin
+                    )
+                )
+                print(
+                    "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
+                        option_table.gains[row], option_table.distances[row]
+                    )
+                )
 
             else:
-                f_name = re.sub(r"(.+):.+", r"\1", var.name)
-                f_name = f_name.replace("_x_", " x ")
-                bin_0 = int(re.sub(r".+:(\d+),\d+", r"\1", var.name))
-                bin_1 = int(re.sub(r".+:\d+,(\d+)", r"\1", var.name))
-
-                for option in options[f_name]:
-                    if option[3][0] == bin_0 and option[3][1] == bin_1:
-                        print("Trigger interaction term: <{}>".format(f_name))
-                        print(
-                            "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
-                                option[1], 0
-                            )
-                        )
-                        break
+                print("Trigger interaction term: <{}>".format(f_name))
+                print(
+                    "\t* score gain: {:.4f}\n\t* distance cost: {:.4f}".format(
+                        option_table.gains[row], 0
+                    )
+                )
         print()
 
     @staticmethod
@@ -1267,9 +2276,7 @@ class GAMCoach:
         Returns:
             float: MAD value of xs.
         """
-        xs_median = np.median(xs.astype(float))
-        mad = np.median(np.abs(xs.astype(float) - xs_median))
-        return mad
+        return compute_mads(xs.reshape(-1, 1), [0])[0]
 
     @staticmethod
     def compute_frequency_distance(xs):
@@ -1283,14 +2290,7 @@ class GAMCoach:
         Returns:
             dict: category level -> 1 - frequency.
         """
-        counter = Counter(xs)
-
-        results = {}
-
-        for key in counter:
-            results[key] = 1 - (counter[key] / len(xs))
-
-        return results
+        return _counts_to_frequency_distance(count_levels(xs), len(xs))
 
     @staticmethod
     def compute_naive_cat_distance(xs):
@@ -1307,13 +2307,7 @@ class GAMCoach:
         Returns:
             dict: category level -> 1.
         """
-        counter = Counter(xs)
-        results = {}
-
-        for key in counter:
-            results[key] = 1
-
-        return results
+        return {level: 1 for level in count_levels(xs)}
 
 
 def search_sorted_lower_index(sorted_edges, value):
@@ -1340,6 +2334,113 @@ def search_sorted_lower_index(sorted_edges, value):
     return right - 1
 
 
+def _remove_redundant_options(options, epsilon):
+    """
+    Remove options that give similar score gains (difference < epsilon) as
+    another option with a smaller distance.
+
+    Args:
+        options (OptionTable): Options of one feature.
+        epsilon (float): The threshold to determine if two options give similar
+            score gains.
+
+    Returns:
+        OptionTable: Kept options sorted by their distances.
+    """
+    order = np.argsort(options.distances, kind="stable")
+    sorted_gains = options.gains[order].tolist()
+
+    # Greedily keep the closest option, and use a sorted list of kept score
+    # gains to find the most similar kept option
+    kept_rows = []
+    kept_gains = []
+
+    for row, gain in zip(order, sorted_gains):
+        i = bisect_left(kept_gains, gain)
+
+        if i < len(kept_gains) and kept_gains[i] - gain < epsilon:
+            continue
+        if i > 0 and gain - kept_gains[i - 1] < epsilon:
+            continue
+
+        kept_gains.insert(i, gain)
+        kept_rows.append(row)
+
+    return options.take(np.array(kept_rows, dtype=np.int64))
+
+
+def _fits_budget(size, variable_budget, constraint_budget, resource_policy=None):
+    """
+    Check if a predicted MILP size fits in the budgets.
+
+    Args:
+        size (dict): 'num_variables', 'num_constraints', and
+            'num_interaction_cells' of a MILP.
+        variable_budget (int): Max number of MILP variables, or `None`.
+        constraint_budget (int): Max number of MILP constraints, or `None`.
+        resource_policy (ResourcePolicy, optional): Limits of the MILP size.
+
+    Returns:
+        bool: True if the MILP fits in all budgets.
+    """
+    if variable_budget is not None and size["num_variables"] > variable_budget:
+        return False
+
+    if constraint_budget is not None and size["num_constraints"] > constraint_budget:
+        return False
+
+    if resource_policy is not None and not resource_policy.fits(size):
+        return False
+
+    return True
+
+
+def _get_score_gain_spread(options):
+    """Returns the range of score gains of the given option table."""
+    if len(options) < 2:
+        return 0
+
+    return np.max(options.gains) - np.min(options.gains)
+
+
+def _get_helpful_mask(score_gains, cf_direction, score_gain_bound, skip_unhelpful):
+    """
+    Find options that move the score to the desirable direction without
+    exceeding the score gain bound.
+
+    Args:
+        score_gains (np.ndarray): Score gains of all options.
+        cf_direction (int): Integer `+1` if we need to increase the score, `-1`
+            if decrease.
+        score_gain_bound (float): Bound of the score gain.
+        skip_unhelpful (bool): If False, all options are kept.
+
+    Returns:
+        np.ndarray: A boolean mask of options to keep.
+    """
+    if not skip_unhelpful:
+        return np.ones(len(score_gains), dtype=bool)
+
+    is_helpful = cf_direction * score_gains > 0
+
+    # Filter out of bound options
+    if score_gain_bound:
+        if cf_direction == 1:
+            is_helpful &= score_gains <= score_gain_bound
+        if cf_direction == -1:
+            is_helpful &= score_gains >= score_gain_bound
+
+    return is_helpful
+
+
+def _get_time_limit(deadline):
+    """Seconds left until a `perf_counter()` deadline (at least 0), or `None`
+    if there is no deadline."""
+    if deadline is None:
+        return None
+    return max(deadline - perf_counter(), 0)
+
+
 def sigmoid(x):
     """Sigmoid function."""
     return 1 / (1 + np.exp(x))
@@ -1383,13 +2484,13 @@ def _resort_categorical_level(col_mapping):
         return col_mapping
 
 
-def _init_feature_descriptions(ebm, label_encoder):
+def _init_feature_descriptions(feature_names, feature_types, label_encoder):
     # Initialize the feature description dictionary
     feature_descriptions = {}
 
-    for i in range(len(ebm.feature_names_in_)):
-        cur_name = ebm.feature_names_in_[i]
-        cur_type = ebm.feature_types_in_[i]
+    for i in range(len(feature_names)):
+        cur_name = feature_names[i]
+        cur_type = feature_types[i]
 
         # Use the feature name as the default display name
         if cur_type == "continuous":
@@ -1400,7 +2501,7 @@ def _init_feature_descriptions(ebm, label_encoder):
 
         # For categorical features, we can also give display name and description
         # for different levels
-        elif cur_type == "nominal":
+        elif cur_type == "categorical":
 
             level_descriptions = {}
 
@@ -1422,16 +2523,16 @@ def _init_feature_descriptions(ebm, label_encoder):
     return feature_descriptions
 
 
-def _init_feature_configuration(ebm):
+def _init_feature_configuration(feature_names, feature_types):
     # Initialize the feature configuration dictionary
     feature_configuration = {}
 
-    for i in range(len(ebm.feature_names_in_)):
-        cur_name = ebm.feature_names_in_[i]
-        cur_type = ebm.feature_types_in_[i]
+    for i in range(len(feature_names)):
+        cur_name = feature_names[i]
+        cur_type = feature_types[i]
 
         # Use the feature name as the default display name
-        if cur_type == "continuous" or cur_type == "nominal":
+        if cur_type == "continuous" or cur_type == "categorical":
             feature_configuration[cur_name] = {
                 "difficulty": 3,
                 "requiresInt": False,
@@ -1446,19 +2547,113 @@ def _init_feature_configuration(ebm):
     return feature_configuration
 
 
-def _get_kde_sample(xs, n_sample=200):
+def _get_kde_sample(xs, n_sample=200, method="auto"):
     """
     Compute kernel density estimation.
+
+    The 'exact' method evaluates scipy's `gaussian_kde` at every sample point,
+    which takes O(len(xs) * n_sample) time. The 'binned' method uses the same
+    Gaussian kernel and bandwidth (Scott's rule), but it bins `xs` on a fine
+    grid and convolves the bin weights with the kernel using FFT. Its error
+    is about 1e-3 of the peak density or less. 'auto' uses 'binned' for
+    columns longer than `KDE_EXACT_MAX_ROWS`.
     """
-    xs_float = xs.astype(float)
-    kernel = gaussian_kde(xs_float)
+    from scipy.stats import gaussian_kde
 
+    xs_float = np.asarray(xs, dtype=float)
     sample_x = np.linspace(np.min(xs_float), np.max(xs_float), n_sample)
+
+    if method == "binned" or (method == "auto" and len(xs_float) > KDE_EXACT_MAX_ROWS):
+        sample_y = _get_binned_kde(xs_float, n_sample)
+        if sample_y is not None:
+            return sample_x, sample_y
+
+    kernel = gaussian_kde(xs_float)
     sample_y = kernel(sample_x)
 
     return sample_x, sample_y
 
 
+def _get_binned_kde(xs, n_sample):
+    """
+    Evaluate a Gaussian KDE at `n_sample` evenly spaced points from the min
+    to the max of `xs` with linear binning and FFT convolution. Returns `None`
+    if the grid would be too large (e.g., for extremely heavy tails) or the
+    bandwidth is 0.
+    """
+    num_rows = len(xs)
+    bandwidth = np.std(xs, ddof=1) * num_rows ** (-1 / 5)
+    x_min, x_max = np.min(xs), np.max(xs)
+
+    if not bandwidth > 0 or x_max == x_min:
+        return None
+
+    # Every `step`-th grid point is a sample point
+    sample_gap = (x_max - x_min) / (n_sample - 1)
+    step = max(1, int(np.ceil(sample_gap / (bandwidth * KDE_GRID_STEP))))
+    num_grid = (n_sample - 1) * step + 1
+
+    if num_grid > KDE_MAX_GRID_SIZE:
+        return None
+
+    grid_gap = (x_max - x_min) / (num_grid - 1)
+
+    # Split the weight of each value between its two nearest grid points
+    positions = (xs - x_min) / grid_gap
+    lowers = np.minimum(positions.astype(np.int64), num_grid - 2)
+    fractions = positions - lowers
+    weights = np.bincount(lowers, 1 - fractions, minlength=num_grid)
+    weights += np.bincount(lowers + 1, fractions, minlength=num_grid)
+
+    # Kernel values at all grid distances, from -(num_grid - 1) to num_grid - 1
+    distances = np.arange(-(num_grid - 1), num_grid) * grid_gap
+    kernel = np.exp(-0.5 * (distances / bandwidth) ** 2)
+    kernel /= bandwidth * np.sqrt(2 * np.pi)
+
+    # Linear convolution with FFT (padded to avoid wrapping around)
+    size = 1 << int(np.ceil(np.log2(len(weights) + len(kernel) - 1)))
+    convolved = np.fft.irfft(
+        np.fft.rfft(weights, size) * np.fft.rfft(kernel, size), size
+    )
+
+    start = num_grid - 1
+    end = start + num_grid
+    density = convolved[start:end] / num_rows
+
+    return np.maximum(density[::step], 0)
+
+
+def _get_kde_samples(x_train, feature_indexes, method="auto", n_jobs=1):
+    """
+    Compute the KDE samples of many continuous features once, optionally in
+    a thread pool.
+
+    Returns:
+        dict: `feature_index` -> (`sample_x`, `sample_y`).
+    """
+
+    def get_sample(i):
+        return _get_kde_sample(_get_train_column(x_train, i), method=method)
+
+    if n_jobs == 1 or len(feature_indexes) <= 1:
+        samples = [get_sample(i) for i in feature_indexes]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        max_workers = None if n_jobs == -1 else n_jobs
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            samples = list(executor.map(get_sample, feature_indexes))
+
+    return dict(zip(feature_indexes, samples))
+
+
+def _get_train_column(x_train, feature_index):
+    """Returns one column of an array or `ColumnarData`."""
+    if isinstance(x_train, ColumnarData):
+        return x_train.get_column(feature_index)
+    return x_train[:, feature_index]
+
+
 def _get_feature_type(ebm, feature_index):
     col_type = ebm.feature_types_in_[feature_index]
     if col_type == "continuous":
@@ -1522,11 +2717,16 @@ def _get_pair_bin_labels(ebm, feature_index):
 
 
 def _get_hist_counts(ebm, feature_index):
+    # Newer interpret versions renamed `histogram_counts_`
+    hist_counts = getattr(ebm, "histogram_counts_", None)
+    if hist_counts is None:
+        hist_counts = ebm.histogram_weights_
+
     col_type = ebm.feature_types_in_[feature_index]
     if col_type == "continuous":
-        return list(ebm.histogram_counts_[feature_index][1:-1])
+        return list(hist_counts[feature_index][1:-1])
     elif col_type == "nominal":
-        return list(ebm.histogram_counts_[feature_index][1:-1])
+        return list(hist_counts[feature_index][1:-1])
     else:  # pragma: no cover
         raise Exception("Cannot get counts for type: {0}".format(col_type))
 
@@ -1550,6 +2750,10 @@ def get_model_data(
     feature_info=None,
     feature_level_info=None,
     feature_config=None,
+    feature_stats=None,
+    kde_method="auto",
+    n_jobs=1,
+    cache_dir=None,
 ):
     """
     Get the model data for GAM Coach.
@@ -1558,7 +2762,8 @@ def get_model_data(
             ExplainableBoostingRegressor object.
         x_train: Training data. We use it to compute the mean absolute deviation
             score for continuous features, and frequency scores for categorical
-            features.
+            features. It can be an array, a DataFrame, or a dictionary of
+            column arrays.
         model_info: Information about the model (class names, regression target
             name). For classification, the order of classes matters. It should
             be consistent with the class encoding index. For example, the first
@@ -1590,11 +2795,84 @@ def get_model_data(
             all range).
             The dictionary property has the following format:
             `{'difficulty': 3, 'requiresInt': True, 'acceptableRange': None}`
+        feature_stats: You can provide the `FeatureStatistics` of `x_train`
+            (e.g., `GAMCoach.feature_stats`) to skip recomputing the MADs and
+            level frequencies.
+        kde_method: How to compute the density plots of continuous features.
+            'exact' evaluates scipy's `gaussian_kde`, 'binned' uses a binned
+            FFT-based KDE with the same kernel and bandwidth (the error is
+            about 1e-3 of the peak density or less), and 'auto' uses 'binned'
+            for large training data.
+        n_jobs: Number of threads to compute the density plots of continuous
+            features. Use -1 to use all CPUs.
+        cache_dir: A directory to cache the model-derived sections (additive
+            tables, density plots, MADs, and frequencies), keyed by the
+            fingerprint of the model, the training data, and the options above.
+            If only `feature_info`, `feature_level_info`, or `feature_config`
+            change, the next call loads the cache and only updates the
+            descriptions and configurations. To update model data that you
+            already have, use `update_model_data()`.
     Returns:
         A Python dictionary of model data
     """
+    if is_columnar(x_train):
+        x_train = ColumnarData.from_data(ebm, x_train)
+
+    data = None
+    cache_path = None
+
+    if cache_dir is not None:
+        fingerprint = _get_model_data_fingerprint(
+            ebm, x_train, model_info, resort_categorical, feature_stats, kde_method
+        )
+        cache_path = Path(cache_dir) / "model-data-{}.json".format(fingerprint)
+
+        METRICS.record_cache("model_data", cache_path.exists())
+
+        if cache_path.exists():
+            with open(cache_path, "r") as f:
+                data = json.load(f)
+
+    if data is None:
+        data = _get_model_sections(
+            ebm,
+            x_train,
+            model_info,
+            resort_categorical,
+            feature_stats,
+            kde_method,
+            n_jobs,
+        )
+
+    if cache_path is not None and not cache_path.exists():
+        # Write to a temporary file first, so other processes never read a
+        # partial cache
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix(".{}.tmp".format(os.getpid()))
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, cache_path)
+
+    return update_model_data(data, feature_info, feature_level_info, feature_config)
+
+
+def _get_model_sections(
+    ebm, x_train, model_info, resort_categorical, feature_stats, kde_method, n_jobs
+):
+    """Compute the model-derived sections of the model data, without the
+    feature descriptions and configurations. See `get_model_data()` for the
+    arguments."""
+    from tqdm import tqdm
+
     ROUND = 6
 
+    # Term importances and the density of each continuous feature are computed
+    # once, and shared by the main effects and interaction terms
+    importances = ebm.term_importances()
+
+    cont_indexes = [i for i, t in enumerate(ebm.feature_types_in_) if t == "continuous"]
+    kde_samples = _get_kde_samples(x_train, cont_indexes, kde_method, n_jobs)
+
     # Main model info on each feature
     features = []
 
@@ -1606,7 +2884,7 @@ def get_model_data(
 
     for i in tqdm(range(len(ebm.term_features_))):
         cur_feature = {}
-        cur_feature["importance"] = float(ebm.term_importances()[i])
+        cur_feature["importance"] = float(importances[i])
 
         # Handle interaction term differently from cont/cat
         if i >= len(ebm.feature_names_in_):
@@ -1661,7 +2939,7 @@ def get_model_data(
                 ).tolist()
             else:
                 # Use KDE to draw density plots for cont features
-                edges, counts = _get_kde_sample(x_train[:, cur_id[0]])
+                edges, counts = kde_samples[cur_id[0]]
                 cur_feature["histEdge1"] = edges.tolist()
                 cur_feature["histCount1"] = counts.tolist()
 
@@ -1676,7 +2954,7 @@ def get_model_data(
                 ).tolist()
             else:
                 # Use KDE to draw density plots for cont features
-                edges, counts = _get_kde_sample(x_train[:, cur_id[1]])
+                edges, counts = kde_samples[cur_id[1]]
                 cur_feature["histEdge2"] = edges.tolist()
                 cur_feature["histCount2"] = counts.tolist()
 
@@ -1716,7 +2994,7 @@ def get_model_data(
                 cur_feature["binEdge"] = _get_main_bin_labels(ebm, cur_id)
 
                 # Use KDE to draw density plots for cont features
-                edges, counts = _get_kde_sample(x_train[:, cur_id])
+                edges, counts = kde_samples[cur_id]
 
                 cur_feature["histEdge"] = edges.tolist()
                 cur_feature["histCount"] = counts.tolist()
@@ -1790,29 +3068,58 @@ def get_model_data(
         feature_types.append(_get_feature_type(ebm, i))
 
     # Compute the MAD scores and frequencies
-    ebm_cont_indexes = np.array(
-        [i for i in range(len(feature_names)) if feature_types[i] == "continuous"]
-    )
+    if feature_stats is None:
+        feature_stats = FeatureStatistics.from_data(ebm, x_train)
 
-    contMads = {}
+    contMads = feature_stats.cont_mads
+    catDistances = feature_stats.get_frequency_distances()
 
-    for i in ebm_cont_indexes:
-        contMads[ebm.feature_names_in_[i]] = GAMCoach.compute_mad(x_train[:, i])
+    data = {
+        "intercept": float(ebm.intercept_[0])
+        if hasattr(ebm, "classes_")
+        else float(ebm.intercept_),
+        "isClassifier": hasattr(ebm, "classes_"),
+        "modelInfo": model_info,
+        "features": features,
+        "labelEncoder": labelEncoder,
+        "scoreRange": score_range,
+        "featureNames": feature_names,
+        "featureTypes": feature_types,
+        "contMads": contMads,
+        "catDistances": catDistances,
+    }
 
-    ebm_cat_indexes = np.array(
-        [i for i in range(len(feature_names)) if feature_types[i] == "categorical"]
-    )
+    return data
 
-    catDistances = {}
 
-    for i in ebm_cat_indexes:
-        catDistances[feature_names[i]] = GAMCoach.compute_frequency_distance(
-            x_train[:, i]
-        )
+def update_model_data(
+    model_data, feature_info=None, feature_level_info=None, feature_config=None
+):
+    """
+    Set the feature descriptions and configurations of exported model data.
+    It gives the same result as calling `get_model_data()` again with new
+    `feature_info`, `feature_level_info`, and `feature_config`, but it does not
+    need the model or the training data, and it only takes a few milliseconds.
+    Args:
+        model_data: The output of `get_model_data()`. It is not modified.
+        feature_info: The display name and description of features. See
+            `get_model_data()` for the format.
+        feature_level_info: The display name and description of categorical
+            levels. See `get_model_data()` for the format.
+        feature_config: The difficulty, integer requirement, and acceptable
+            range of features. See `get_model_data()` for the format.
+    Returns:
+        A Python dictionary of model data
+    """
+    # Only the feature dictionaries are changed, so other sections are shared
+    features = [copy(feature) for feature in model_data["features"]]
+    data = {**model_data, "features": features}
 
     # Initialize a feature description dictionary (provide more information about
     # each feature in the UI)
-    feature_descriptions = _init_feature_descriptions(ebm, labelEncoder)
+    feature_descriptions = _init_feature_descriptions(
+        data["featureNames"], data["featureTypes"], data["labelEncoder"]
+    )
 
     # Overwrite some entries in the default feature_descriptions
     if feature_info:
@@ -1839,7 +3146,9 @@ def get_model_data(
             feature["description"] = feature_descriptions[feature["name"]]
 
     # Set the feature configurations
-    feature_configurations = _init_feature_configuration(ebm)
+    feature_configurations = _init_feature_configuration(
+        data["featureNames"], data["featureTypes"]
+    )
 
     if feature_config:
         for feature in feature_config:
@@ -1860,19 +3169,39 @@ def get_model_data(
         if feature["name"] in feature_configurations:
             feature["config"] = feature_configurations[feature["name"]]
 
-    data = {
-        "intercept": float(ebm.intercept_[0])
-        if hasattr(ebm, "classes_")
-        else float(ebm.intercept_),
-        "isClassifier": hasattr(ebm, "classes_"),
-        "modelInfo": model_info,
-        "features": features,
-        "labelEncoder": labelEncoder,
-        "scoreRange": score_range,
-        "featureNames": feature_names,
-        "featureTypes": feature_types,
-        "contMads": contMads,
-        "catDistances": catDistances,
-    }
-
     return data
+
+
+def _get_model_data_fingerprint(
+    ebm, x_train, model_info, resort_categorical, feature_stats, kde_method
+):
+    """Compute a SHA-256 fingerprint of everything that the model-derived
+    sections of the model data depend on."""
+    sha = hashlib.sha256()
+
+    options = [MODEL_DATA_CACHE_VERSION, model_info, resort_categorical, kde_method]
+    sha.update(json.dumps(options, sort_keys=True).encode())
+    sha.update(CompiledEBM.from_ebm(ebm).fingerprint.encode())
+
+    for i in range(len(ebm.term_features_)):
+        sha.update(np.ascontiguousarray(ebm.standard_deviations_[i], "<f8").tobytes())
+
+    for i in range(len(ebm.feature_names_in_)):
+        sha.update(np.ascontiguousarray(ebm.bin_weights_[i], "<f8").tobytes())
+        sha.update(json.dumps(_get_hist_edges(ebm, i), default=float).encode())
+        sha.update(np.ascontiguousarray(_get_hist_counts(ebm, i), "<f8").tobytes())
+
+    if not isinstance(x_train, ColumnarData):
+        x_train = np.asarray(x_train)
+        columns = {
+            f_name: x_train[:, i] for i, f_name in enumerate(ebm.feature_names_in_)
+        }
+        x_train = ColumnarData.from_data(ebm, columns)
+
+    sha.update(x_train.get_fingerprint().encode())
+
+    if feature_stats is not None:
+        stats = [feature_stats.cont_mads, feature_stats.get_frequency_distances()]
+        sha.update(json.dumps(stats, sort_keys=True, default=str).encode())
+
+    return sha.hexdigest()
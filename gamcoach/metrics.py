@@ -0,0 +1,512 @@
+"""MetricsRegistry Class.
+
+This module implements the MetricsRegistry class. We use it to aggregate
+runtime metrics across all `generate_cfs()` calls of a process: latency
+histograms of each stage, MILP sizes, solver statuses, cache hits, and
+throughput.
+
+The process-wide registry `METRICS` is fed by the `GenerationStats` of every
+`generate_cfs()` call that collects stats, by the model data cache of
+`get_model_data()`, and by `verify_cfs()`. Snapshots can be written in the
+Prometheus text format or as JSON, to a local file (e.g., for a textfile
+collector or a log shipper) or to a callback. No network service is started.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# Upper bounds of the MILP size histogram buckets
+SIZE_BUCKETS = [10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000]
+
+# Upper bounds of the batch size histogram buckets
+BATCH_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000]
+
+# Name -> (type, help, histogram buckets) of all metrics
+METRIC_DEFINITIONS = {
+    "gamcoach_generate_cfs_total": ("counter", "Number of generate_cfs() calls.", None),
+    "gamcoach_generate_cfs_seconds": (
+        "histogram",
+        "Wall time of generate_cfs() calls.",
+        LATENCY_BUCKETS,
+    ),
+    "gamcoach_stage_seconds": (
+        "histogram",
+        "Wall time of each generate_cfs() stage per call.",
+        LATENCY_BUCKETS,
+    ),
+    "gamcoach_milp_variables": (
+        "histogram",
+        "Number of variables of each solved MILP.",
+        SIZE_BUCKETS,
+    ),
+    "gamcoach_milp_constraints": (
+        "histogram",
+        "Number of constraints of each solved MILP.",
+        SIZE_BUCKETS,
+    ),
+    "gamcoach_solver_status_total": (
+        "counter",
+        "Number of solved MILPs by solver status, or time_limited if the time "
+        "limit stopped the solver.",
+        None,
+    ),
+    "gamcoach_cfs_total": ("counter", "Number of generated CFs.", None),
+    "gamcoach_no_cfs_total": (
+        "counter",
+        "Number of generate_cfs() calls that found no CF.",
+        None,
+    ),
+    "gamcoach_admission_total": (
+        "counter",
+        "Number of generate_cfs() calls with a resource policy by outcome "
+        "(admitted, degraded, or refused).",
+        None,
+    ),
+    "gamcoach_cache_requests_total": (
+        "counter",
+        "Number of cache lookups by cache and result (hit or miss).",
+        None,
+    ),
+    "gamcoach_verified_cfs_total": (
+        "counter",
+        "Number of CFs predicted by verify_cfs().",
+        None,
+    ),
+    "gamcoach_verify_seconds": (
+        "histogram",
+        "Wall time of verify_cfs() batches.",
+        LATENCY_BUCKETS,
+    ),
+    "gamcoach_verify_batch_size": (
+        "histogram",
+        "Number of CFs in each verify_cfs() batch.",
+        BATCH_BUCKETS,
+    ),
+}
+
+# Names of pulp's solver status codes. Solves stopped by their time limit are
+# labeled as 'time_limited' instead: they end without a solution (status 0), or
+# with a feasible solution that is not proven optimal (status 1).
+SOLVER_STATUSES = {
+    1: "optimal",
+    0: "not_solved",
+    -1: "infeasible",
+    -2: "unbounded",
+    -3: "undefined",
+}
+
+
+class Histogram:
+    """Class to represent a histogram with fixed buckets."""
+
+    __slots__ = ["buckets", "counts", "sum", "count"]
+
+    def __init__(self, buckets):
+        """Initialize an empty Histogram.
+
+        Args:
+            buckets (list): Increasing upper bounds of the buckets. Values
+                above the last bound are counted in an extra `+Inf` bucket.
+        """
+        self.buckets: list = list(buckets)
+        """Upper bounds of the buckets."""
+
+        self.counts: list = [0] * (len(self.buckets) + 1)
+        """Number of values in each bucket (not cumulative)."""
+
+        self.sum: float = 0.0
+        """Sum of all values."""
+
+        self.count: int = 0
+        """Number of values."""
+
+    def observe(self, value):
+        """Add a value to the histogram."""
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation in its bucket.
+
+        Args:
+            q (float): The quantile between 0 and 1.
+
+        Returns:
+            float: The estimated quantile, or `None` if the histogram is empty.
+                Quantiles in the `+Inf` bucket return the last bound.
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+
+                low = self.buckets[i - 1] if i > 0 else 0
+                return low + (self.buckets[i] - low) * (rank - cumulative) / count
+
+            cumulative += count
+
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Class to aggregate counters and histograms of a process."""
+
+    def __init__(self):
+        """Initialize an empty MetricsRegistry."""
+        self.enabled: bool = True
+        """If false, `record_*()` methods do nothing."""
+
+        self.counters: dict = {}
+        """(`name`, `labels`) -> count, where `labels` is a sorted tuple of
+        (`key`, `value`) pairs."""
+
+        self.histograms: dict = {}
+        """(`name`, `labels`) -> `Histogram`."""
+
+        self.start_time: float = time.time()
+        """Unix time when the registry was created or reset."""
+
+        self.dump_path: str = None
+        """Path to dump snapshots to after recording, set by
+        `set_dump_target()`."""
+
+        self.dump_callback = None
+        """Function to call with snapshots after recording."""
+
+        self.dump_format: str = "prometheus"
+        """Format of automatic dumps ('prometheus' or 'json')."""
+
+        self.dump_interval: float = 60
+        """Min number of seconds between automatic dumps."""
+
+        self._last_dump_time = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return "MetricsRegistry with {} counters and {} histograms".format(
+            len(self.counters), len(self.histograms)
+        )
+
+    def inc(self, name, value=1, **labels):
+        """Increase a counter.
+
+        Args:
+            name (str): The metric name in `METRIC_DEFINITIONS`.
+            value (float, optional): The increment. Default to 1.
+            **labels: Label values of the counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Add a value to a histogram.
+
+        Args:
+            name (str): The metric name in `METRIC_DEFINITIONS`.
+            value (float): The value.
+            **labels: Label values of the histogram.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(METRIC_DEFINITIONS[name][2])
+            self.histograms[key].observe(value)
+
+    def record_generation(self, stats):
+        """Record the stats of one generate_cfs() call.
+
+        Args:
+            stats (GenerationStats): The finished stats of the call.
+        """
+        if not self.enabled:
+            return
+
+        self.inc("gamcoach_generate_cfs_total")
+        self.observe("gamcoach_generate_cfs_seconds", stats.wall_time)
+
+        for stage, times in stats.get_stage_times().items():
+            self.observe("gamcoach_stage_seconds", times["wall_time"], stage=stage)
+
+        for milp in stats.milps:
+            if milp.get("time_limited", False):
+                status = "time_limited"
+            else:
+                status = SOLVER_STATUSES.get(milp["status"], str(milp["status"]))
+            self.inc("gamcoach_solver_status_total", status=status)
+            self.observe("gamcoach_milp_variables", milp["num_variables"])
+            self.observe("gamcoach_milp_constraints", milp["num_constraints"])
+
+        if stats.num_cfs is not None:
+            self.inc("gamcoach_cfs_total", stats.num_cfs)
+            if stats.num_cfs == 0:
+                self.inc("gamcoach_no_cfs_total")
+
+        self._auto_dump()
+
+    def record_cache(self, cache, hit):
+        """Record a cache lookup.
+
+        Args:
+            cache (str): The cache name, such as 'model_data'.
+            hit (bool): True if the lookup is a hit.
+        """
+        if not self.enabled:
+            return
+
+        result = "hit" if hit else "miss"
+        self.inc("gamcoach_cache_requests_total", cache=cache, result=result)
+
+    def record_admission(self, outcome):
+        """Record the resource policy check of a generate_cfs() call.
+
+        Args:
+            outcome (str): 'admitted', 'degraded', or 'refused'.
+        """
+        if not self.enabled:
+            return
+
+        self.inc("gamcoach_admission_total", outcome=outcome)
+
+    def record_verify(self, num_cfs, wall_time):
+        """Record one verify_cfs() batch.
+
+        Args:
+            num_cfs (int): Number of predicted CFs.
+            wall_time (float): Wall time of the batch in seconds.
+        """
+        if not self.enabled:
+            return
+
+        self.inc("gamcoach_verified_cfs_total", num_cfs)
+        self.observe("gamcoach_verify_seconds", wall_time)
+        self.observe("gamcoach_verify_batch_size", num_cfs)
+
+    def get_counter(self, name, **labels):
+        """Returns the value of a counter (0 if it has not been increased)."""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        """Take a JSON-serializable snapshot of all metrics.
+
+        Returns:
+            dict: The counters, the histograms with their p50 and p95
+                estimates, and derived cache hit ratios and throughputs.
+        """
+        with self._lock:
+            now = time.time()
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "buckets": histogram.buckets,
+                    "counts": list(histogram.counts),
+                    "sum": histogram.sum,
+                    "count": histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+
+        uptime = now - self.start_time
+
+        # Cache hit ratios
+        cache_hit_ratios = {}
+        for counter in counters:
+            if counter["name"] == "gamcoach_cache_requests_total":
+                cache_hit_ratios[counter["labels"]["cache"]] = None
+
+        for cache in cache_hit_ratios:
+            hits = self.get_counter(
+                "gamcoach_cache_requests_total", cache=cache, result="hit"
+            )
+            misses = self.get_counter(
+                "gamcoach_cache_requests_total", cache=cache, result="miss"
+            )
+            cache_hit_ratios[cache] = hits / (hits + misses)
+
+        verify_seconds = sum(
+            h["sum"] for h in histograms if h["name"] == "gamcoach_verify_seconds"
+        )
+        verified_cfs = self.get_counter("gamcoach_verified_cfs_total")
+
+        return {
+            "time": now,
+            "uptime_seconds": uptime,
+            "counters": counters,
+            "histograms": histograms,
+            "cache_hit_ratios": cache_hit_ratios,
+            "throughput": {
+                "generate_cfs_per_second": _rate(
+                    self.get_counter("gamcoach_generate_cfs_total"), uptime
+                ),
+                "cfs_per_second": _rate(self.get_counter("gamcoach_cfs_total"), uptime),
+                "verified_cfs_per_verify_second": _rate(verified_cfs, verify_seconds),
+            },
+        }
+
+    def to_prometheus(self):
+        """Format all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        lines = []
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+
+        for name, (metric_type, help_text, _) in METRIC_DEFINITIONS.items():
+            if metric_type == "counter":
+                samples = [(labels, v) for (n, labels), v in counters if n == name]
+            else:
+                samples = [(labels, h) for (n, labels), h in histograms if n == name]
+
+            if len(samples) == 0:
+                continue
+
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+
+            for labels, value in samples:
+                if metric_type == "counter":
+                    lines.append(_format_sample(name, labels, value))
+                    continue
+
+                cumulative = 0
+                bounds = [_format_value(b) for b in value.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, value.counts):
+                    cumulative += count
+                    bucket_labels = labels + (("le", bound),)
+                    lines.append(
+                        _format_sample(name + "_bucket", bucket_labels, cumulative)
+                    )
+
+                lines.append(_format_sample(name + "_sum", labels, value.sum))
+                lines.append(_format_sample(name + "_count", labels, value.count))
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None, callback=None, fmt="prometheus"):
+        """Write a snapshot to a file or pass it to a callback.
+
+        Files are replaced atomically, so a scraper never reads a partial
+        snapshot.
+
+        Args:
+            path (str, optional): The output file path.
+            callback (Callable, optional): A function to call with the
+                snapshot text.
+            fmt (str, optional): 'prometheus' (default) or 'json'.
+
+        Returns:
+            str: The snapshot text.
+        """
+        if fmt == "prometheus":
+            text = self.to_prometheus()
+        elif fmt == "json":
+            text = json.dumps(self.snapshot())
+        else:
+            raise ValueError("Unsupported metrics format {}".format(fmt))
+
+        if path is not None:
+            temp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(temp_path, "w") as f:
+                f.write(text)
+            os.replace(temp_path, path)
+
+        if callback is not None:
+            callback(text)
+
+        return text
+
+    def set_dump_target(self, path=None, callback=None, fmt="prometheus", interval=60):
+        """Dump snapshots automatically after recording a generate_cfs() call,
+        at most once every `interval` seconds. Call it without a path or a
+        callback to stop.
+
+        Args:
+            path (str, optional): The output file path.
+            callback (Callable, optional): A function to call with the
+                snapshot text.
+            fmt (str, optional): 'prometheus' (default) or 'json'.
+            interval (float, optional): Min number of seconds between dumps.
+                Default to 60.
+        """
+        self.dump_path = path
+        self.dump_callback = callback
+        self.dump_format = fmt
+        self.dump_interval = interval
+        self._last_dump_time = 0.0
+
+    def reset(self):
+        """Remove all recorded metrics."""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.start_time = time.time()
+
+    def _auto_dump(self):
+        """Dump a snapshot to the dump target if the interval has passed."""
+        if self.dump_path is None and self.dump_callback is None:
+            return
+
+        now = time.time()
+        if now - self._last_dump_time < self.dump_interval:
+            return
+
+        self._last_dump_time = now
+        self.dump(self.dump_path, self.dump_callback, self.dump_format)
+
+
+# The process-wide metrics registry
+METRICS = MetricsRegistry()
+
+
+def _rate(count, seconds):
+    """Returns count / seconds, or `None` if no time has been measured."""
+    return count / seconds if seconds > 0 else None
+
+
+def _format_value(value):
+    """Format a number for the Prometheus text format."""
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_sample(name, labels, value):
+    """Format one sample line of the Prometheus text format."""
+    if len(labels) == 0:
+        return "{} {}".format(name, _format_value(value))
+
+    label_text = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, label in labels
+    )
+    return "{}{{{}}} {}".format(name, label_text, _format_value(value))
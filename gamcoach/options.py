@@ -0,0 +1,330 @@
+"""OptionTable and VariableRegistry Classes.
+
+This module implements the OptionTable class. We use it to store the eligible
+options (possible changes) of one feature in a columnar format. It also
+implements the VariableRegistry class, which maps MILP variables back to these
+options.
+"""
+
+import numpy as np
+
+
+class OptionTable:
+    """Class to represent all eligible options of one feature.
+
+    Each row is an option. Instead of storing options as nested lists
+    `[target, score_gain, distance, bin_index, inter_score_gains]`, we store
+    each field as a numpy array, so producers and consumers can work on all
+    options at once.
+    """
+
+    def __init__(
+        self,
+        targets: np.ndarray,
+        gains: np.ndarray,
+        distances: np.ndarray,
+        bins: np.ndarray,
+        inter_ids: np.ndarray = None,
+        inter_gains: np.ndarray = None,
+    ):
+        """Initialize an OptionTable object.
+
+        Args:
+            targets (np.ndarray): Target values of the options. It is a float
+                array for continuous features, an object array for categorical
+                features, and a (n, 2) array for interaction terms.
+            gains (np.ndarray): Score gains of the options.
+            distances (np.ndarray): Distances of the options.
+            bins (np.ndarray): Main effect bin indexes of the options. It is a
+                (n, 2) array for interaction terms.
+            inter_ids (np.ndarray, optional): Feature ids of the interaction
+                terms associated with this feature.
+            inter_gains (np.ndarray, optional): A (n, len(inter_ids)) matrix of
+                interaction score gain offsets. Column j is the offset of the
+                interaction term `inter_ids[j]`.
+        """
+        self.targets: np.ndarray = targets
+        """Target values of the options."""
+
+        self.gains: np.ndarray = np.asarray(gains, dtype=float)
+        """Score gains of the options."""
+
+        self.distances: np.ndarray = np.asarray(distances, dtype=float)
+        """Distances of the options."""
+
+        self.bins: np.ndarray = np.asarray(bins, dtype=np.int64)
+        """Main effect bin indexes of the options."""
+
+        if inter_ids is None:
+            inter_ids = np.zeros(0, dtype=np.int64)
+
+        if inter_gains is None:
+            inter_gains = np.zeros((len(self.gains), len(inter_ids)))
+
+        self.inter_ids: np.ndarray = np.asarray(inter_ids, dtype=np.int64)
+        """Feature ids of the associated interaction terms."""
+
+        self.inter_gains: np.ndarray = np.asarray(inter_gains, dtype=float)
+        """Interaction score gain offsets, one column for each `inter_ids`."""
+
+    def __len__(self):
+        return len(self.gains)
+
+    def __repr__(self) -> str:
+        return "OptionTable with {} options".format(len(self))
+
+    @property
+    def nbytes(self):
+        """Total bytes used by the arrays of this table."""
+        total = 0
+        for array in [
+            self.targets,
+            self.gains,
+            self.distances,
+            self.bins,
+            self.inter_ids,
+            self.inter_gains,
+        ]:
+            total += array.nbytes
+        return total
+
+    def take(self, indexes):
+        """Create a new table with the options at the given row indexes.
+
+        Args:
+            indexes (np.ndarray): Integer row indexes or a boolean mask.
+
+        Returns:
+            OptionTable: A new table with the selected options.
+        """
+        return OptionTable(
+            self.targets[indexes],
+            self.gains[indexes],
+            self.distances[indexes],
+            self.bins[indexes],
+            self.inter_ids,
+            self.inter_gains[indexes],
+        )
+
+    def get_inter_gains(self, inter_id):
+        """Returns the interaction score gain offsets of one interaction term.
+
+        Args:
+            inter_id (int): The feature id of the interaction term.
+
+        Returns:
+            np.ndarray: One offset for each option. The offsets are zeros if the
+                interaction term is not associated with this feature.
+        """
+        columns = np.flatnonzero(self.inter_ids == inter_id)
+
+        if len(columns) == 0:
+            return np.zeros(len(self))
+
+        return self.inter_gains[:, columns[0]]
+
+    def find_row(self, bin_index):
+        """Returns the row index of the option with the given bin index.
+
+        Args:
+            bin_index (Union[int, list]): The main effect bin index, or a pair
+                of bin indexes for interaction terms.
+
+        Returns:
+            int: The row index, or -1 if no option uses this bin.
+        """
+        if self.bins.ndim == 2:
+            mask = np.all(self.bins == np.asarray(bin_index), axis=1)
+        else:
+            mask = self.bins == bin_index
+
+        rows = np.flatnonzero(mask)
+        return int(rows[0]) if len(rows) > 0 else -1
+
+    def to_list(self):
+        """Convert the table to the nested list option format.
+
+        Returns:
+            list: List of options `[target, score_gain, distance, bin_index,
+                inter_score_gains]`. For interaction terms, options are
+                `[[target_1, target_2], score_gain, 0, [bin_1, bin_2], 0]`.
+        """
+        options = []
+
+        if self.bins.ndim == 2:
+            for i in range(len(self)):
+                options.append(
+                    [
+                        list(self.targets[i]),
+                        self.gains[i],
+                        0,
+                        self.bins[i].tolist(),
+                        0,
+                    ]
+                )
+            return options
+
+        inter_ids = self.inter_ids.tolist()
+        for i in range(len(self)):
+            inter_score_gains = [
+                [inter_ids[j], self.inter_gains[i, j]] for j in range(len(inter_ids))
+            ]
+            options.append(
+                [
+                    self.targets[i],
+                    self.gains[i],
+                    self.distances[i],
+                    int(self.bins[i]),
+                    inter_score_gains,
+                ]
+            )
+
+        return options
+
+    @staticmethod
+    def from_list(options):
+        """Create a table from options in the nested list format.
+
+        Args:
+            options (list): List of options `[target, score_gain, distance,
+                bin_index, inter_score_gains]`, or interaction options
+                `[[target_1, target_2], score_gain, 0, [bin_1, bin_2], 0]`.
+
+        Returns:
+            OptionTable: A table with the same options.
+        """
+        if len(options) > 0 and isinstance(options[0][3], (list, tuple)):
+            # Interaction options
+            targets = np.empty((len(options), 2), dtype=object)
+            for i, option in enumerate(options):
+                targets[i, 0] = option[0][0]
+                targets[i, 1] = option[0][1]
+
+            return OptionTable(
+                targets,
+                [option[1] for option in options],
+                [option[2] for option in options],
+                np.array([option[3] for option in options], dtype=np.int64),
+            )
+
+        targets = _to_target_array([option[0] for option in options])
+
+        # Collect all associated interaction ids in their original order
+        inter_ids = []
+        for option in options:
+            for inter_id, _ in option[4] if len(option) > 4 else []:
+                if inter_id not in inter_ids:
+                    inter_ids.append(inter_id)
+
+        inter_gains = np.zeros((len(options), len(inter_ids)))
+        for i, option in enumerate(options):
+            for inter_id, gain in option[4] if len(option) > 4 else []:
+                inter_gains[i, inter_ids.index(inter_id)] = gain
+
+        return OptionTable(
+            targets,
+            [option[1] for option in options],
+            [option[2] for option in options],
+            np.array([option[3] for option in options], dtype=np.int64),
+            np.array(inter_ids, dtype=np.int64),
+            inter_gains,
+        )
+
+
+class VariableRegistry:
+    """Class to map MILP variables to the options they encode.
+
+    Each MILP variable is a column. We track the feature id and the option
+    table row of each column, so decoding a solution is array indexing.
+    """
+
+    def __init__(self):
+        """Initialize an empty VariableRegistry object."""
+        self.variables: list = []
+        """MILP variables, indexed by their column."""
+
+        self._feature_ids = []
+        self._rows = []
+
+    def __len__(self):
+        return len(self.variables)
+
+    def __repr__(self) -> str:
+        return "VariableRegistry with {} variables".format(len(self))
+
+    def add(self, variable, feature_id, row):
+        """Register a new MILP variable.
+
+        Args:
+            variable (pulp.LpVariable): The MILP variable.
+            feature_id (int): The feature id of the variable's option.
+            row (int): The row of the option in its OptionTable.
+
+        Returns:
+            int: The column index of the variable.
+        """
+        self.variables.append(variable)
+        self._feature_ids.append(feature_id)
+        self._rows.append(row)
+        return len(self.variables) - 1
+
+    @property
+    def feature_ids(self):
+        """Feature id of each column."""
+        return np.array(self._feature_ids, dtype=np.int64)
+
+    @property
+    def rows(self):
+        """Option table row of each column."""
+        return np.array(self._rows, dtype=np.int64)
+
+    def get_values(self):
+        """Returns the solved value of each column (0 if not solved)."""
+        return np.array(
+            [x.varValue if x.varValue is not None else 0 for x in self.variables],
+            dtype=float,
+        )
+
+    def get_active_options(self):
+        """Find the options used in the solved MILP.
+
+        Returns:
+            np.ndarray: A (k, 2) integer array, where each row is the
+                (`feature_id`, `option_row`) of an active variable.
+        """
+        columns = np.flatnonzero(self.get_values() > 0.5)
+        return np.column_stack((self.feature_ids[columns], self.rows[columns]))
+
+
+def as_option_tables(options):
+    """Convert a dictionary of options to a dictionary of OptionTables.
+
+    Args:
+        options (dict): `feature_name` -> `OptionTable` or a list of options in
+            the nested list format.
+
+    Returns:
+        dict: `feature_name` -> `OptionTable`. Tables are not copied.
+    """
+    tables = {}
+
+    for f_name in options:
+        if isinstance(options[f_name], OptionTable):
+            tables[f_name] = options[f_name]
+        else:
+            tables[f_name] = OptionTable.from_list(options[f_name])
+
+    return tables
+
+
+def _to_target_array(targets):
+    """Use a float array if all targets are numbers, otherwise an object array."""
+    if all(
+        isinstance(t, (int, float, np.number)) and not isinstance(t, bool)
+        for t in targets
+    ):
+        return np.array(targets, dtype=float)
+
+    array = np.empty(len(targets), dtype=object)
+    array[:] = targets
+    return array
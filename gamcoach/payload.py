@@ -0,0 +1,258 @@
+"""Binary model data payload.
+
+This module saves the output of `get_model_data()` as a compact binary file
+for the GAM Coach UI and Python services, and loads it back with
+memory-mapped arrays.
+
+The file starts with an 8-byte magic string, a little-endian uint32 format
+version, and a little-endian uint32 index length. The index is a UTF-8 JSON
+object that holds the model data with every numeric array of the features
+(additive tables, errors, counts, bin edges, and histograms) replaced by a
+`{"$array": i}` reference to `index["arrays"][i]`. The array data follows the
+index. Each array starts at an 8-byte aligned `offset` from the start of the
+data section, so a browser can view it as a typed array without copying.
+
+Arrays are little-endian float32 by default, and integer arrays (level codes
+and counts) are int32. Bin edges and labels decide the bins of the model, so
+they are stored as float64 if float32 cannot represent them exactly. Additive
+scores, errors, and histogram counts can be quantized to 8 or 16 bits, where
+`value = min + code * scale`.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+# Name and version of the model data payload format
+FORMAT_NAME = "gamcoach-model-data"
+FORMAT_VERSION = 1
+
+# The first bytes of a payload file
+MAGIC = b"GAMCOACH"
+
+# Byte alignment of the index end and of each array
+ALIGNMENT = 8
+
+# Feature fields that can be stored as arrays
+ARRAY_FIELDS = [
+    "additive",
+    "error",
+    "count",
+    "binEdge",
+    "binLabel",
+    "binLabel1",
+    "binLabel2",
+    "histEdge",
+    "histEdge1",
+    "histEdge2",
+    "histCount",
+    "histCount1",
+    "histCount2",
+]
+
+# Feature fields that decide the bins of the model (never rounded)
+EXACT_FIELDS = ["binEdge", "binLabel", "binLabel1", "binLabel2"]
+
+# Feature fields that are only displayed, so they can be quantized
+QUANTIZED_FIELDS = ["additive", "error", "histCount", "histCount1", "histCount2"]
+
+# Feature fields that the UI does not display
+UNUSED_FIELDS = ["error", "count"]
+
+
+def save_model_payload(model_data, path, quantize=None, drop_fields=None):
+    """Save the model data as a binary payload file.
+
+    Args:
+        model_data (dict): The output of `get_model_data()`.
+        path (str): The output path.
+        quantize (int, optional): Quantize additive scores, errors, and
+            histogram counts to 8 or 16 bits. By default, they are float32.
+        drop_fields (list, optional): Feature fields to leave out, such as
+            `UNUSED_FIELDS` (`error` and `count`) that the UI does not display.
+    """
+    if quantize not in [None, 8, 16]:
+        raise ValueError("quantize must be None, 8, or 16, not {}".format(quantize))
+
+    drop_fields = set(drop_fields or [])
+    arrays = []
+    array_infos = []
+
+    features = []
+    for feature in model_data["features"]:
+        cur_feature = {}
+
+        for key, value in feature.items():
+            if key in drop_fields:
+                continue
+
+            array = _to_numeric_array(value) if key in ARRAY_FIELDS else None
+            if array is None:
+                cur_feature[key] = value
+                continue
+
+            if quantize is not None and key in QUANTIZED_FIELDS:
+                array, info = _quantize(array, quantize)
+            else:
+                array, info = _encode(array, exact=key in EXACT_FIELDS)
+
+            cur_feature[key] = {"$array": len(arrays)}
+            arrays.append(array)
+            array_infos.append(info)
+
+        features.append(cur_feature)
+
+    # Assign aligned offsets in the data section
+    offset = 0
+    for array, info in zip(arrays, array_infos):
+        info["offset"] = offset
+        offset = _align(offset + array.nbytes)
+
+    index = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "arrays": array_infos,
+        "modelData": {**model_data, "features": features},
+    }
+    index_bytes = json.dumps(index).encode("utf-8")
+
+    # The data section starts at an aligned position after the index
+    header_size = len(MAGIC) + 8 + len(index_bytes)
+    index_bytes += b" " * (_align(header_size) - header_size)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", FORMAT_VERSION, len(index_bytes)))
+        f.write(index_bytes)
+
+        position = 0
+        for array, info in zip(arrays, array_infos):
+            f.write(b"\0" * (info["offset"] - position))
+            f.write(array.tobytes())
+            position = info["offset"] + array.nbytes
+
+
+def load_model_payload(path, mmap_mode="r", as_lists=False):
+    """Load a binary payload file saved by `save_model_payload()`.
+
+    Args:
+        path (str): The path of the payload file.
+        mmap_mode (str, optional): Memory-map the arrays with this mode ('r'
+            or 'c'). If it is `None`, read them into memory. Quantized arrays
+            are always decoded into memory.
+        as_lists (bool, optional): If true, convert the arrays to lists, so the
+            result has the same structure as the output of `get_model_data()`.
+
+    Returns:
+        dict: The model data, with numpy arrays in place of numeric lists
+            unless `as_lists` is true.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a GAM Coach model data payload.".format(path))
+
+        version, index_size = struct.unpack("<II", f.read(8))
+        if version > FORMAT_VERSION:
+            raise ValueError(
+                "Model data payload version {} is newer than the supported "
+                "version {}.".format(version, FORMAT_VERSION)
+            )
+
+        index = json.loads(f.read(index_size).decode("utf-8"))
+        data_start = f.tell()
+
+        # Map (or read) the data section once, and view each array in it
+        if mmap_mode is None:
+            data = np.fromfile(f, dtype=np.uint8)
+        elif f.seek(0, 2) > data_start:
+            data = np.memmap(path, dtype=np.uint8, mode=mmap_mode, offset=data_start)
+        else:
+            data = np.zeros(0, dtype=np.uint8)
+
+    arrays = []
+    for info in index["arrays"]:
+        dtype = np.dtype(info["dtype"])
+        start = info["offset"]
+        end = start + int(np.prod(info["shape"])) * dtype.itemsize
+        array = data[start:end].view(dtype).reshape(info["shape"])
+
+        if "scale" in info:
+            array = info["min"] + array.astype(np.float64) * info["scale"]
+            array = array.astype(np.float32)
+
+        arrays.append(array.tolist() if as_lists else array)
+
+    model_data = index["modelData"]
+    for feature in model_data["features"]:
+        for key, value in feature.items():
+            if isinstance(value, dict) and "$array" in value:
+                feature[key] = arrays[value["$array"]]
+
+    return model_data
+
+
+def is_model_payload(path):
+    """True if the file at `path` is a binary model data payload."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _to_numeric_array(value):
+    """Convert a (nested) list of numbers to an array, or return `None` if it is
+    not a rectangular numeric list."""
+    if not isinstance(value, (list, np.ndarray)):
+        return None
+
+    try:
+        array = np.asarray(value)
+    except ValueError:
+        return None
+
+    if array.dtype.kind not in "biuf":
+        return None
+
+    return array
+
+
+def _encode(array, exact):
+    """Encode an array as little-endian float32, or int32 for integers (e.g.,
+    level codes and counts). Exact arrays fall back to float64 if float32
+    would change their values."""
+    if array.dtype.kind in "biu" and np.all(np.abs(array) < 2**31):
+        encoded = array.astype("<i4")
+        return encoded, {"dtype": encoded.dtype.str, "shape": list(array.shape)}
+
+    encoded = array.astype("<f4")
+
+    if exact and not np.array_equal(encoded, array):
+        encoded = array.astype("<f8")
+
+    return encoded, {"dtype": encoded.dtype.str, "shape": list(array.shape)}
+
+
+def _quantize(array, bits):
+    """Quantize an array to 8 or 16 bits with a linear scale."""
+    dtype = "<u1" if bits == 8 else "<u2"
+    info = {"dtype": dtype, "shape": list(array.shape)}
+
+    array = array.astype(np.float64)
+    min_value = float(np.min(array)) if array.size > 0 else 0.0
+    max_value = float(np.max(array)) if array.size > 0 else 0.0
+
+    # Constant arrays have a scale of 0, and all their codes are 0
+    scale = (max_value - min_value) / (2**bits - 1)
+    if scale > 0:
+        codes = np.round((array - min_value) / scale)
+    else:
+        codes = np.zeros(array.shape)
+
+    info["min"] = min_value
+    info["scale"] = scale
+
+    return codes.astype(dtype), info
+
+
+def _align(offset):
+    """Round up an offset to the next multiple of `ALIGNMENT`."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,181 @@
+"""ResourcePolicy Class.
+
+This module implements the ResourcePolicy class. We use it to bound the size of
+the MILPs that `generate_cfs()` builds. Some (example, constraints) pairs
+create huge MILPs, e.g., when all features can vary and several wide pairs of
+continuous features interact, and one such call can stall a worker.
+
+After generating the main effect options, `generate_cfs()` predicts the number
+of MILP variables, constraints, and interaction cells (variables of pair terms)
+from the option counts. If the prediction exceeds the policy, the call either
+refuses with a `ResourceLimitError`, or degrades the problem until it fits.
+The degradations, from the least to the most lossy, are:
+
+- 'coarsen_bins': remove more redundant continuous options, with thresholds
+  proportional to the spread of each feature's score gains (see the 'auto'
+  `sim_threshold_factor`). The CFs still reach the target, but they can be
+  further from the optimal CFs.
+- 'prune_interactions': drop the interaction variables of the pair terms with
+  the smallest score range. The main effect options still include the pair
+  scores for changing one of the two features, so the CFs are only
+  approximate when they change both features of a dropped pair.
+- 'approximate': only vary the features with the largest possible score
+  gains.
+
+Each degradation only goes as far as needed. If it cannot fit the MILP alone,
+it is applied fully before we try the next one. The applied degradations are
+recorded in `Counterfactuals.degradation`.
+"""
+
+# Degradations that a policy can apply, from the least to the most lossy
+DEGRADATIONS = ["coarsen_bins", "prune_interactions", "approximate"]
+
+# Actions when the predicted MILP exceeds the policy
+ON_EXCEED_ACTIONS = ["degrade", "refuse"]
+
+# Names of the predicted MILP size entries -> limit attributes
+SIZE_LIMITS = {
+    "num_variables": "max_variables",
+    "num_constraints": "max_constraints",
+    "num_interaction_cells": "max_interaction_cells",
+}
+
+
+class ResourceLimitError(ValueError):
+    """Raised when the predicted MILP of a call exceeds its `ResourcePolicy`."""
+
+    def __init__(self, message, size=None, policy=None):
+        """Initialize a ResourceLimitError.
+
+        Args:
+            message (str): The error message.
+            size (dict, optional): The predicted MILP size that exceeds the
+                policy.
+            policy (ResourcePolicy, optional): The exceeded policy.
+        """
+        super().__init__(message)
+
+        self.size: dict = size
+        """The predicted MILP size: 'num_variables', 'num_constraints', and
+        'num_interaction_cells'."""
+
+        self.policy: "ResourcePolicy" = policy
+        """The exceeded policy."""
+
+
+class ResourcePolicy:
+    """Class to represent the MILP size limits of `generate_cfs()` calls."""
+
+    def __init__(
+        self,
+        max_variables: int = None,
+        max_constraints: int = None,
+        max_interaction_cells: int = None,
+        on_exceed: str = "degrade",
+        degradations: list = None,
+    ):
+        """Initialize a ResourcePolicy.
+
+        Args:
+            max_variables (int, optional): Max number of MILP variables.
+                Default is no maximum.
+            max_constraints (int, optional): Max number of MILP constraints.
+                Default is no maximum.
+            max_interaction_cells (int, optional): Max number of interaction
+                variables, summed over all pair terms. Default is no maximum.
+            on_exceed (str, optional): 'degrade' to apply `degradations` until
+                the MILP fits, or 'refuse' to raise a `ResourceLimitError`.
+                Default to 'degrade'.
+            degradations (list, optional): Degradations to try, in order. By
+                default, we use all of `DEGRADATIONS`. If the MILP still does
+                not fit after them, we raise a `ResourceLimitError`.
+        """
+        if on_exceed not in ON_EXCEED_ACTIONS:
+            raise ValueError("on_exceed must be one of {}".format(ON_EXCEED_ACTIONS))
+
+        if degradations is None:
+            degradations = DEGRADATIONS
+
+        for degradation in degradations:
+            if degradation not in DEGRADATIONS:
+                raise ValueError(
+                    "Unknown degradation {}, use {}".format(degradation, DEGRADATIONS)
+                )
+
+        self.max_variables: int = max_variables
+        """Max number of MILP variables."""
+
+        self.max_constraints: int = max_constraints
+        """Max number of MILP constraints."""
+
+        self.max_interaction_cells: int = max_interaction_cells
+        """Max number of interaction variables."""
+
+        self.on_exceed: str = on_exceed
+        """'degrade' or 'refuse'."""
+
+        self.degradations: list = list(degradations)
+        """Degradations to try, in order."""
+
+    def __repr__(self) -> str:
+        return "ResourcePolicy({})".format(
+            ", ".join("{}={!r}".format(k, v) for k, v in self.to_dict().items())
+        )
+
+    @staticmethod
+    def from_dict(policy: dict):
+        """Create a ResourcePolicy from a dictionary of its arguments, e.g.,
+        from a service configuration file."""
+        return ResourcePolicy(**policy)
+
+    def to_dict(self):
+        """Returns the JSON-serializable arguments of the policy."""
+        return {
+            "max_variables": self.max_variables,
+            "max_constraints": self.max_constraints,
+            "max_interaction_cells": self.max_interaction_cells,
+            "on_exceed": self.on_exceed,
+            "degradations": self.degradations,
+        }
+
+    def get_violations(self, size):
+        """Find the limits that a MILP size exceeds.
+
+        Args:
+            size (dict): 'num_variables', 'num_constraints', and
+                'num_interaction_cells' of a MILP.
+
+        Returns:
+            list[str]: A message for each exceeded limit, e.g.,
+                '12000 num_variables > max_variables 5000'.
+        """
+        violations = []
+
+        for name, limit_name in SIZE_LIMITS.items():
+            limit = getattr(self, limit_name)
+            if limit is not None and size[name] > limit:
+                violations.append(
+                    "{} {} > {} {}".format(size[name], name, limit_name, limit)
+                )
+
+        return violations
+
+    def fits(self, size):
+        """Returns true if a MILP size is within all limits."""
+        return len(self.get_violations(size)) == 0
+
+
+def as_resource_policy(policy):
+    """Convert a policy argument to a `ResourcePolicy`.
+
+    Args:
+        policy (Union[ResourcePolicy, dict, None]): A policy, a dictionary of
+            its arguments, or `None`.
+
+    Returns:
+        ResourcePolicy: The policy, or `None` if `policy` is `None`.
+    """
+    if policy is None or isinstance(policy, ResourcePolicy):
+        return policy
+
+    return ResourcePolicy.from_dict(policy)
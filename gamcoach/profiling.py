@@ -0,0 +1,260 @@
+"""Profiling mode with Chrome trace output.
+
+This module implements the `profiling()` context manager. Inside it, every
+`generate_cfs()` call is recorded as nested spans: the request, its stages,
+its diversity rounds, and the MILP solver calls. The spans carry the worker id
+and the model fingerprint. They are saved as a Chrome trace event JSON file,
+which can be opened in Perfetto (https://ui.perfetto.dev) or
+`chrome://tracing`.
+
+Each worker process writes its own trace file, and `merge_traces()` combines
+them into one file. Timestamps are Unix times, so spans of different
+processes line up.
+
+Example:
+    with gamcoach.profiling("trace-{pid}.json", profile_options=True):
+        for x in examples:
+            my_coach.generate_cfs(x)
+"""
+
+import cProfile
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from .timing import add_stats_hook, remove_stats_hook, set_stage_profiler
+
+# Stages that `profile_options=True` profiles with cProfile
+OPTION_STAGES = [
+    "generate_cont_options",
+    "generate_cat_options",
+    "generate_inter_options",
+]
+
+
+class TraceRecorder:
+    """Class to collect Chrome trace events of generate_cfs() calls."""
+
+    def __init__(self, worker_id: str = None):
+        """Initialize a TraceRecorder object.
+
+        Args:
+            worker_id (str, optional): Name of this worker in the trace. By
+                default, it is `hostname:pid`.
+        """
+        self.worker_id: str = (
+            worker_id
+            if worker_id is not None
+            else "{}:{}".format(socket.gethostname(), os.getpid())
+        )
+        """Name of this worker in the trace."""
+
+        self.events: list = []
+        """Chrome trace events, in microseconds."""
+
+        self.num_requests: int = 0
+        """Number of recorded generate_cfs() calls."""
+
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return "TraceRecorder of {} with {} requests".format(
+            self.worker_id, self.num_requests
+        )
+
+    def add_generation(self, stats):
+        """Add the spans of one generate_cfs() call.
+
+        Args:
+            stats (GenerationStats): The finished stats of the call.
+        """
+        tid = threading.get_ident()
+        base = stats.unix_start_time * 1e6
+        fingerprint = stats.metadata.get("model_fingerprint")
+
+        with self._lock:
+            request_id = self.num_requests
+            self.num_requests += 1
+
+        common_args = {"request": request_id, "worker": self.worker_id}
+        events = [
+            _get_event(
+                "generate_cfs",
+                "request",
+                base,
+                stats.wall_time,
+                tid,
+                {
+                    **common_args,
+                    "model_fingerprint": fingerprint,
+                    "num_cfs": stats.num_cfs,
+                    "cpu_time": stats.cpu_time,
+                    "option_counts": {
+                        name: sum(counts.values())
+                        for name, counts in stats.option_counts.items()
+                    },
+                },
+            )
+        ]
+
+        for name, start, wall_time, cpu_time in stats.rounds:
+            events.append(
+                _get_event(
+                    name,
+                    "round",
+                    base + start * 1e6,
+                    wall_time,
+                    tid,
+                    {**common_args, "cpu_time": cpu_time},
+                )
+            )
+
+        # The solver spans and the MILP records are in the same order
+        milps = iter(stats.milps)
+
+        for name, start, wall_time, cpu_time in stats.spans:
+            args = {**common_args, "cpu_time": cpu_time}
+            category = "stage"
+
+            if name == "solve_milp":
+                args.update(next(milps, {}))
+                category = "solver"
+
+            events.append(
+                _get_event(name, category, base + start * 1e6, wall_time, tid, args)
+            )
+
+        with self._lock:
+            self.events.extend(events)
+
+    @contextmanager
+    def span(self, name, **args):
+        """Record a custom span around a block, such as a batch of requests.
+
+        Args:
+            name (str): The span name.
+            **args: Extra arguments to show on the span.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            event = _get_event(
+                name,
+                "custom",
+                start * 1e6,
+                time.time() - start,
+                threading.get_ident(),
+                {"worker": self.worker_id, **args},
+            )
+            with self._lock:
+                self.events.append(event)
+
+    def to_dict(self):
+        """Returns the Chrome trace as a JSON-serializable dictionary."""
+        with self._lock:
+            events = list(self.events)
+
+        pid = os.getpid()
+        for event in events:
+            event["pid"] = pid
+
+        metadata = {
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": self.worker_id},
+        }
+
+        return {"traceEvents": [metadata] + events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        """Save the trace as a Chrome trace event JSON file.
+
+        Args:
+            path (str): The output path.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+@contextmanager
+def profiling(
+    path: str,
+    worker_id: str = None,
+    profile_options: bool = False,
+    pstats_path: str = None,
+):
+    """Record all generate_cfs() calls in this block as a Chrome trace.
+
+    The calls must collect stats (`collect_stats=True`, the default).
+
+    Args:
+        path (str): The output path of the trace JSON file. `{pid}` is replaced
+            by the process id, so worker processes can share one pattern.
+        worker_id (str, optional): Name of this worker in the trace. By
+            default, it is `hostname:pid`.
+        profile_options (bool, optional): If true, also profile the option
+            generation stages with cProfile, and save the `.pstats` file next
+            to the trace. Default to false.
+        pstats_path (str, optional): The output path of the `.pstats` file. By
+            default, it is `path` with a `.pstats` extension.
+
+    Yields:
+        TraceRecorder: The recorder. Use its `span()` to add custom spans.
+    """
+    path = path.format(pid=os.getpid())
+    recorder = TraceRecorder(worker_id)
+    add_stats_hook(recorder.add_generation)
+
+    profile = None
+    if profile_options:
+        profile = cProfile.Profile()
+        set_stage_profiler(profile, OPTION_STAGES)
+
+    try:
+        yield recorder
+    finally:
+        remove_stats_hook(recorder.add_generation)
+        recorder.save(path)
+
+        if profile is not None:
+            set_stage_profiler(None)
+
+            if pstats_path is None:
+                pstats_path = os.path.splitext(path)[0] + ".pstats"
+            profile.dump_stats(pstats_path.format(pid=os.getpid()))
+
+
+def merge_traces(paths, output_path):
+    """Merge the trace files of several worker processes into one file.
+
+    Args:
+        paths (list): Paths of the trace JSON files.
+        output_path (str): The output path of the merged trace.
+    """
+    events = []
+
+    for path in paths:
+        with open(path, "r") as f:
+            events.extend(json.load(f)["traceEvents"])
+
+    with open(output_path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _get_event(name, category, start, duration, tid, args):
+    """Create a complete ('X') trace event. `start` is in microseconds and
+    `duration` is in seconds."""
+    return {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": start,
+        "dur": duration * 1e6,
+        "tid": tid,
+        "args": args,
+    }
@@ -0,0 +1,344 @@
+"""MILP solver runs of `generate_cfs()`.
+
+`generate_cfs()` is written as a step generator
+(`GAMCoach._generate_cfs_steps()`). It yields a `SolveRequest` for each MILP,
+and continues with the solved model. This module runs such generators in two
+ways:
+
+- `run_steps()` solves each MILP in the calling thread with pulp's CBC
+  command. `GAMCoach.generate_cfs()` uses it.
+- `run_steps_async()` runs the CPU steps between the solves in an executor,
+  and waits for CBC as an asyncio subprocess, so the event loop is never
+  blocked and does not need a thread per running solver.
+  `GAMCoach.generate_cfs_async()` uses it. Cancelling the task kills the
+  running CBC process, and closes the generator once its current step
+  returns.
+
+The async solver writes and reads pulp's MPS and solution files with pulp's
+own methods, and passes the same arguments to CBC as `PULP_CBC_CMD`. These
+methods are internal to pulp, so `setup.py` pins the pulp versions.
+"""
+
+import asyncio
+import os
+import threading
+from subprocess import DEVNULL
+
+
+class SolveRequest:
+    """Class to represent a MILP that a step generator needs to solve."""
+
+    __slots__ = ["model", "msg", "time_limit"]
+
+    def __init__(self, model, msg: bool = False, time_limit: float = None):
+        """Initialize a SolveRequest.
+
+        Args:
+            model (LpProblem): The MILP to solve. The solver writes the
+                solution and the status into the model.
+            msg (bool, optional): If true, show the solver output.
+            time_limit (float, optional): Max number of seconds of the solver.
+                If it is 0, the time budget of the call is used up, and the
+                model is left unsolved (`status` 0). Default is no limit.
+        """
+        self.model = model
+        """The MILP to solve."""
+
+        self.msg: bool = msg
+        """True to show the solver output."""
+
+        self.time_limit: float = time_limit
+        """Max number of seconds of the solver, or `None`."""
+
+
+def get_cbc_solver(msg=False, time_limit=None):
+    """Returns pulp's bundled CBC command with warm start.
+
+    Args:
+        msg (bool, optional): If true, show the solver output.
+        time_limit (float, optional): Max number of seconds of the solver.
+
+    Returns:
+        PULP_CBC_CMD: The solver.
+    """
+    import pulp
+
+    return pulp.apis.PULP_CBC_CMD(msg=msg, warmStart=True, timeLimit=time_limit)
+
+
+def solve_milp(request):
+    """Solve the MILP of a request in the calling thread.
+
+    Args:
+        request (SolveRequest): The MILP to solve.
+    """
+    if request.time_limit == 0:
+        return
+
+    request.model.solve(get_cbc_solver(request.msg, request.time_limit))
+
+
+def is_time_limited(model, has_time_limit=True):
+    """Check if the time limit of a solve stopped CBC before it proved the
+    optimal solution.
+
+    Args:
+        model (LpProblem): The solved MILP.
+        has_time_limit (bool, optional): True if the solve had a time limit.
+
+    Returns:
+        bool: True if the solve had a time limit, and it ended without a
+            solution, or with a feasible solution that is not proven optimal.
+    """
+    import pulp
+
+    if not has_time_limit:
+        return False
+
+    return (
+        model.status == pulp.LpStatusNotSolved
+        or model.sol_status == pulp.LpSolutionIntegerFeasible
+    )
+
+
+async def solve_milp_async(request, executor=None):
+    """Solve the MILP of a request with a CBC subprocess, without blocking the
+    event loop. If the task is cancelled, we kill the CBC process.
+
+    Args:
+        request (SolveRequest): The MILP to solve.
+        executor (concurrent.futures.Executor, optional): Executor to write
+            and read the solver files. By default, we use the loop's default
+            executor.
+    """
+    import pulp
+
+    if request.time_limit == 0:
+        return
+
+    loop = asyncio.get_event_loop()
+    model = request.model
+    run = _CbcRun(model, get_cbc_solver(request.msg, request.time_limit))
+
+    was_none, dummy_variable = model.fixObjective()
+    model.startClock()
+
+    try:
+        await loop.run_in_executor(executor, run.write)
+
+        pipe = None if request.msg else DEVNULL
+        process = await asyncio.create_subprocess_exec(
+            *run.args, stdout=pipe, stderr=pipe, stdin=DEVNULL
+        )
+
+        try:
+            return_code = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+
+        if return_code != 0:
+            raise pulp.PulpSolverError(
+                "Pulp: Error while trying to execute {}".format(run.solver.path)
+            )
+
+        await loop.run_in_executor(executor, run.read)
+    except BaseException:
+        # Delete the files once the running file step returns
+        loop.run_in_executor(executor, run.delete)
+        raise
+
+    model.stopClock()
+    model.restoreObjective(was_none, dummy_variable)
+    await loop.run_in_executor(executor, run.delete)
+
+
+def run_steps(steps):
+    """Run a step generator, and solve its MILPs in the calling thread.
+
+    Args:
+        steps (generator): A generator that yields `SolveRequest`s.
+
+    Returns:
+        The return value of the generator.
+    """
+    try:
+        request = next(steps)
+        while True:
+            solve_milp(request)
+            request = next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def run_steps_async(steps, executor=None):
+    """Run a step generator in an executor, and solve its MILPs with CBC
+    subprocesses.
+
+    Args:
+        steps (generator): A generator that yields `SolveRequest`s.
+        executor (concurrent.futures.Executor, optional): Executor to run the
+            steps between the solves. By default, we use the loop's default
+            executor.
+
+    Returns:
+        The return value of the generator.
+    """
+    loop = asyncio.get_event_loop()
+    steps = _SharedSteps(steps)
+
+    try:
+        while True:
+            request, is_done = await loop.run_in_executor(executor, steps.advance)
+            if is_done:
+                return request
+
+            await solve_milp_async(request, executor)
+
+    except BaseException:
+        # A running step cannot be interrupted, so we close the generator in
+        # the executor once the step returns
+        loop.run_in_executor(executor, steps.close)
+        raise
+
+
+class _SharedSteps:
+    """A step generator that executor threads advance one step at a time."""
+
+    __slots__ = ["steps", "lock"]
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.lock = threading.Lock()
+
+    def advance(self):
+        """Run the next step. Returns (`request`, False), or (the return value,
+        True) if the generator is done."""
+        with self.lock:
+            try:
+                return next(self.steps), False
+            except StopIteration as stop:
+                return stop.value, True
+
+    def close(self):
+        """Close the generator after its running step."""
+        with self.lock:
+            self.steps.close()
+
+
+class _CbcRun:
+    """Files and arguments of one CBC run, following
+    `PULP_CBC_CMD.solve_CBC()`. The file methods hold a lock, so `delete()`
+    waits for a running `write()` or `read()`."""
+
+    __slots__ = [
+        "model",
+        "solver",
+        "args",
+        "files",
+        "variables",
+        "variable_names",
+        "constraint_names",
+        "lock",
+    ]
+
+    def __init__(self, model, solver):
+        self.model = model
+        self.solver = solver
+        self.args = None
+        self.files = ()
+        self.lock = threading.Lock()
+
+    def write(self):
+        """Write the model and the warm start solution, and build the CBC
+        arguments."""
+        with self.lock:
+            self._write()
+
+    def read(self):
+        """Read the solution file into the model."""
+        with self.lock:
+            self._read()
+
+    def delete(self):
+        """Delete the solver files."""
+        with self.lock:
+            self.solver.delete_tmp_files(*self.files)
+            self.files = ()
+
+    def _write(self):
+        import pulp
+
+        solver = self.solver
+        if not solver.executable(solver.path):
+            raise pulp.PulpSolverError(
+                "Pulp: cannot execute {} cwd: {}".format(solver.path, os.getcwd())
+            )
+
+        tmp_mps, tmp_sol, tmp_mst = solver.create_tmp_files(
+            self.model.name, "mps", "sol", "mst"
+        )
+        self.files = (tmp_mps, tmp_sol, tmp_mst)
+
+        (
+            self.variables,
+            self.variable_names,
+            self.constraint_names,
+            _,
+        ) = self.model.writeMPS(tmp_mps, rename=1)
+
+        args = [solver.path, tmp_mps]
+        if self.model.sense == pulp.LpMaximize:
+            args.append("-max")
+
+        if solver.optionsDict.get("warmStart", False):
+            solver.writesol(
+                tmp_mst,
+                self.model,
+                self.variables,
+                self.variable_names,
+                self.constraint_names,
+            )
+            args.extend(["-mips", tmp_mst])
+
+        if solver.timeLimit is not None:
+            args.extend(["-sec", str(solver.timeLimit)])
+
+        for option in solver.options + solver.getOptions():
+            args.extend(("-" + option).split())
+
+        args.append("-solve" if solver.mip else "-initialSolve")
+        args.extend(["-printingOptions", "all", "-solution", tmp_sol])
+        self.args = args
+
+    def _read(self):
+        import pulp
+
+        tmp_sol = self.files[1]
+        if not os.path.exists(tmp_sol):
+            raise pulp.PulpSolverError(
+                "Pulp: Error while executing {}".format(self.solver.path)
+            )
+
+        (
+            status,
+            values,
+            reduced_costs,
+            shadow_prices,
+            slacks,
+            sol_status,
+        ) = self.solver.readsol_MPS(
+            tmp_sol,
+            self.model,
+            self.variables,
+            self.variable_names,
+            self.constraint_names,
+        )
+
+        self.model.assignVarsVals(values)
+        self.model.assignVarsDj(reduced_costs)
+        self.model.assignConsPi(shadow_prices)
+        self.model.assignConsSlack(slacks, activity=True)
+        self.model.assignStatus(status, sol_status)
+        self.model.solver = self.solver
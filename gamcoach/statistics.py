@@ -0,0 +1,635 @@
+"""FeatureStatistics Class.
+
+This module implements the FeatureStatistics class. We use it to compute the
+training data statistics that GAM Coach needs to measure distances: the median
+absolute deviation (MAD) of continuous features and the level counts of
+categorical features.
+
+The training data can be an in-memory array, or a source that we read in
+chunks (a `np.memmap`, a CSV/Parquet path, or an iterable of chunks). For
+chunked sources, MADs come from an exact two-pass selection or from a
+streaming `QuantileSketch`, so the peak memory depends on the chunk size
+instead of the dataset size.
+"""
+
+import numpy as np
+
+from collections import Counter
+from pathlib import Path
+
+from .columns import ColumnarData, is_columnar, _is_dataframe
+
+# Default number of rows in one chunk when reading large training data
+CHUNK_SIZE = 100000
+
+# Default relative rank error of the streaming quantile sketch
+SKETCH_ERROR = 0.001
+
+# The sketch capacity guarantees its error bound for up to 2^32 values
+SKETCH_MAX_ROWS_LOG2 = 32
+
+
+class FeatureStatistics:
+    """Class to represent the distance statistics of the training data."""
+
+    def __init__(
+        self,
+        cont_mads: dict,
+        cat_counts: dict,
+        num_rows: int,
+        mad_errors: dict = None,
+    ):
+        """Initialize a FeatureStatistics object.
+
+        Args:
+            cont_mads (dict): `feature_name` -> MAD of each continuous feature.
+            cat_counts (dict): `feature_name` -> {`level_name` -> `count`} of
+                each categorical feature.
+            num_rows (int): The number of training data rows.
+            mad_errors (dict, optional): `feature_name` -> relative rank error
+                bound of each MAD. By default, all MADs are exact (0 error).
+        """
+        self.cont_mads: dict = cont_mads
+        """Median absolute deviation (MAD) of continuous features."""
+
+        self.cat_counts: dict = cat_counts
+        """Count of each level of categorical features."""
+
+        self.num_rows: int = num_rows
+        """The number of training data rows."""
+
+        if mad_errors is None:
+            mad_errors = {f_name: 0.0 for f_name in cont_mads}
+
+        self.mad_errors: dict = mad_errors
+        """Relative rank error bound of each MAD. Let the estimated median be
+        $\\hat{m}$ and $n$ be the number of rows. For an error $e$, the
+        estimated median's rank is within $e n$ of $n / 2$, and the estimated
+        MAD's rank among $|x - \\hat{m}|$ is within $2 e n$ of $n / 2$. Since
+        the MAD is 1-Lipschitz in the center, it is also within
+        $|\\hat{m} - m|$ of the MAD around $\\hat{m}$."""
+
+    def __repr__(self) -> str:
+        return "FeatureStatistics of {} continuous and {} categorical features".format(
+            len(self.cont_mads), len(self.cat_counts)
+        )
+
+    def get_frequency_distances(self):
+        """Compute (1 - frequency) as the distance of each categorical level.
+
+        Returns:
+            dict: `feature_name` -> {`level_name` -> 1 - frequency}.
+        """
+        return {
+            f_name: _counts_to_frequency_distance(counts, self.num_rows)
+            for f_name, counts in self.cat_counts.items()
+        }
+
+    def get_naive_cat_distances(self):
+        """Give distance 1 to all levels of categorical features.
+
+        Returns:
+            dict: `feature_name` -> {`level_name` -> 1}.
+        """
+        return {
+            f_name: {level: 1 for level in counts}
+            for f_name, counts in self.cat_counts.items()
+        }
+
+    @staticmethod
+    def from_data(ebm, x_train, continuous=True, categorical=True):
+        """Compute the statistics of all main features in one pass.
+
+        Continuous columns are converted to floats once, into a column-major
+        matrix, and all medians and MADs are computed as one batched
+        partition-based selection. Categorical levels are counted with
+        `np.unique()` (typed columns) or a hash counter (object columns).
+        DataFrames and dictionaries of columns are encoded as `ColumnarData`,
+        whose levels are counted from their integer codes.
+
+        Args:
+            ebm (Union[ExplainableBoostingClassifier,
+                ExplainableBoostingRegressor]): The trained EBM model.
+            x_train (Union[np.ndarray, pd.DataFrame, dict, ColumnarData]): The
+                training data.
+            continuous (bool, optional): If true, compute the MADs of
+                continuous features.
+            categorical (bool, optional): If true, count the levels of
+                categorical features.
+
+        Returns:
+            FeatureStatistics: The statistics of `x_train`.
+        """
+        if is_columnar(x_train):
+            x_train = ColumnarData.from_data(ebm, x_train)
+
+        cont_indexes = []
+        cat_indexes = []
+
+        for i in range(len(ebm.feature_names_in_)):
+            if ebm.feature_types_in_[i] == "continuous":
+                cont_indexes.append(i)
+            elif ebm.feature_types_in_[i] == "nominal":
+                cat_indexes.append(i)
+
+        cont_mads = {}
+        if continuous and len(cont_indexes) > 0:
+            mads = compute_mads(x_train, cont_indexes)
+            for i, mad in zip(cont_indexes, mads):
+                cont_mads[ebm.feature_names_in_[i]] = mad
+
+        cat_counts = {}
+        if categorical:
+            for i in cat_indexes:
+                cat_counts[ebm.feature_names_in_[i]] = _count_chunk_levels(
+                    x_train, i, ebm.feature_names_in_[i]
+                )
+
+        return FeatureStatistics(cont_mads, cat_counts, x_train.shape[0])
+
+    @staticmethod
+    def from_source(
+        ebm,
+        x_train,
+        continuous=True,
+        categorical=True,
+        chunk_size=CHUNK_SIZE,
+        mad_method="auto",
+        mad_error=SKETCH_ERROR,
+    ):
+        """Compute the statistics from in-memory or out-of-core training data.
+
+        Args:
+            ebm (Union[ExplainableBoostingClassifier,
+                ExplainableBoostingRegressor]): The trained EBM model.
+            x_train (Union[np.ndarray, pd.DataFrame, dict, str, Path,
+                Iterable]): The training data. It can be an array, a DataFrame
+                or a dictionary of column arrays, a `np.memmap`, a path to a
+                CSV or Parquet file with one column for each feature, or an
+                iterable of chunks (arrays or DataFrames).
+            continuous (bool, optional): If true, compute the MADs of
+                continuous features.
+            categorical (bool, optional): If true, count the levels of
+                categorical features.
+            chunk_size (int, optional): Number of rows to read at once from
+                memmaps and files.
+            mad_method (str, optional): 'exact' computes the exact MADs. It
+                reads chunked sources twice. 'sketch' reads the data once and
+                estimates the MADs with a `QuantileSketch`. 'auto' uses 'exact'
+                unless the source is a one-time iterator (e.g., a generator).
+            mad_error (float, optional): Relative rank error of the sketch.
+
+        Returns:
+            FeatureStatistics: The statistics of `x_train`.
+        """
+        if mad_method not in ["auto", "exact", "sketch"]:
+            raise ValueError(
+                "mad_method must be 'auto', 'exact', or 'sketch', got {}".format(
+                    mad_method
+                )
+            )
+
+        if is_columnar(x_train):
+            x_train = ColumnarData.from_data(ebm, x_train)
+
+        is_in_memory = isinstance(x_train, ColumnarData) or (
+            isinstance(x_train, np.ndarray) and not isinstance(x_train, np.memmap)
+        )
+
+        if is_in_memory and mad_method != "sketch":
+            return FeatureStatistics.from_data(ebm, x_train, continuous, categorical)
+
+        is_repeatable = isinstance(
+            x_train, (np.ndarray, ColumnarData, str, Path, list, tuple)
+        )
+
+        if mad_method == "auto":
+            mad_method = "exact" if is_repeatable else "sketch"
+
+        if mad_method == "exact" and not is_repeatable:
+            raise ValueError(
+                "The exact MADs need two passes over the data, which is not "
+                "possible with a one-time iterator. Use mad_method='sketch' or "
+                "provide a memmap, a file path, or a list of chunks."
+            )
+
+        cont_indexes = []
+        cat_indexes = []
+
+        for i in range(len(ebm.feature_names_in_)):
+            if continuous and ebm.feature_types_in_[i] == "continuous":
+                cont_indexes.append(i)
+            elif categorical and ebm.feature_types_in_[i] == "nominal":
+                cat_indexes.append(i)
+
+        def read_chunks():
+            return iter_chunks(
+                x_train, ebm.feature_names_in_, ebm.feature_types_in_, chunk_size
+            )
+
+        # Pass 1: count levels and sketch the continuous columns
+        sketches = [QuantileSketch(mad_error) for _ in cont_indexes]
+        counters = [Counter() for _ in cat_indexes]
+        num_rows = 0
+
+        for chunk in read_chunks():
+            num_rows += _get_num_rows(chunk)
+
+            for sketch, i in zip(sketches, cont_indexes):
+                sketch.update(_get_column(chunk, i, ebm.feature_names_in_[i]))
+
+            for counter, i in zip(counters, cat_indexes):
+                counter.update(_count_chunk_levels(chunk, i, ebm.feature_names_in_[i]))
+
+        cat_counts = {}
+        for counter, i in zip(counters, cat_indexes):
+            cat_counts[ebm.feature_names_in_[i]] = dict(counter)
+
+        cont_mads = {}
+        mad_errors = {}
+
+        if mad_method == "sketch":
+            for sketch, i in zip(sketches, cont_indexes):
+                f_name = ebm.feature_names_in_[i]
+                cont_mads[f_name] = sketch.get_mad()
+                mad_errors[f_name] = sketch.get_relative_error()
+
+        elif len(cont_indexes) > 0:
+            # Pass 2: collect the values near the median and near the MAD
+            selectors = [_ExactMadSelector(sketch) for sketch in sketches]
+
+            for chunk in read_chunks():
+                for selector, i in zip(selectors, cont_indexes):
+                    selector.update(_get_column(chunk, i, ebm.feature_names_in_[i]))
+
+            for selector, i in zip(selectors, cont_indexes):
+                f_name = ebm.feature_names_in_[i]
+                cont_mads[f_name] = selector.get_mad()
+                mad_errors[f_name] = 0.0
+
+        return FeatureStatistics(cont_mads, cat_counts, num_rows, mad_errors)
+
+
+class QuantileSketch:
+    """Streaming quantile sketch with a deterministic rank error bound.
+
+    It is a hierarchy of compactors. Items at level h represent $2^h$ values.
+    When a level holds more than `capacity` items, we sort them and promote
+    every other item to the next level, which changes the rank of any query by
+    at most $2^h$. We track the sum of these changes as `rank_error`.
+    """
+
+    def __init__(self, error: float = SKETCH_ERROR):
+        """Initialize an empty QuantileSketch object.
+
+        Args:
+            error (float, optional): The target relative rank error. The
+                capacity of each level is chosen so that the error bound holds
+                for up to $2^{32}$ values.
+        """
+        self.capacity: int = int(np.ceil((SKETCH_MAX_ROWS_LOG2 + 1) / error))
+        """Max number of items in one level."""
+
+        self.levels: list = [np.zeros(0)]
+        """Items of each level."""
+
+        self.num_values: int = 0
+        """Number of sketched values (NaNs are not included)."""
+
+        self.num_nans: int = 0
+        """Number of NaN values."""
+
+        self.rank_error: int = 0
+        """Upper bound of the absolute rank error of any query."""
+
+        self._offset = 0
+
+    def __repr__(self) -> str:
+        return "QuantileSketch of {} values with rank error {}".format(
+            self.num_values, self.rank_error
+        )
+
+    def update(self, xs):
+        """Add a chunk of values to the sketch.
+
+        Args:
+            xs (np.ndarray): New values.
+        """
+        xs = np.asarray(xs, dtype=float)
+        is_nan = np.isnan(xs)
+        self.num_nans += int(np.sum(is_nan))
+        xs = xs[~is_nan]
+        self.num_values += len(xs)
+
+        self.levels[0] = np.concatenate((self.levels[0], xs))
+
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self.capacity:
+                self._compact(h)
+            h += 1
+
+    def _compact(self, h):
+        """Promote every other item of level h to level h + 1."""
+        items = np.sort(self.levels[h])
+
+        # Keep the largest item if the count is odd, so the total weight stays
+        # the same
+        num_compacted = len(items) - len(items) % 2
+        offset = self._offset
+        promoted = items[offset:num_compacted:2]
+        self._offset = 1 - offset
+
+        if h + 1 == len(self.levels):
+            self.levels.append(np.zeros(0))
+
+        self.levels[h + 1] = np.concatenate((self.levels[h + 1], promoted))
+        self.levels[h] = items[num_compacted:]
+        self.rank_error += 2**h
+
+    def get_weighted_items(self):
+        """Returns all items sorted by value, with their weights.
+
+        Returns:
+            tuple: Sorted values and their weights.
+        """
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2**h) for h, items in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def get_relative_error(self):
+        """Returns the rank error bound divided by the number of values."""
+        return self.rank_error / max(self.num_values, 1)
+
+    def get_median(self):
+        """Estimate the median."""
+        if self.num_nans > 0 or self.num_values == 0:
+            return np.nan
+
+        values, weights = self.get_weighted_items()
+        return _get_weighted_median(values, weights, self.num_values)
+
+    def get_mad(self):
+        """Estimate the MAD around the estimated median."""
+        median = self.get_median()
+        if np.isnan(median):
+            return np.nan
+
+        values, weights = self.get_weighted_items()
+        deviations = np.abs(values - median)
+        order = np.argsort(deviations, kind="stable")
+        return _get_weighted_median(deviations[order], weights[order], self.num_values)
+
+
+class _ExactMadSelector:
+    """Find the exact MAD of a column in a second pass over the data.
+
+    We use the sketch from the first pass to find value brackets that must
+    include the middle order statistics of the values and of their absolute
+    deviations. In the second pass, we only keep values in these brackets and
+    count the values below them.
+    """
+
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.num_values = sketch.num_values
+        self.ranks = [(self.num_values - 1) // 2, self.num_values // 2]
+
+        if sketch.num_nans > 0 or sketch.num_values == 0:
+            return
+
+        values, weights = sketch.get_weighted_items()
+        error = sketch.rank_error
+
+        # The median is in [lo, hi]
+        self.lo, self.hi = _get_rank_bracket(values, weights, self.ranks, error)
+        width = self.hi - self.lo
+
+        # The MAD around any center c in [lo, hi] is within `width` of the MAD
+        # around `center`, and the deviation ranks have twice the error
+        center = np.clip(
+            _get_weighted_median(values, weights, self.num_values), self.lo, self.hi
+        )
+        deviations = np.abs(values - center)
+        order = np.argsort(deviations, kind="stable")
+        a, b = _get_rank_bracket(
+            deviations[order], weights[order], self.ranks, 2 * error
+        )
+
+        if np.isinf(width):
+            self.dev_lo, self.dev_hi = 0, np.inf
+        else:
+            self.dev_lo, self.dev_hi = max(0, a - width), b + width
+
+        self.num_below_lo = 0
+        self.median_candidates = []
+        self.num_dev_below = 0
+        self.mad_candidates = []
+
+    def update(self, xs):
+        """Collect the candidates of a chunk of values."""
+        if self.sketch.num_nans > 0 or self.num_values == 0:
+            return
+
+        xs = np.asarray(xs, dtype=float)
+
+        self.num_below_lo += int(np.sum(xs < self.lo))
+        self.median_candidates.append(xs[(xs >= self.lo) & (xs <= self.hi)])
+
+        # Bounds of |x - m| for the unknown median m in [lo, hi]
+        max_devs = np.maximum(np.abs(xs - self.lo), np.abs(xs - self.hi))
+        min_devs = np.maximum(np.maximum(self.lo - xs, xs - self.hi), 0)
+
+        self.num_dev_below += int(np.sum(max_devs < self.dev_lo))
+        self.mad_candidates.append(
+            xs[(max_devs >= self.dev_lo) & (min_devs <= self.dev_hi)]
+        )
+
+    def get_mad(self):
+        """Returns the exact MAD after the second pass."""
+        if self.sketch.num_nans > 0 or self.num_values == 0:
+            return np.nan
+
+        median_candidates = np.sort(np.concatenate(self.median_candidates))
+        median = _select_middle(median_candidates, self.ranks, self.num_below_lo)
+
+        deviations = np.abs(np.concatenate(self.mad_candidates) - median)
+        num_below = self.num_dev_below + int(np.sum(deviations < self.dev_lo))
+        deviations = np.sort(
+            deviations[(deviations >= self.dev_lo) & (deviations <= self.dev_hi)]
+        )
+
+        return _select_middle(deviations, self.ranks, num_below)
+
+
+def compute_mads(x_train, cont_indexes):
+    """Compute the MADs of many continuous columns at once.
+
+    Args:
+        x_train (Union[np.ndarray, ColumnarData]): The training data.
+        cont_indexes (list): Column indexes of the continuous features.
+
+    Returns:
+        np.ndarray: MAD of each column in `cont_indexes`.
+    """
+    # Each column is converted into a contiguous float column exactly once
+    xs = np.empty((x_train.shape[0], len(cont_indexes)), dtype=float, order="F")
+    for j, i in enumerate(cont_indexes):
+        if isinstance(x_train, ColumnarData):
+            xs[:, j] = x_train.get_column(i)
+        else:
+            xs[:, j] = x_train[:, i]
+
+    # Selection only reorders values within each column, which does not change
+    # the deviations, so both medians can work in place
+    medians = np.median(xs, axis=0, overwrite_input=True)
+
+    # Reuse the same buffer for the absolute deviations
+    np.subtract(xs, medians, out=xs)
+    np.abs(xs, out=xs)
+
+    return np.median(xs, axis=0, overwrite_input=True)
+
+
+def count_levels(xs):
+    """Count the occurrences of each level in a categorical column.
+
+    Args:
+        xs (np.ndarray): A column of categorical values.
+
+    Returns:
+        dict: `level_name` -> `count`.
+    """
+    if xs.dtype == object:
+        # Sorting Python objects in np.unique() is much slower than hashing
+        # them, and levels with mixed types cannot be sorted at all
+        return dict(Counter(xs.tolist()))
+
+    levels, counts = np.unique(xs, return_counts=True)
+    return {level: int(count) for level, count in zip(levels.tolist(), counts)}
+
+
+def iter_chunks(source, feature_names, feature_types, chunk_size=CHUNK_SIZE):
+    """Iterate over the training data in chunks.
+
+    Args:
+        source (Union[np.ndarray, ColumnarData, str, Path, Iterable]): An
+            array or memmap, a `ColumnarData`, a path to a CSV or Parquet file,
+            or an iterable of chunks.
+        feature_names (list): Names of the main features.
+        feature_types (list): EBM types of the main features ('continuous' or
+            'nominal').
+        chunk_size (int, optional): Number of rows in each chunk.
+
+    Yields:
+        Union[np.ndarray, pd.DataFrame, ColumnarData]: A chunk of rows.
+    """
+    if isinstance(source, np.ndarray):
+        for start in range(0, source.shape[0], chunk_size):
+            end = start + chunk_size
+            yield source[start:end]
+
+    elif isinstance(source, ColumnarData):
+        for start in range(0, source.shape[0], chunk_size):
+            end = start + chunk_size
+            yield source.take(slice(start, end))
+
+    elif isinstance(source, (str, Path)):
+        path = Path(source)
+        # Read levels as strings, the same as the EBM's level names
+        dtypes = {
+            f_name: float if f_type == "continuous" else str
+            for f_name, f_type in zip(feature_names, feature_types)
+        }
+
+        if path.suffix.lower() == ".parquet":
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Reading Parquet files requires pyarrow.")
+
+            parquet_file = pq.ParquetFile(path)
+            for batch in parquet_file.iter_batches(
+                batch_size=chunk_size, columns=list(feature_names)
+            ):
+                yield batch.to_pandas().astype(dtypes)
+        else:
+            import pandas as pd
+
+            yield from pd.read_csv(
+                path, chunksize=chunk_size, usecols=list(feature_names), dtype=dtypes
+            )
+
+    else:
+        yield from source
+
+
+def _get_num_rows(chunk):
+    """Returns the number of rows of an array or DataFrame chunk."""
+    return chunk.shape[0]
+
+
+def _get_column(chunk, index, name):
+    """Returns one feature column of an array or DataFrame chunk."""
+    if isinstance(chunk, ColumnarData):
+        return chunk.get_column(index)
+    if _is_dataframe(chunk):
+        return chunk[name].to_numpy()
+    return np.asarray(chunk)[:, index]
+
+
+def _count_chunk_levels(chunk, index, name):
+    """Count the levels of one categorical feature in a chunk."""
+    if isinstance(chunk, ColumnarData):
+        return chunk.count_levels(index)
+    return count_levels(_get_column(chunk, index, name))
+
+
+def _get_weighted_median(values, weights, num_values):
+    """Median of sorted weighted items, averaging the middle two like
+    `np.median()`."""
+    cum_weights = np.cumsum(weights)
+    ranks = [(num_values - 1) // 2, num_values // 2]
+    indexes = np.searchsorted(cum_weights, np.array(ranks) + 1)
+    indexes = np.minimum(indexes, len(values) - 1)
+    return (values[indexes[0]] + values[indexes[1]]) / 2
+
+
+def _get_rank_bracket(values, weights, ranks, error):
+    """Find [lo, hi] that must include the order statistics at `ranks`.
+
+    The estimated rank (count of values <= v) of each item is off by at most
+    `error`. `lo` has at most `ranks[0]` values below it, and `hi` has at
+    least `ranks[1] + 1` values at or below it.
+    """
+    cum_weights = np.cumsum(weights)
+
+    # The estimated rank of a value is the cumulative weight of its last copy
+    last_indexes = np.searchsorted(values, values, side="right") - 1
+    est_ranks = cum_weights[last_indexes]
+
+    lo_indexes = np.flatnonzero(est_ranks + error <= ranks[0])
+    lo = values[lo_indexes[-1]] if len(lo_indexes) > 0 else -np.inf
+
+    hi_indexes = np.flatnonzero(est_ranks - error >= ranks[1] + 1)
+    hi = values[hi_indexes[0]] if len(hi_indexes) > 0 else np.inf
+
+    return lo, hi
+
+
+def _select_middle(sorted_candidates, ranks, num_below):
+    """Average the order statistics at `ranks` from the sorted candidates."""
+    indexes = np.array(ranks) - num_below
+
+    if indexes[0] < 0 or indexes[1] >= len(sorted_candidates):
+        raise RuntimeError("The exact MAD candidates do not cover the median.")
+
+    return (sorted_candidates[indexes[0]] + sorted_candidates[indexes[1]]) / 2
+
+
+def _counts_to_frequency_distance(counts, num_rows):
+    """Convert level counts to (1 - frequency) distances."""
+    return {level: 1 - (count / num_rows) for level, count in counts.items()}
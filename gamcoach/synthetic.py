@@ -0,0 +1,223 @@
+"""Synthetic EBMs for scaling benchmarks.
+
+This module creates `CompiledEBM` models with random bin and score tables,
+without training. We use them to see how GAM Coach scales to models that are
+much larger than the bundled datasets, e.g., with hundreds of features,
+thousands of bins, and many pair terms. `make_synthetic_data()` samples
+training data and examples that fit the bins of such a model.
+
+Example:
+    ebm = make_synthetic_ebm(num_features=200, num_bins=1024, random_state=0)
+    x_train = make_synthetic_data(ebm, 2000, random_state=0)
+    my_coach = GAMCoach(ebm, x_train)
+"""
+
+from itertools import combinations
+
+import numpy as np
+
+from .compiled import CompiledEBM
+
+# Range of the values of each continuous feature
+CONTINUOUS_BOUNDS = (0.0, 1000.0)
+
+# Supported shapes of the score functions
+SCORE_DISTRIBUTIONS = ["smooth", "monotone", "random"]
+
+
+def make_synthetic_ebm(
+    num_features: int = 20,
+    categorical_ratio: float = 0.2,
+    num_bins: int = 64,
+    num_levels: int = 8,
+    num_interactions: int = 10,
+    interaction_bins: int = 32,
+    score_distribution: str = "smooth",
+    score_scale: float = 1.0,
+    interaction_scale: float = 0.5,
+    intercept: float = 0.0,
+    random_state: int = None,
+):
+    """Create a binary classification EBM with random tables.
+
+    Continuous features have random cuts in `CONTINUOUS_BOUNDS`, and their
+    pair terms use a coarser subset of the cuts, like interpret's EBMs.
+    Categorical features have levels 'L0', 'L1', ... The score scale of each
+    term is drawn from an exponential distribution, so a few terms dominate the
+    prediction, as in trained EBMs.
+
+    Args:
+        num_features (int, optional): Number of main features.
+        categorical_ratio (float, optional): Fraction of categorical features.
+        num_bins (int, optional): Number of bins of each continuous feature.
+        num_levels (int, optional): Number of levels of each categorical
+            feature.
+        num_interactions (int, optional): Number of pair terms. It is capped
+            at the number of feature pairs.
+        interaction_bins (int, optional): Number of bins of continuous
+            features in pair terms.
+        score_distribution (str, optional): Shape of the continuous score
+            functions: 'smooth' (random walk), 'monotone' (monotone random
+            walk), or 'random' (independent scores). Categorical levels always
+            have independent scores.
+        score_scale (float, optional): Mean standard deviation of the main
+            effect scores.
+        interaction_scale (float, optional): Mean standard deviation of the
+            pair effect scores.
+        intercept (float, optional): The intercept. With 0, about half of the
+            data is rejected.
+        random_state (int, optional): Seed of the random tables.
+
+    Returns:
+        CompiledEBM: The synthetic model.
+    """
+    if score_distribution not in SCORE_DISTRIBUTIONS:
+        raise ValueError(
+            "score_distribution must be one of {}".format(SCORE_DISTRIBUTIONS)
+        )
+
+    rs = np.random.RandomState(random_state)
+
+    num_categorical = int(round(num_features * categorical_ratio))
+    is_categorical = np.zeros(num_features, dtype=bool)
+    is_categorical[rs.choice(num_features, num_categorical, replace=False)] = True
+
+    feature_names = ["f{}".format(i) for i in range(num_features)]
+    feature_types = []
+    bins = []
+    feature_bounds = np.full((num_features, 2), np.nan)
+
+    for i in range(num_features):
+        if is_categorical[i]:
+            feature_types.append("nominal")
+            bins.append([{"L{}".format(j): j + 1 for j in range(num_levels)}])
+        else:
+            feature_types.append("continuous")
+            feature_bounds[i] = CONTINUOUS_BOUNDS
+
+            main_cuts = np.unique(rs.uniform(*CONTINUOUS_BOUNDS, num_bins - 1))
+            pair_index = np.linspace(0, len(main_cuts) - 1, interaction_bins - 1)
+            pair_cuts = np.unique(main_cuts[np.round(pair_index).astype(int)])
+            bins.append([main_cuts, pair_cuts])
+
+    term_features = [(i,) for i in range(num_features)]
+    term_scores = [
+        _get_main_scores(rs, bins[i], score_distribution, score_scale)
+        for i in range(num_features)
+    ]
+
+    pairs = list(combinations(range(num_features), 2))
+    num_interactions = min(num_interactions, len(pairs))
+
+    for p in sorted(rs.choice(len(pairs), num_interactions, replace=False)):
+        term_features.append(pairs[p])
+        term_scores.append(
+            _get_pair_scores(
+                rs,
+                bins[pairs[p][0]],
+                bins[pairs[p][1]],
+                score_distribution,
+                interaction_scale,
+            )
+        )
+
+    return CompiledEBM(
+        feature_names,
+        feature_types,
+        bins,
+        term_features,
+        term_scores,
+        intercept,
+        feature_bounds,
+        classes=np.array([0, 1]),
+    )
+
+
+def make_synthetic_data(
+    ebm: CompiledEBM,
+    num_rows: int,
+    level_skew: float = 1.0,
+    random_state: int = None,
+):
+    """Sample data that fits the bins of a synthetic EBM.
+
+    Continuous values are uniform in their bounds. Categorical levels follow
+    a Zipf-like distribution with a random level order, so their frequency
+    distances differ.
+
+    Args:
+        ebm (CompiledEBM): The synthetic model.
+        num_rows (int): Number of rows.
+        level_skew (float, optional): Exponent of the level distribution. The
+            level of rank `r` has a probability proportional to
+            `1 / r^level_skew`.
+        random_state (int, optional): Seed of the samples.
+
+    Returns:
+        np.ndarray: A (num_rows, n_features) object array with float values for
+            continuous features and level names for categorical features.
+    """
+    rs = np.random.RandomState(random_state)
+    x = np.empty((num_rows, len(ebm.feature_types_in_)), dtype=object)
+
+    for i, f_type in enumerate(ebm.feature_types_in_):
+        if f_type == "continuous":
+            low, high = ebm.feature_bounds_[i]
+            x[:, i] = rs.uniform(low, high, num_rows)
+        else:
+            levels = rs.permutation(list(ebm.bins_[i][0]))
+            probs = 1 / np.arange(1, len(levels) + 1) ** level_skew
+            x[:, i] = rs.choice(levels, num_rows, p=probs / np.sum(probs))
+
+    return x
+
+
+def _get_num_bins(f_bins, is_pair):
+    """Number of known bins of a feature in a main or a pair term."""
+    if isinstance(f_bins[0], dict):
+        return len(f_bins[0])
+
+    cuts = f_bins[-1] if is_pair else f_bins[0]
+    return len(cuts) + 1
+
+
+def _get_main_scores(rs, f_bins, score_distribution, scale):
+    """Create the score table of a main effect, with zero scores for the
+    missing and unknown bins."""
+    num_bins = _get_num_bins(f_bins, False)
+    steps = rs.normal(size=num_bins)
+
+    if isinstance(f_bins[0], dict) or score_distribution == "random":
+        scores = steps
+    elif score_distribution == "smooth":
+        scores = np.cumsum(steps)
+    else:
+        scores = np.cumsum(np.abs(steps)) * rs.choice([-1, 1])
+
+    scores = _normalize(scores) * rs.exponential(scale)
+    return np.pad(scores, 1)
+
+
+def _get_pair_scores(rs, f_bins_1, f_bins_2, score_distribution, scale):
+    """Create the score table of a pair effect, with zero scores for the
+    missing and unknown bins."""
+    shape = (_get_num_bins(f_bins_1, True), _get_num_bins(f_bins_2, True))
+    steps = rs.normal(size=shape)
+
+    # Random walks along the continuous axes
+    for axis, f_bins in enumerate([f_bins_1, f_bins_2]):
+        if isinstance(f_bins[0], dict) or score_distribution == "random":
+            continue
+        if score_distribution == "monotone":
+            steps = np.abs(steps)
+        steps = np.cumsum(steps, axis=axis)
+
+    scores = _normalize(steps) * rs.exponential(scale)
+    return np.pad(scores, 1)
+
+
+def _normalize(scores):
+    """Center scores and scale them to unit standard deviation."""
+    scores = scores - np.mean(scores)
+    std = np.std(scores)
+    return scores / std if std > 0 else scores
@@ -0,0 +1,457 @@
+"""GenerationStats Class.
+
+This module implements the GenerationStats class. We use it to record where
+`GAMCoach.generate_cfs()` spends its time: the wall and CPU time of each stage,
+the number of options before and after each filter, and the size of each MILP.
+
+Stages do not overlap, so their times add up to about the total time. The CPU
+time includes the finished child processes, such as the CBC solver.
+
+With `track_memory=True`, we also trace the Python memory allocations of each
+stage with tracemalloc: the peak bytes above the stage's starting point, the
+bytes it keeps, and its largest allocation sites. From these, we estimate the
+bytes per option, per interaction option, and per MILP variable, so that a
+service can predict the footprint of a request before building its MILP (see
+`estimate_memory()`). The memory of the CBC subprocess is not included.
+"""
+
+import os
+import time
+import tracemalloc
+
+from .solver import is_time_limited
+
+# Functions called with the GenerationStats of every generate_cfs() call
+STATS_HOOKS = []
+
+# (cProfile.Profile, stage names) to profile some stages, see
+# `set_stage_profiler()`
+STAGE_PROFILER = [None, ()]
+
+# Number of the largest allocation sites to keep for each stage
+MEMORY_TOP_SITES = 5
+
+# Stages that generate the options of main features
+MAIN_OPTION_STAGES = ["generate_cont_options", "generate_cat_options"]
+
+# Ignore the allocations of tracemalloc itself in the stage snapshots
+SNAPSHOT_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)]
+
+
+class GenerationStats:
+    """Class to represent the stage timings and sizes of one CF generation."""
+
+    def __init__(self, track_memory: bool = False):
+        """Initialize a GenerationStats object, and start the total timer.
+
+        Args:
+            track_memory (bool, optional): If true, trace the memory
+                allocations of each stage with tracemalloc. It starts tracing
+                if it is not running, and stops it in `finish()`.
+        """
+        self.start_time: float = time.perf_counter()
+        """Start of the generation (`time.perf_counter()` in seconds)."""
+
+        self.unix_start_time: float = time.time()
+        """Start of the generation (`time.time()` in seconds)."""
+
+        self.wall_time: float = None
+        """Total wall time in seconds, set by `finish()`."""
+
+        self.cpu_time: float = None
+        """Total CPU time in seconds, set by `finish()`."""
+
+        self.spans: list = []
+        """(`stage`, `start`, `wall_time`, `cpu_time`) of each timed run of a
+        stage, in seconds. `start` is relative to `start_time`."""
+
+        self.option_counts: dict = {}
+        """`filter stage` -> {`feature_name`: number of options} after each
+        option generation or filter stage."""
+
+        self.milps: list = []
+        """Size, status, and solver time of each solved MILP model."""
+
+        self.rounds: list = []
+        """(`round`, `start`, `wall_time`, `cpu_time`) of each diversity round
+        (one CF each), in the same format as `spans`. Rounds contain the
+        `create_milp` and `solve_milp` spans of their MILPs."""
+
+        self.num_cfs: int = None
+        """Number of generated CFs, set by `finish()`."""
+
+        self.metadata: dict = {}
+        """Extra information of the call, such as the model fingerprint."""
+
+        self.memory: dict = None
+        """`stage` -> {'peak_bytes', 'net_bytes', 'calls', 'top_sites'} if
+        memory is tracked. `peak_bytes` is the highest peak above the start of
+        a run, `net_bytes` is the total bytes the runs keep, and `top_sites`
+        maps `file:line` to the bytes it keeps."""
+
+        self.memory_estimates: dict = None
+        """Estimated bytes per option, per interaction option, and per MILP
+        variable, set by `finish()` if memory is tracked."""
+
+        self._stop_tracemalloc = False
+        if track_memory:
+            self.memory = {}
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._stop_tracemalloc = True
+
+        self._start_cpu_time = _get_cpu_time()
+
+    def __repr__(self) -> str:
+        lines = ["Generation stats ({:.4f}s)".format(self.wall_time or 0)]
+
+        for name, times in self.get_stage_times().items():
+            lines.append(
+                "  {:<28} wall {:.4f}s  cpu {:.4f}s  calls {}".format(
+                    name, times["wall_time"], times["cpu_time"], times["calls"]
+                )
+            )
+
+        for name, counts in self.option_counts.items():
+            lines.append("  options after {:<16} {}".format(name, sum(counts.values())))
+
+        for milp in self.milps:
+            lines.append(
+                "  milp {:<23} {} variables, {} constraints".format(
+                    milp["name"], milp["num_variables"], milp["num_constraints"]
+                )
+            )
+
+        for name, memory in (self.memory or {}).items():
+            lines.append(
+                "  memory {:<21} peak {:.1f} KB  kept {:.1f} KB".format(
+                    name, memory["peak_bytes"] / 1024, memory["net_bytes"] / 1024
+                )
+            )
+
+        return "\n".join(lines)
+
+    def stage(self, name):
+        """Returns a context manager that times one run of a stage."""
+        return _Stage(self, name, self.spans)
+
+    def record_options(self, name, options):
+        """Count the options of each feature after a stage.
+
+        Args:
+            name (str): The stage name, such as 'generated' or 'pruned'.
+            options (dict): `feature_name` -> `OptionTable`.
+        """
+        self.option_counts[name] = {
+            f_name: len(option_table) for f_name, option_table in options.items()
+        }
+
+    def record_milp(self, name, model, has_time_limit=False):
+        """Record the size and the solver result of a solved MILP model.
+
+        Args:
+            name (str): What the MILP is for, such as 'cf' or 'certify'.
+            model (LpProblem): The solved MILP model.
+            has_time_limit (bool, optional): True if the solve had a time
+                limit. We record if the limit stopped the solver (see
+                `solver.is_time_limited()`).
+        """
+        self.milps.append(
+            {
+                "name": name,
+                "num_variables": int(model.numVariables()),
+                "num_constraints": int(model.numConstraints()),
+                "status": int(model.status),
+                "sol_status": int(model.sol_status),
+                "time_limited": is_time_limited(model, has_time_limit),
+                "solution_time": float(model.solutionTime),
+            }
+        )
+
+    def finish(self, num_cfs=None):
+        """Stop the total timer.
+
+        Args:
+            num_cfs (int, optional): Number of generated CFs.
+        """
+        self.num_cfs = num_cfs
+        self.wall_time = time.perf_counter() - self.start_time
+        self.cpu_time = _get_cpu_time() - self._start_cpu_time
+
+        if self.memory is not None:
+            if self._stop_tracemalloc:
+                tracemalloc.stop()
+                self._stop_tracemalloc = False
+
+            for memory in self.memory.values():
+                top_sites = sorted(
+                    memory["top_sites"].items(), key=lambda x: x[1], reverse=True
+                )
+                memory["top_sites"] = dict(top_sites[:MEMORY_TOP_SITES])
+
+            self.memory_estimates = self.get_memory_estimates()
+
+    def get_stage_times(self):
+        """Sum the times of each stage over its runs.
+
+        Returns:
+            dict: `stage` -> {'wall_time', 'cpu_time', 'calls'}, in the order of
+                the stages' first runs.
+        """
+        stage_times = {}
+
+        for name, _, wall_time, cpu_time in self.spans:
+            if name not in stage_times:
+                stage_times[name] = {"wall_time": 0.0, "cpu_time": 0.0, "calls": 0}
+
+            stage_times[name]["wall_time"] += wall_time
+            stage_times[name]["cpu_time"] += cpu_time
+            stage_times[name]["calls"] += 1
+
+        return stage_times
+
+    def get_memory_estimates(self):
+        """Estimate the bytes that each option and MILP variable takes.
+
+        Options are kept until the end of the call, so we divide the bytes
+        that the option stages keep by the number of options. The MILP is
+        built at once, so we divide the peak bytes of `create_milp` by the
+        variables of the largest MILP.
+
+        Returns:
+            dict: 'bytes_per_option', 'bytes_per_interaction_option', and
+                'bytes_per_milp_variable'. An estimate is `None` if its stage
+                did not run. The dictionary is `None` if memory is not tracked.
+        """
+        if self.memory is None:
+            return None
+
+        main_counts = self.option_counts.get("generated", {})
+        num_options = sum(main_counts.values())
+        num_inter_options = sum(
+            count
+            for f_name, count in self.option_counts.get("final", {}).items()
+            if f_name not in main_counts
+        )
+        num_variables = max((milp["num_variables"] for milp in self.milps), default=0)
+
+        option_bytes = sum(
+            self.memory[name]["net_bytes"]
+            for name in MAIN_OPTION_STAGES
+            if name in self.memory
+        )
+        inter_memory = self.memory.get("generate_inter_options")
+        milp_memory = self.memory.get("create_milp")
+
+        return {
+            "bytes_per_option": _divide(option_bytes, num_options),
+            "bytes_per_interaction_option": _divide(
+                inter_memory["net_bytes"] if inter_memory else None,
+                num_inter_options,
+            ),
+            "bytes_per_milp_variable": _divide(
+                milp_memory["peak_bytes"] if milp_memory else None, num_variables
+            ),
+        }
+
+    def to_dict(self):
+        """Convert the stats to a JSON-serializable dictionary."""
+        stats_dict = {
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "num_cfs": self.num_cfs,
+            "stages": self.get_stage_times(),
+            "option_counts": {
+                name: sum(counts.values())
+                for name, counts in self.option_counts.items()
+            },
+            "milps": self.milps,
+        }
+
+        if self.memory is not None:
+            stats_dict["memory"] = self.memory
+            stats_dict["memory_estimates"] = self.memory_estimates
+
+        return stats_dict
+
+    def _record_memory(self, name, start_bytes, snapshot):
+        """Record the memory of one run of a stage.
+
+        Args:
+            name (str): The stage name.
+            start_bytes (int): Traced bytes at the start of the run.
+            snapshot (tracemalloc.Snapshot): Snapshot at the start of the run.
+        """
+        cur_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        diffs = (
+            tracemalloc.take_snapshot()
+            .filter_traces(SNAPSHOT_FILTERS)
+            .compare_to(snapshot, "lineno")
+        )
+
+        if name not in self.memory:
+            self.memory[name] = {
+                "peak_bytes": 0,
+                "net_bytes": 0,
+                "calls": 0,
+                "top_sites": {},
+            }
+
+        memory = self.memory[name]
+        memory["peak_bytes"] = max(memory["peak_bytes"], peak_bytes - start_bytes)
+        memory["net_bytes"] += cur_bytes - start_bytes
+        memory["calls"] += 1
+
+        # Sites are sorted by their size differences
+        for diff in diffs[:MEMORY_TOP_SITES]:
+            if diff.size_diff <= 0:
+                break
+            frame = diff.traceback[0]
+            site = "{}:{}".format(frame.filename, frame.lineno)
+            memory["top_sites"][site] = (
+                memory["top_sites"].get(site, 0) + diff.size_diff
+            )
+
+
+class _Stage:
+    """Context manager to time one run of a stage."""
+
+    __slots__ = [
+        "stats",
+        "name",
+        "spans",
+        "start",
+        "start_cpu",
+        "profile",
+        "start_bytes",
+        "snapshot",
+    ]
+
+    def __init__(self, stats, name, spans):
+        self.stats = stats
+        self.name = name
+        self.spans = spans
+        self.profile = None
+        self.snapshot = None
+
+    def __enter__(self):
+        if STAGE_PROFILER[0] is not None and self.name in STAGE_PROFILER[1]:
+            self.profile = STAGE_PROFILER[0]
+            self.profile.enable()
+
+        # Rounds contain stages, so we only trace the memory of stages
+        if self.stats.memory is not None and self.spans is self.stats.spans:
+            self.snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            # Without `reset_peak()` (Python < 3.9), the peak is since the
+            # start of tracing
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            self.start_bytes = tracemalloc.get_traced_memory()[0]
+
+        self.start = time.perf_counter()
+        self.start_cpu = _get_cpu_time()
+        return self
+
+    def __exit__(self, *args):
+        wall_time = time.perf_counter() - self.start
+        cpu_time = _get_cpu_time() - self.start_cpu
+        self.spans.append(
+            (self.name, self.start - self.stats.start_time, wall_time, cpu_time)
+        )
+
+        if self.profile is not None:
+            self.profile.disable()
+
+        if self.snapshot is not None:
+            self.stats._record_memory(self.name, self.start_bytes, self.snapshot)
+
+
+class _NullStage:
+    """Context manager that does nothing, used when stats are disabled."""
+
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+def time_stage(stats, name):
+    """Returns a context manager that times a stage, or a no-op context manager
+    if `stats` is `None`."""
+    if stats is None:
+        return NULL_STAGE
+    return _Stage(stats, name, stats.spans)
+
+
+def time_round(stats, index):
+    """Returns a context manager that times a diversity round, or a no-op
+    context manager if `stats` is `None`."""
+    if stats is None:
+        return NULL_STAGE
+    return _Stage(stats, "round {}".format(index), stats.rounds)
+
+
+def add_stats_hook(hook):
+    """Call `hook(stats)` with the GenerationStats of every generate_cfs() call
+    that collects stats."""
+    STATS_HOOKS.append(hook)
+
+
+def remove_stats_hook(hook):
+    """Stop calling a hook added by `add_stats_hook()`."""
+    STATS_HOOKS.remove(hook)
+
+
+def set_stage_profiler(profile, stage_names=()):
+    """Profile the given stages of all generate_cfs() calls that collect stats
+    with a `cProfile.Profile`. Use `None` to stop profiling.
+
+    Args:
+        profile (cProfile.Profile): The profiler, or `None`.
+        stage_names (tuple, optional): Names of the stages to profile.
+    """
+    STAGE_PROFILER[0] = profile
+    STAGE_PROFILER[1] = tuple(stage_names)
+
+
+def estimate_memory(
+    estimates, num_options=0, num_interaction_options=0, num_variables=0
+):
+    """Predict the peak bytes of a request from the estimates of an earlier
+    call with `track_memory=True`.
+
+    Args:
+        estimates (dict): `GenerationStats.memory_estimates` of an earlier call
+            on the same model.
+        num_options (int, optional): Number of main feature options.
+        num_interaction_options (int, optional): Number of interaction options.
+        num_variables (int, optional): Number of MILP variables.
+
+    Returns:
+        float: The predicted bytes.
+    """
+    return (
+        num_options * (estimates["bytes_per_option"] or 0)
+        + num_interaction_options * (estimates["bytes_per_interaction_option"] or 0)
+        + num_variables * (estimates["bytes_per_milp_variable"] or 0)
+    )
+
+
+def _divide(total, count):
+    """Divide `total` by `count`, or return `None` if either is missing."""
+    if total is None or count == 0:
+        return None
+    return total / count
+
+
+def _get_cpu_time():
+    """CPU time of this process and its finished child processes. The CPU time
+    of child processes is only counted in clock ticks (often 10ms)."""
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
@@ -7,7 +7,9 @@ from setuptools import setup, find_packages
 with open("README.md") as readme_file:
     readme = readme_file.read()
 
-requirements = ["interpret>=0.3.0", "interpret-core>=0.3.0", "pulp"]
+# gamcoach.solver follows the CBC file handling of pulp's PULP_CBC_CMD, which
+# is internal to pulp, so we pin the major versions it was written against
+requirements = ["interpret>=0.3.0", "interpret-core>=0.3.0", "pulp>=2.4,<4"]
 
 test_requirements = [
     "pytest>=3",
@@ -0,0 +1,41 @@
+"""Shared fixtures for the `gamcoach` tests."""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from interpret.glassbox import ExplainableBoostingClassifier
+
+import gamcoach as coach
+
+SEED = 101221
+DATA_PATH = Path(__file__).parent / "data/lending-club-data-5000-ca.json"
+
+
+@pytest.fixture(scope="session")
+def lending_club():
+    data = json.load(open(DATA_PATH, "r"))
+
+    x_all = np.array(data["x_all"], dtype=object)
+    y_all = np.array(data["y_all"])
+
+    feature_types = [
+        "continuous" if t == "continuous" else "nominal" for t in data["feature_types"]
+    ]
+    for i, t in enumerate(feature_types):
+        if t == "continuous":
+            x_all[:, i] = x_all[:, i].astype(float)
+
+    ebm = ExplainableBoostingClassifier(
+        feature_names=data["feature_names"],
+        feature_types=feature_types,
+        interactions=2,
+        random_state=SEED,
+    )
+    ebm.fit(x_all, y_all)
+
+    my_coach = coach.GAMCoach(ebm, x_all)
+    x_reject = x_all[ebm.predict(x_all) == 0]
+
+    return my_coach, x_reject
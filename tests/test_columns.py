@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+"""Tests for the `ColumnarData` class and columnar inputs."""
+
+import numpy as np
+import pandas as pd
+
+import gamcoach as coach
+from gamcoach.columns import ColumnarData
+from gamcoach.compiled import CompiledEBM
+from gamcoach.statistics import FeatureStatistics
+
+
+def _to_frame(ebm, x):
+    """Convert an object matrix to a DataFrame with typed columns."""
+    df = pd.DataFrame(x, columns=ebm.feature_names_in_)
+    for i, f_name in enumerate(ebm.feature_names_in_):
+        if ebm.feature_types_in_[i] == "continuous":
+            df[f_name] = df[f_name].astype(float)
+        else:
+            df[f_name] = df[f_name].astype(str)
+    return df
+
+
+def test_columnar_data_encoding(lending_club):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+    df = _to_frame(ebm, x_reject)
+
+    columns = ColumnarData.from_data(ebm, df)
+    assert columns.shape == x_reject.shape
+    assert columns.get_column(0).dtype == np.float64
+
+    # Categorical codes are the EBM's bin indexes
+    level_to_bin = ebm.bins_[1][0]
+    expected = [level_to_bin[level] for level in x_reject[:, 1]]
+    assert columns.get_column(1).tolist() == expected
+
+    # Pandas categoricals, string arrays, and object arrays give the same codes
+    for values in [
+        df["term"].astype("category"),
+        df["term"].to_numpy(dtype=str),
+        x_reject[:, 1],
+    ]:
+        data = {f_name: df[f_name] for f_name in df.columns}
+        data["term"] = values
+        assert np.array_equal(ColumnarData.from_data(ebm, data).get_column(1), expected)
+
+    # Missing values and unseen levels can be recovered
+    x = x_reject[:3].copy()
+    x[0, 1] = None
+    x[1, 1] = "120 months"
+    columns = ColumnarData.from_data(ebm, {f: x[:, i] for i, f in enumerate(df)})
+    assert columns.get_column(1)[0] == 0
+    assert columns.get_bin_indexes(1)[1] == len(level_to_bin) + 1
+    assert columns.to_numpy()[:, 1].tolist() == [None, "120 months", x[2, 1]]
+
+    compiled = CompiledEBM.from_ebm(ebm)
+    assert np.allclose(compiled.eval_terms(columns), compiled.eval_terms(x))
+
+
+def test_coach_with_columnar_inputs(lending_club):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+    df = _to_frame(ebm, x_reject)
+
+    # Statistics of a DataFrame and a dictionary of columns match the array's
+    stats = FeatureStatistics.from_data(ebm, x_reject)
+    data = {f_name: df[f_name].to_numpy() for f_name in df.columns}
+
+    for x_train in [df, data]:
+        cur_stats = FeatureStatistics.from_source(ebm, x_train)
+        assert cur_stats.cont_mads == stats.cont_mads
+        assert cur_stats.cat_counts == stats.cat_counts
+
+    sketch_stats = FeatureStatistics.from_source(
+        ebm, df, chunk_size=500, mad_method="sketch"
+    )
+    assert sketch_stats.cat_counts == stats.cat_counts
+
+    # Generate CFs from a DataFrame row (x_reject does not have all levels)
+    cat_distances = my_coach.cat_distances
+    array_coach = coach.GAMCoach(ebm, x_reject, cat_distances=cat_distances)
+    df_coach = coach.GAMCoach(ebm, df, cat_distances=cat_distances)
+    assert df_coach.cont_mads == array_coach.cont_mads
+
+    kwargs = {"features_to_vary": ["loan_amnt", "fico_score", "term"], "verbose": 0}
+    cfs = array_coach.generate_cfs(x_reject[3], total_cfs=2, **kwargs)
+    df_cfs = df_coach.generate_cfs(df.iloc[[3]], total_cfs=2, **kwargs)
+
+    assert np.allclose(df_cfs.values, cfs.values)
+    assert np.array_equal(df_cfs.to_numpy(), cfs.to_numpy())
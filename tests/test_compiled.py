@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""Tests for the `CompiledEBM` class and saved coaches."""
+
+import json
+import zipfile
+
+import numpy as np
+
+import gamcoach as coach
+from gamcoach.compiled import CompiledEBM
+
+
+def test_compiled_ebm_scores_match_ebm(lending_club):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+    compiled = CompiledEBM.from_ebm(ebm)
+
+    x = x_reject[:200].copy()
+    x[0, 0] = ebm.bins_[0][0][3]
+    x[1, 1] = "unknown level"
+
+    assert np.allclose(compiled.eval_terms(x), ebm.eval_terms(x))
+    assert np.allclose(compiled.predict_proba(x), ebm.predict_proba(x))
+    assert np.array_equal(compiled.predict(x), ebm.predict(x))
+    assert compiled.fingerprint == CompiledEBM.from_ebm(ebm).get_fingerprint()
+
+
+def test_save_and_load_coach(lending_club, tmp_path):
+    my_coach, x_reject = lending_club
+    path = tmp_path / "coach.npz"
+
+    my_coach.save(path)
+
+    # The artifact only has a JSON header and plain arrays
+    with zipfile.ZipFile(path) as zip_file:
+        header = json.loads(zip_file.read("header.json"))
+        assert sorted(zip_file.namelist()) == [
+            "cuts.npy",
+            "feature_bounds.npy",
+            "header.json",
+            "scores.npy",
+        ]
+    assert header["version"] == 1
+    np.load(path, allow_pickle=False)["scores"]
+
+    loaded = coach.GAMCoach.load(path, verify=True)
+    assert isinstance(loaded.ebm.term_scores_[0].base, np.memmap)
+    assert loaded.ebm.fingerprint == header["fingerprint"]
+    assert loaded.cont_mads == my_coach.cont_mads
+    assert loaded.feature_names == my_coach.feature_names
+
+    kwargs = {"features_to_vary": ["loan_amnt", "fico_score", "term"], "verbose": 0}
+    cfs = my_coach.generate_cfs(x_reject[3], total_cfs=2, **kwargs)
+    loaded_cfs = loaded.generate_cfs(x_reject[3], total_cfs=2, **kwargs)
+
+    assert np.allclose(loaded_cfs.values, cfs.values)
+    assert np.array_equal(loaded_cfs.to_numpy(), cfs.to_numpy())
+    assert np.array_equal(loaded_cfs.predictions, cfs.predictions)
+
+
+def test_coach_from_model_data(lending_club, tmp_path):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+
+    model_data = coach.get_model_data(
+        ebm,
+        x_reject,
+        {"classes": ["rejection", "approval"]},
+        feature_stats=my_coach.feature_stats,
+    )
+    path = tmp_path / "model.json"
+    path.write_text(json.dumps(model_data))
+
+    loaded = coach.GAMCoach.from_model_data(str(path))
+    assert loaded.feature_names == my_coach.feature_names
+    assert loaded.feature_types == my_coach.feature_types
+    assert loaded.cont_mads == model_data["contMads"]
+
+    # Exported scores are rounded to 6 decimals
+    x = x_reject[:200]
+    diff = loaded.ebm.decision_function(x) - ebm.decision_function(x)
+    assert np.max(np.abs(diff)) < 1e-4
+    assert np.array_equal(loaded.ebm.predict(x), ebm.predict(x))
+
+    cfs = loaded.generate_cfs(
+        x_reject[3],
+        total_cfs=2,
+        features_to_vary=["loan_amnt", "fico_score", "term"],
+        verbose=0,
+    )
+    assert len(cfs) == 2
+    assert np.all(ebm.predict(cfs.to_numpy()) == 1)
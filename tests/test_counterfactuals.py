@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""Tests for the `Counterfactuals` class."""
+
+import pickle
+
+import numpy as np
+
+import gamcoach as coach
+
+
+def test_counterfactuals_result(lending_club):
+    my_coach, x_reject = lending_club
+
+    cfs = my_coach.generate_cfs(
+        x_reject[0],
+        total_cfs=2,
+        features_to_vary=["loan_amnt", "fico_score", "term"],
+        verbose=0,
+    )
+
+    assert len(cfs) == 2
+    assert not hasattr(cfs, "__dict__")
+    assert cfs.model_stats["num_variables"] > 0
+    assert len(cfs.solver_stats["statuses"]) == 2
+
+    data = cfs.to_numpy()
+    assert data.shape == (2, x_reject.shape[1])
+    assert np.all(my_coach.ebm.predict(data) == 1)
+    assert np.all(cfs.predictions == 1)
+
+    # Only the changed features of each CF differ from the original row
+    changed = data != x_reject[0]
+    for i, ranges in enumerate(cfs.target_ranges):
+        assert np.sum(changed[i]) == len(ranges)
+
+    df = cfs.to_df()
+    assert list(df.columns[:-1]) == list(my_coach.ebm.feature_names_in_)
+    assert df["new_prediction"].tolist() == [1, 1]
+
+    # The result does not pin the solver, options, or the EBM
+    restored = pickle.loads(pickle.dumps(cfs))
+    assert len(pickle.dumps(cfs)) < 10000
+    assert np.array_equal(restored.to_numpy(), data)
+    assert np.allclose(restored.values, cfs.values)
+    assert restored.target_ranges == cfs.target_ranges
+
+
+def test_verify_cfs_in_batch(lending_club, monkeypatch):
+    my_coach, x_reject = lending_club
+
+    results = [
+        my_coach.generate_cfs(
+            x_reject[i],
+            total_cfs=1,
+            features_to_vary=["loan_amnt", "fico_score"],
+            verbose=0,
+            verify=False,
+        )
+        for i in range(3)
+    ]
+    assert all(result.predictions is None for result in results)
+
+    # Flag CFs that do not reach the target
+    results[1].target = 0
+
+    is_valid = coach.verify_cfs(my_coach.ebm, results)
+    assert is_valid.tolist() == [True, False, True]
+    assert results[1].is_valid.tolist() == [False]
+    assert results[2].probabilities.shape == (1, 2)
+    assert np.all(results[2].probabilities[:, 1] > 0.5)
+
+    # Cached predictions are used after the verification
+    monkeypatch.setattr(my_coach.ebm, "predict", None)
+    monkeypatch.setattr(my_coach.ebm, "predict_proba", None)
+    assert results[0].to_df()["new_prediction"].tolist() == [1]
+    assert "new_prediction" in repr(results[0])
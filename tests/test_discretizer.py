@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""Tests for the `Discretizer` class."""
+
+import numpy as np
+
+from gamcoach.discretizer import Discretizer
+from gamcoach.gamcoach import (
+    _get_main_bin_labels,
+    _get_pair_bin_labels,
+    search_sorted_lower_index,
+)
+
+
+def test_discretizer_matches_binary_search(lending_club):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+    discretizer = Discretizer(ebm)
+    rs = np.random.RandomState(0)
+
+    for i, f_type in enumerate(ebm.feature_types_in_):
+        for level, get_labels in enumerate(
+            [_get_main_bin_labels, _get_pair_bin_labels]
+        ):
+            labels = get_labels(ebm, i)
+
+            if f_type == "continuous":
+                # Values on the edges, between them, and out of bound
+                bin_starts = labels[:-1]
+                edges = np.array(labels)
+                values = np.concatenate(
+                    (edges, rs.uniform(edges[0] - 10, edges[-1] + 10, 200))
+                )
+                expected = [search_sorted_lower_index(bin_starts, v) for v in values]
+            else:
+                values = np.array(labels * 2, dtype=object)
+                expected = [labels.index(v) for v in values]
+
+            bins = discretizer.discretize(values, i, level)
+            assert np.array_equal(bins - 1, expected)
+
+    # Missing values and unknown levels
+    assert discretizer.discretize([np.nan], 0).tolist() == [0]
+    assert discretizer.discretize([None, "unknown"], 1).tolist() == [
+        0,
+        len(ebm.bins_[1][0]) + 1,
+    ]
+
+
+def test_discretizer_transform_matrix(lending_club):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+    discretizer = my_coach.discretizer
+    x = x_reject[:300]
+
+    main_bins, pair_bins = discretizer.transform(x)
+    assert main_bins.shape == pair_bins.shape == x.shape
+
+    for i in range(x.shape[1]):
+        assert np.array_equal(main_bins[:, i], discretizer.discretize(x[:, i], i, 0))
+        assert np.array_equal(pair_bins[:, i], discretizer.discretize(x[:, i], i, 1))
+
+    scores = discretizer.eval_terms(x, ebm.term_features_, ebm.term_scores_)
+    assert np.allclose(scores, ebm.eval_terms(x))
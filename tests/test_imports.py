@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+"""Tests for the import time dependencies of `gamcoach`."""
+
+import subprocess
+import sys
+
+
+def test_import_is_lazy():
+    # Heavy dependencies are only imported when they are used
+    code = (
+        "import sys, gamcoach; "
+        "print(' '.join(m for m in ['pulp', 'tqdm', 'scipy', 'pandas', "
+        "'interpret'] if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    assert output.stdout.strip() == ""
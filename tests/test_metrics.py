@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""Tests for the `MetricsRegistry` class."""
+
+import json
+
+import pulp
+
+import gamcoach as coach
+from gamcoach.metrics import METRICS, MetricsRegistry
+from gamcoach.solver import SolveRequest, solve_milp
+from gamcoach.timing import GenerationStats
+
+
+def test_metrics_exposition(tmp_path):
+    registry = MetricsRegistry()
+
+    for value in [0.002, 0.003, 0.2, 100]:
+        registry.observe("gamcoach_stage_seconds", value, stage="solve_milp")
+
+    registry.record_cache("model_data", True)
+    registry.record_cache("model_data", True)
+    registry.record_cache("model_data", False)
+
+    text = registry.to_prometheus()
+    assert "# TYPE gamcoach_stage_seconds histogram" in text
+    assert 'gamcoach_stage_seconds_bucket{stage="solve_milp",le="0.005"} 2' in text
+    assert 'gamcoach_stage_seconds_bucket{stage="solve_milp",le="+Inf"} 4' in text
+    assert 'gamcoach_stage_seconds_count{stage="solve_milp"} 4' in text
+    assert 'gamcoach_cache_requests_total{cache="model_data",result="hit"} 2' in text
+
+    # JSON snapshots are written atomically to a file
+    path = tmp_path / "metrics.json"
+    registry.dump(str(path), fmt="json")
+    snapshot = json.loads(path.read_text())
+
+    assert snapshot["cache_hit_ratios"] == {"model_data": 2 / 3}
+    histogram = snapshot["histograms"][0]
+    assert histogram["count"] == 4
+    assert 0.001 <= histogram["p50"] <= 0.005
+
+
+def test_metrics_from_generate_cfs(lending_club):
+    my_coach, x_reject = lending_club
+    METRICS.reset()
+
+    texts = []
+    METRICS.set_dump_target(callback=texts.append, interval=0)
+
+    try:
+        cfs = my_coach.generate_cfs(
+            x_reject[0],
+            total_cfs=2,
+            features_to_vary=["loan_amnt", "fico_score", "term"],
+            verbose=0,
+        )
+    finally:
+        METRICS.set_dump_target()
+
+    assert METRICS.get_counter("gamcoach_generate_cfs_total") == 1
+    assert METRICS.get_counter("gamcoach_cfs_total") == len(cfs) == 2
+    assert METRICS.get_counter("gamcoach_solver_status_total", status="optimal") == 2
+    assert METRICS.get_counter("gamcoach_verified_cfs_total") == 2
+
+    # The snapshot is dumped after the call is recorded
+    assert len(texts) == 1
+    assert 'gamcoach_stage_seconds_count{stage="solve_milp"} 1' in texts[0]
+
+    snapshot = METRICS.snapshot()
+    assert snapshot["throughput"]["cfs_per_second"] > 0
+
+
+def test_metrics_time_limited_status():
+    options = {
+        "a": [[1.0, 0.5, 1.0, 1], [2.0, 0.9, 2.0, 2]],
+        "b": [["x", 0.3, 0.5, 0], ["y", 0.7, 3.0, 1]],
+    }
+    stats = GenerationStats()
+
+    def solve(time_limit):
+        model, _ = coach.GAMCoach.create_milp(1, 0.8, ["a", "b"], options)
+        solve_milp(SolveRequest(model, time_limit=time_limit))
+        return model
+
+    # Proven optimal with and without a time limit
+    stats.record_milp("cf", solve(None))
+    stats.record_milp("cf", solve(60), True)
+
+    # A feasible solution, when the solver is stopped before proving it
+    model = solve(60)
+    model.assignStatus(pulp.LpStatusOptimal, pulp.LpSolutionIntegerFeasible)
+    stats.record_milp("cf", model, True)
+
+    # No solution, when the time budget is used up before the solve
+    model = solve(0)
+    stats.record_milp("cf", model, True)
+    stats.record_milp("cf", model, False)
+    stats.finish()
+
+    assert [milp["time_limited"] for milp in stats.milps] == [
+        False,
+        False,
+        True,
+        True,
+        False,
+    ]
+    assert [milp["sol_status"] for milp in stats.milps] == [
+        pulp.LpSolutionOptimal,
+        pulp.LpSolutionOptimal,
+        pulp.LpSolutionIntegerFeasible,
+        pulp.LpSolutionNoSolutionFound,
+        pulp.LpSolutionNoSolutionFound,
+    ]
+
+    registry = MetricsRegistry()
+    registry.record_generation(stats)
+
+    name = "gamcoach_solver_status_total"
+    assert registry.get_counter(name, status="optimal") == 2
+    assert registry.get_counter(name, status="time_limited") == 2
+    assert registry.get_counter(name, status="not_solved") == 1
+    assert 'gamcoach_solver_status_total{status="time_limited"} 2' in (
+        registry.to_prometheus()
+    )
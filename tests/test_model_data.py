@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""Tests for `get_model_data()`."""
+
+import numpy as np
+
+import gamcoach as coach
+from gamcoach.gamcoach import _get_kde_sample
+from gamcoach.payload import UNUSED_FIELDS
+
+
+def test_binned_kde_matches_exact_kde():
+    rs = np.random.RandomState(0)
+    xs = np.concatenate((rs.normal(0, 1, 30000), rs.lognormal(3, 0.5, 10000)))
+
+    exact_x, exact_y = _get_kde_sample(xs, method="exact")
+    binned_x, binned_y = _get_kde_sample(xs, method="binned")
+
+    assert np.allclose(binned_x, exact_x)
+    assert np.max(np.abs(binned_y - exact_y)) < 1e-3 * np.max(exact_y)
+
+
+def test_model_data_kde_methods(lending_club):
+    my_coach, x_reject = lending_club
+    kwargs = {"feature_stats": my_coach.feature_stats}
+    model_info = {"classes": ["rejection", "approval"]}
+
+    exact = coach.get_model_data(
+        my_coach.ebm, x_reject, model_info, kde_method="exact", **kwargs
+    )
+    binned = coach.get_model_data(
+        my_coach.ebm, x_reject, model_info, kde_method="binned", n_jobs=2, **kwargs
+    )
+
+    assert exact.keys() == binned.keys()
+    assert exact["contMads"] == binned["contMads"]
+
+    for exact_f, binned_f in zip(exact["features"], binned["features"]):
+        assert exact_f.keys() == binned_f.keys()
+        for key in exact_f:
+            if not key.startswith("histCount"):
+                assert exact_f[key] == binned_f[key]
+                continue
+
+            exact_count = np.array(exact_f[key])
+            assert np.max(np.abs(np.array(binned_f[key]) - exact_count)) < (
+                1e-2 * np.max(exact_count)
+            )
+
+
+def test_model_data_payload(lending_club, tmp_path):
+    my_coach, x_reject = lending_club
+    model_data = coach.get_model_data(
+        my_coach.ebm,
+        x_reject,
+        {"classes": ["rejection", "approval"]},
+        feature_stats=my_coach.feature_stats,
+    )
+
+    path = str(tmp_path / "model.bin")
+    coach.save_model_payload(model_data, path)
+    loaded = coach.load_model_payload(path)
+    loaded_lists = coach.load_model_payload(path, mmap_mode=None, as_lists=True)
+
+    for feature, loaded_f, list_f in zip(
+        model_data["features"], loaded["features"], loaded_lists["features"]
+    ):
+        assert feature.keys() == loaded_f.keys() == list_f.keys()
+        assert np.allclose(loaded_f["additive"], feature["additive"], atol=1e-6)
+        assert isinstance(loaded_f["additive"], np.memmap)
+
+        # Bin edges and level codes are exact
+        for key in ["binEdge", "binLabel", "binLabel1", "binLabel2"]:
+            if key in feature:
+                assert list_f[key] == feature[key]
+
+    assert loaded["contMads"] == model_data["contMads"]
+
+    # The payload can create the same coach as the JSON model data
+    x = x_reject[:200]
+    json_coach = coach.GAMCoach.from_model_data(model_data)
+    payload_coach = coach.GAMCoach.from_model_data(path)
+    assert np.allclose(
+        payload_coach.ebm.decision_function(x),
+        json_coach.ebm.decision_function(x),
+        atol=1e-5,
+    )
+
+    # Quantized payloads without unused fields
+    coach.save_model_payload(model_data, path, quantize=8, drop_fields=UNUSED_FIELDS)
+    quantized = coach.load_model_payload(path)
+
+    for feature, quantized_f in zip(model_data["features"], quantized["features"]):
+        assert "error" not in quantized_f and "count" not in quantized_f
+
+        additive = np.array(feature["additive"])
+        max_error = (additive.max() - additive.min()) / 255 / 2
+        assert np.max(np.abs(quantized_f["additive"] - additive)) <= max_error + 1e-6
+
+
+def test_model_data_cache(lending_club, tmp_path, monkeypatch):
+    my_coach, x_reject = lending_club
+    ebm = my_coach.ebm
+    kwargs = {
+        "model_info": {"classes": ["rejection", "approval"]},
+        "feature_stats": my_coach.feature_stats,
+    }
+
+    model_data = coach.get_model_data(ebm, x_reject, cache_dir=tmp_path, **kwargs)
+    assert len(list(tmp_path.glob("model-data-*.json"))) == 1
+
+    feature_config = {"loan_amnt": {"difficulty": 5, "acceptableRange": [0, 1e4]}}
+    feature_info = {"term": ["Loan Term", "The number of payments"]}
+    expected = coach.get_model_data(
+        ebm,
+        x_reject,
+        feature_config=feature_config,
+        feature_info=feature_info,
+        **kwargs,
+    )
+
+    # Configuration-only updates do not recompute the model sections
+    def fail(*args):
+        raise AssertionError("The model sections should be cached")
+
+    monkeypatch.setattr(coach.gamcoach, "_get_model_sections", fail)
+    cached = coach.get_model_data(
+        ebm,
+        x_reject,
+        feature_config=feature_config,
+        feature_info=feature_info,
+        cache_dir=tmp_path,
+        **kwargs,
+    )
+    assert cached == expected
+
+    updated = coach.update_model_data(
+        model_data, feature_config=feature_config, feature_info=feature_info
+    )
+    assert updated == expected
+    assert model_data["features"][0]["config"]["difficulty"] == 3
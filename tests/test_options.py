@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+"""Tests for the `OptionTable` and `VariableRegistry` classes."""
+
+import numpy as np
+import pulp
+
+from gamcoach.options import OptionTable, VariableRegistry, as_option_tables
+from gamcoach.gamcoach import GAMCoach, _remove_redundant_options
+from gamcoach.solver import get_cbc_solver
+
+
+def test_option_table_list_round_trip():
+    options = [
+        [3.0, 0.5, 0.1, 2, [[20, 0.01], [21, -0.02]]],
+        [1.0, 0.2, 0.3, 0, [[20, 0.03], [21, 0.0]]],
+    ]
+    table = OptionTable.from_list(options)
+
+    assert table.targets.dtype == float
+    assert table.inter_ids.tolist() == [20, 21]
+    assert np.allclose(table.get_inter_gains(21), [-0.02, 0.0])
+    assert np.allclose(table.get_inter_gains(99), [0, 0])
+    assert table.find_row(0) == 1
+    assert table.find_row(5) == -1
+    assert table.to_list() == options
+
+    inter_options = [[["a", 1.0], 0.4, 0, [1, 3], 0]]
+    inter_table = as_option_tables({"f1 x f2": inter_options})["f1 x f2"]
+    assert inter_table.find_row([1, 3]) == 0
+    assert inter_table.to_list() == inter_options
+
+
+def test_remove_redundant_options():
+    rs = np.random.RandomState(922)
+    gains = rs.uniform(0, 1, 200)
+    distances = rs.uniform(0, 5, 200)
+    table = OptionTable(np.arange(200.0), gains, distances, np.arange(200))
+
+    # Reference: remove all later options that are similar to the current one
+    ref = sorted(table.to_list(), key=lambda x: x[2])
+    start = 0
+    while start < len(ref):
+        for i in range(len(ref) - 1, start, -1):
+            if np.abs(ref[i][1] - ref[start][1]) < 0.01:
+                ref.pop(i)
+        start += 1
+
+    kept = _remove_redundant_options(table, 0.01)
+    assert kept.bins.tolist() == [option[3] for option in ref]
+    assert len(_remove_redundant_options(table, 0)) == 200
+
+
+def test_variable_registry():
+    registry = VariableRegistry()
+    assert len(registry) == 0
+    assert registry.get_active_options().shape == (0, 2)
+
+    # Columns are added in order, with any (feature_id, row) pair
+    cells = [(2, 0), (2, 3), (0, 1), (5, 7)]
+    for col, (f_id, row) in enumerate(cells):
+        x = pulp.LpVariable("x{}".format(col), cat="Binary")
+        assert registry.add(x, f_id, row) == col
+
+    assert registry.feature_ids.tolist() == [2, 2, 0, 5]
+    assert registry.rows.tolist() == [0, 3, 1, 7]
+    assert registry.get_values().tolist() == [0, 0, 0, 0]
+
+    # Decode the solved columns back to their options
+    for x, value in zip(registry.variables, [0, 1, 1, 0.4]):
+        x.varValue = value
+
+    assert registry.get_active_options().tolist() == [[2, 3], [0, 1]]
+
+
+def test_create_milp_muted_variables():
+    options = {
+        "a": [[1.0, 0.5, 1.0, 1], [2.0, 0.9, 2.0, 2], [3.0, 1.2, 4.0, 3]],
+        "b": [["x", 0.3, 0.5, 0], ["y", 0.7, 3.0, 1]],
+        "a x b": [
+            [[1.0, "x"], 0.0, 0, [1, 0], 0],
+            [[2.0, "y"], -0.5, 0, [2, 1], 0],
+            [[3.0, "x"], 0.2, 0, [3, 0], 0],
+        ],
+    }
+
+    def solve(muted_variables):
+        model, variables = GAMCoach.create_milp(
+            1, 0.8, ["a", "b"], options, muted_variables=muted_variables
+        )
+        model.solve(get_cbc_solver())
+
+        # Variables are named after their columns
+        assert [x.name for x in variables.variables] == [
+            "x{}".format(col) for col in range(len(variables))
+        ]
+        return model, variables
+
+    model, variables = solve([])
+    assert len(variables) == 5 + 3
+    assert variables.feature_ids.tolist() == [0, 0, 0, 1, 1, 2, 2, 2]
+    assert variables.rows.tolist() == [0, 1, 2, 0, 1, 0, 1, 2]
+    assert variables.get_active_options().tolist() == [[0, 0], [1, 0], [2, 0]]
+    assert np.isclose(pulp.value(model.objective), 1.5)
+
+    # Mute the found options as generate_cfs() does, round by round
+    muted_variables = [(0, 0), (1, 0)]
+    model, variables = solve(muted_variables)
+    cells = list(zip(variables.feature_ids.tolist(), variables.rows.tolist()))
+    assert (0, 0) not in cells and (1, 0) not in cells
+
+    # Interaction variables of the muted options are gone too
+    assert (2, 0) not in cells and (2, 2) not in cells
+    assert variables.get_active_options().tolist() == [[0, 1]]
+    assert np.isclose(pulp.value(model.objective), 2.0)
+
+    muted_variables.append((0, 1))
+    model, variables = solve(muted_variables)
+    assert variables.get_active_options().tolist() == [[0, 2]]
+    assert np.isclose(pulp.value(model.objective), 4.0)
+
+
+def test_generate_cfs_mutes_options(lending_club):
+    my_coach, x_reject = lending_club
+    cfs = my_coach.generate_cfs(x_reject[0], total_cfs=4, verbose=0)
+    assert len(cfs) == 4
+
+    # A main effect option is used in at most one CF
+    used_changes = set()
+    for i in range(len(cfs)):
+        start, end = cfs.change_offsets[i], cfs.change_offsets[i + 1]
+        for j in range(start, end):
+            f_id = cfs.change_features[j]
+            if cfs.feature_types[f_id] == "interaction":
+                continue
+
+            change = (int(f_id), str(cfs.change_ranges[j]))
+            assert change not in used_changes
+            used_changes.add(change)
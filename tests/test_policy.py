@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Tests for the resource policy of `generate_cfs()`."""
+
+import numpy as np
+import pytest
+
+import gamcoach as coach
+from gamcoach.metrics import METRICS
+
+
+def test_resource_policy(lending_club):
+    my_coach, x_reject = lending_club
+
+    cfs = my_coach.generate_cfs(x_reject[0], verbose=0)
+    assert cfs.degradation is None
+    optimal_value = cfs.values[0]
+
+    cfs = my_coach.generate_cfs(
+        x_reject[0], verbose=0, resource_policy={"max_variables": 10**6}
+    )
+    assert cfs.degradation["steps"] == []
+    assert cfs.stats.metadata["degradations"] == []
+
+    size = cfs.degradation["predicted_size"]
+    assert size["num_interaction_cells"] > 0
+    assert cfs.model_stats["num_variables"] <= size["num_variables"]
+
+    # Degrade the problem until it fits
+    METRICS.reset()
+    policy = coach.ResourcePolicy(
+        max_variables=size["num_variables"] // 4, max_interaction_cells=0
+    )
+    cfs = my_coach.generate_cfs(x_reject[0], verbose=0, resource_policy=policy)
+
+    assert len(cfs) == 1
+    assert policy.fits(cfs.degradation["size"])
+    assert cfs.model_stats["num_variables"] <= policy.max_variables
+    assert cfs.degradation["steps"][-1]["action"] == "prune_interactions"
+    assert cfs.stats.metadata["degradations"] == [
+        step["action"] for step in cfs.degradation["steps"]
+    ]
+    assert METRICS.get_counter("gamcoach_admission_total", outcome="degraded") == 1
+
+    # The coarsened options keep the CFs valid, but can increase the distance
+    coarse_policy = {"max_variables": size["num_variables"] // 2}
+    coarse_cfs = my_coach.generate_cfs(
+        x_reject[0], verbose=0, resource_policy=coarse_policy
+    )
+    assert [s["action"] for s in coarse_cfs.degradation["steps"]] == ["coarsen_bins"]
+    assert np.all(coarse_cfs.is_valid)
+    assert coarse_cfs.values[0] >= optimal_value - 1e-6
+
+    # Refuse the problem
+    with pytest.raises(coach.ResourceLimitError, match="max_variables"):
+        my_coach.generate_cfs(
+            x_reject[0],
+            verbose=0,
+            resource_policy={"max_variables": 10, "on_exceed": "refuse"},
+        )
+
+    with pytest.raises(coach.ResourceLimitError) as error:
+        my_coach.generate_cfs(
+            x_reject[0],
+            verbose=0,
+            resource_policy={"max_variables": 1, "degradations": ["coarsen_bins"]},
+        )
+    assert error.value.size["num_variables"] > 1
+    assert METRICS.get_counter("gamcoach_admission_total", outcome="refused") == 2
+
+    with pytest.raises(ValueError):
+        coach.ResourcePolicy(degradations=["drop_everything"])
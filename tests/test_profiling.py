@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+"""Tests for the `profiling()` context manager."""
+
+import json
+import pstats
+
+import gamcoach as coach
+from gamcoach.profiling import merge_traces
+
+
+def test_profiling_chrome_trace(lending_club, tmp_path):
+    my_coach, x_reject = lending_club
+    kwargs = {"features_to_vary": ["loan_amnt", "fico_score", "term"], "verbose": 0}
+
+    path = tmp_path / "trace-{pid}.json"
+    with coach.profiling(str(path), worker_id="worker-1", profile_options=True) as rec:
+        with rec.span("batch", size=2):
+            for x in x_reject[:2]:
+                my_coach.generate_cfs(x, total_cfs=2, **kwargs)
+
+    # Calls outside the block are not recorded
+    my_coach.generate_cfs(x_reject[2], **kwargs)
+
+    trace_path = next(tmp_path.glob("trace-*.json"))
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    spans = [e for e in events if e["ph"] == "X"]
+
+    requests = [e for e in spans if e["cat"] == "request"]
+    assert len(requests) == 2
+    assert requests[0]["args"]["model_fingerprint"] == my_coach.model_fingerprint
+    assert requests[0]["args"]["worker"] == "worker-1"
+
+    # Stages, rounds, and solver calls are nested in their request
+    for request in requests:
+        children = [
+            e
+            for e in spans
+            if e["args"].get("request") == request["args"]["request"]
+            and e is not request
+        ]
+        assert {"round 0", "round 1", "solve_milp"} <= {e["name"] for e in children}
+
+        for child in children:
+            assert child["ts"] >= request["ts"] - 1
+            assert child["ts"] + child["dur"] <= request["ts"] + request["dur"] + 1
+
+    solver_spans = [e for e in spans if e["cat"] == "solver"]
+    assert len(solver_spans) == 4
+    assert all(e["args"]["num_variables"] > 0 for e in solver_spans)
+    assert len([e for e in spans if e["name"] == "batch"]) == 1
+
+    # Option generation is profiled with cProfile
+    profile = pstats.Stats(str(trace_path.with_suffix(".pstats")))
+    functions = [f[2] for f in profile.stats]
+    assert "generate_cont_options" in functions
+    assert "create_milp" not in functions
+
+    merged_path = tmp_path / "merged.json"
+    merge_traces([trace_path, trace_path], merged_path)
+    merged = json.loads(merged_path.read_text())["traceEvents"]
+    assert len(merged) == 2 * len(events)
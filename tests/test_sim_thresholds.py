@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+"""Tests for the 'auto' similarity thresholds of `generate_cfs()`."""
+
+import numpy as np
+
+import gamcoach as coach
+from gamcoach.gamcoach import MAX_SIM_THRESHOLD_ROUNDS
+
+BUDGET = 300
+
+
+def get_optimal_value(my_coach, example):
+    """Returns the objective value of the optimal CF without any pruning."""
+    return my_coach.generate_cfs(example, verbose=0, sim_threshold_factor=0).values[0]
+
+
+def test_auto_sim_threshold(lending_club):
+    my_coach, x_reject = lending_club
+
+    cfs = my_coach.generate_cfs(
+        x_reject[2], verbose=0, sim_threshold_factor="auto", variable_budget=BUDGET
+    )
+    assert len(cfs) == 1 and np.all(cfs.is_valid)
+
+    # The certified CF is optimal with all options
+    assert cfs.solver_stats["certified"] is True
+    assert np.isclose(cfs.values[0], get_optimal_value(my_coach, x_reject[2]))
+
+    # The pruned MILPs fit in the budget
+    milps = cfs.stats.milps
+    assert [milp["name"] for milp in milps] == ["certify", "certify_relaxed"]
+    assert all(milp["num_variables"] <= BUDGET for milp in milps)
+
+    # The thresholds of all continuous features are recorded
+    cont_names = [
+        name
+        for name, f_type in zip(my_coach.feature_names, my_coach.feature_types)
+        if f_type == "continuous"
+    ]
+    assert sorted(cfs.sim_thresholds) == sorted(cont_names)
+    assert all(t >= 0 for t in cfs.sim_thresholds.values())
+    assert any(t > 0 for t in cfs.sim_thresholds.values())
+
+    # The pruning loses the optimal CF of this example, so the certificate
+    # fails, and the next round would exceed the budget
+    cfs = my_coach.generate_cfs(
+        x_reject[4], verbose=0, sim_threshold_factor="auto", variable_budget=BUDGET
+    )
+    assert cfs.solver_stats["certified"] is False
+    assert cfs.values[0] > get_optimal_value(my_coach, x_reject[4]) + 1e-6
+    assert all(milp["num_variables"] <= BUDGET for milp in cfs.stats.milps)
+
+    # Fixed thresholds are not certified
+    cfs = my_coach.generate_cfs(x_reject[0], verbose=0)
+    assert cfs.solver_stats["certified"] is None
+
+
+def loosen_sim_thresholds(monkeypatch, factor):
+    """Start the threshold rounds at `factor` times the tuned scale, and
+    record the tuned scale, followed by the scale of each later pruning."""
+    tune_sim_threshold_scale = coach.GAMCoach._tune_sim_threshold_scale
+    prune_options = coach.GAMCoach._prune_options
+    scales = []
+
+    def tune(self, *args, **kwargs):
+        scale = tune_sim_threshold_scale(self, *args, **kwargs)
+        scales.append(scale)
+        return scale * factor
+
+    def prune(self, options, scale):
+        # The tuning also prunes the options
+        if len(scales) > 0:
+            scales.append(scale)
+        return prune_options(self, options, scale)
+
+    monkeypatch.setattr(coach.GAMCoach, "_tune_sim_threshold_scale", tune)
+    monkeypatch.setattr(coach.GAMCoach, "_prune_options", prune)
+    return scales
+
+
+def test_auto_sim_threshold_retightens(lending_club, monkeypatch):
+    my_coach, x_reject = lending_club
+    scales = loosen_sim_thresholds(monkeypatch, 4)
+    certify_sim_thresholds = coach.GAMCoach._certify_sim_thresholds
+    num_rounds = []
+
+    def fail_first_certificate(self, *args, **kwargs):
+        num_rounds.append(1)
+        _, first_milp = yield from certify_sim_thresholds(self, *args, **kwargs)
+        return len(num_rounds) > 1, first_milp
+
+    monkeypatch.setattr(
+        coach.GAMCoach, "_certify_sim_thresholds", fail_first_certificate
+    )
+
+    cfs = my_coach.generate_cfs(
+        x_reject[0], verbose=0, sim_threshold_factor="auto", variable_budget=BUDGET
+    )
+    assert len(cfs) == 1 and cfs.solver_stats["certified"]
+
+    # The failed certificate halves the scale, after checking that the next
+    # MILP fits in the budget
+    tuned = scales[0]
+    assert tuned > 0
+    assert np.allclose(scales[1:], [4 * tuned, 2 * tuned, 2 * tuned])
+
+    prune_calls = [span[0] for span in cfs.stats.spans].count("prune_options")
+    assert prune_calls == 2
+
+    # The MILP of the certified round gives the first CF
+    milps = cfs.stats.milps
+    assert [milp["name"] for milp in milps] == ["certify", "certify_relaxed"] * 2
+    assert all(milp["num_variables"] <= BUDGET for milp in milps)
+
+
+def test_auto_sim_threshold_gives_up(lending_club, monkeypatch):
+    my_coach, x_reject = lending_club
+
+    def fail_certificate(self, *args, **kwargs):
+        return False, (yield from ())
+
+    monkeypatch.setattr(coach.GAMCoach, "_certify_sim_thresholds", fail_certificate)
+
+    # Tighter thresholds with the tuned scale would exceed the budget
+    cfs = my_coach.generate_cfs(
+        x_reject[0], verbose=0, sim_threshold_factor="auto", variable_budget=BUDGET
+    )
+    assert len(cfs) == 1 and not cfs.solver_stats["certified"]
+    assert cfs.stats.milps[0]["num_variables"] <= BUDGET
+
+    prune_calls = [span[0] for span in cfs.stats.spans].count("prune_options")
+    assert prune_calls == 1
+
+    # Loose thresholds are tightened for at most `MAX_SIM_THRESHOLD_ROUNDS`
+    loosen_sim_thresholds(monkeypatch, 2 ** (MAX_SIM_THRESHOLD_ROUNDS + 1))
+    cfs = my_coach.generate_cfs(
+        x_reject[0], verbose=0, sim_threshold_factor="auto", variable_budget=BUDGET
+    )
+    assert len(cfs) == 1 and not cfs.solver_stats["certified"]
+    assert all(milp["num_variables"] <= BUDGET for milp in cfs.stats.milps)
+
+    prune_calls = [span[0] for span in cfs.stats.spans].count("prune_options")
+    assert prune_calls == MAX_SIM_THRESHOLD_ROUNDS
+
+
+def test_relaxed_options(lending_club, monkeypatch):
+    my_coach, x_reject = lending_club
+    get_relaxed_options = coach.GAMCoach._get_relaxed_options
+    calls = []
+
+    def record_relaxed_options(self, *args):
+        calls.append(args)
+        return get_relaxed_options(self, *args)
+
+    monkeypatch.setattr(coach.GAMCoach, "_get_relaxed_options", record_relaxed_options)
+
+    my_coach.generate_cfs(
+        x_reject[0], verbose=0, sim_threshold_factor="auto", variable_budget=BUDGET
+    )
+    assert len(calls) == 1
+
+    # Relaxed score gains are at least the pruned score gains
+    cf_direction, cur_example, features_to_vary, full_options, options = calls[0]
+    relaxed_options = get_relaxed_options(my_coach, *calls[0])
+    assert relaxed_options.keys() == options.keys()
+
+    num_relaxed = 0
+    for f_name, table in options.items():
+        relaxed_gains = cf_direction * relaxed_options[f_name].gains
+        assert np.all(relaxed_gains >= cf_direction * table.gains - 1e-12)
+        num_relaxed += np.sum(relaxed_gains > cf_direction * table.gains + 1e-12)
+
+    assert num_relaxed > 0
+
+    # Without removed options, the relaxed gains are the original gains
+    term_scores = my_coach.discretizer.eval_terms(
+        cur_example, my_coach.ebm.term_features_, my_coach.ebm.term_scores_
+    )[0]
+    full_options = dict(full_options)
+    my_coach._add_inter_options(
+        full_options, dict(zip(my_coach.feature_names, term_scores))
+    )
+    relaxed_options = get_relaxed_options(
+        my_coach,
+        cf_direction,
+        cur_example,
+        features_to_vary,
+        full_options,
+        full_options,
+    )
+    for f_name, table in full_options.items():
+        assert np.allclose(relaxed_options[f_name].gains, table.gains)
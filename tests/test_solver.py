@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+"""Tests for the async and time-budgeted `generate_cfs()`."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pulp
+import pytest
+
+import gamcoach as coach
+from gamcoach.solver import SolveRequest, solve_milp, solve_milp_async
+from gamcoach.synthetic import make_synthetic_data, make_synthetic_ebm
+
+
+def run_async(coroutine):
+    """Run a coroutine in a new event loop (`asyncio.run()` needs Python 3.7)."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def make_slow_coach():
+    """Create a coach whose first MILP takes about a second to solve."""
+    ebm = make_synthetic_ebm(
+        num_features=12, num_bins=64, num_interactions=6, random_state=0
+    )
+    x_train = make_synthetic_data(ebm, 1000, random_state=0)
+    my_coach = coach.GAMCoach(ebm, x_train)
+    x_reject = x_train[ebm.predict(x_train) == 0]
+    return my_coach, x_reject
+
+
+def test_generate_cfs_async(lending_club):
+    my_coach, x_reject = lending_club
+    kwargs = {
+        "total_cfs": 2,
+        "features_to_vary": ["loan_amnt", "fico_score", "term", "annual_inc"],
+        "verbose": 0,
+    }
+
+    async def generate_all(executor):
+        return await asyncio.gather(
+            *[
+                my_coach.generate_cfs_async(x_reject[i], executor=executor, **kwargs)
+                for i in range(3)
+            ]
+        )
+
+    with ThreadPoolExecutor(2) as executor:
+        results = run_async(generate_all(executor))
+
+    for i, cfs in enumerate(results):
+        expected = my_coach.generate_cfs(x_reject[i], **kwargs)
+        assert np.allclose(cfs.values, expected.values)
+        assert np.all(cfs.is_valid)
+        assert not cfs.solver_stats["timed_out"]
+        assert [milp["status"] for milp in cfs.stats.milps] == [1, 1]
+
+
+def test_generate_cfs_time_budget(lending_club):
+    my_coach, x_reject = lending_club
+
+    cfs = my_coach.generate_cfs(x_reject[0], total_cfs=2, verbose=0, time_budget=0)
+    assert len(cfs) == 0
+    assert cfs.solver_stats["timed_out"]
+
+    cfs = run_async(my_coach.generate_cfs_async(x_reject[0], verbose=0, time_budget=60))
+    assert len(cfs) == 1
+    assert not cfs.solver_stats["timed_out"]
+
+
+def test_solve_milp_async_statuses():
+    options = {
+        "a": [[1.0, 0.5, 1.0, 1], [2.0, 0.9, 2.0, 2]],
+        "b": [["x", 0.3, 0.5, 0], ["y", 0.7, 3.0, 1]],
+    }
+
+    def solve_async(request):
+        run_async(solve_milp_async(request))
+
+    # Optimal, infeasible, and not solved (time budget used up)
+    for needed_score_gain, time_limit, status in [
+        (0.8, None, 1),
+        (10, None, -1),
+        (0.8, 0, 0),
+    ]:
+        results = []
+        for solve in [solve_milp, solve_async]:
+            model, variables = coach.GAMCoach.create_milp(
+                1, needed_score_gain, ["a", "b"], options
+            )
+            solve(SolveRequest(model, time_limit=time_limit))
+            results.append(
+                (
+                    model.status,
+                    variables.get_values().tolist(),
+                    pulp.value(model.objective),
+                )
+            )
+
+        assert results[0] == results[1]
+        assert results[0][0] == status
+
+    # CBC stops at its time limit before it finds a solution
+    my_coach, x_reject = make_slow_coach()
+    for solve in [solve_milp, solve_async]:
+        steps = my_coach._generate_cfs_steps(x_reject[0], verbose=0)
+        request = next(steps)
+        steps.close()
+
+        request.time_limit = 0.01
+        solve(request)
+        assert request.model.status != 1
+
+
+def test_generate_cfs_async_statuses(lending_club):
+    my_coach, x_reject = lending_club
+
+    # Optimal, infeasible, and timed out calls
+    statuses = []
+    for kwargs in [
+        {"features_to_vary": ["loan_amnt", "fico_score"]},
+        {"features_to_vary": ["total_acc"]},
+        {"time_budget": 0},
+    ]:
+        expected = my_coach.generate_cfs(x_reject[0], total_cfs=2, verbose=0, **kwargs)
+        cfs = run_async(
+            my_coach.generate_cfs_async(x_reject[0], total_cfs=2, verbose=0, **kwargs)
+        )
+
+        assert np.allclose(cfs.values, expected.values)
+        for key in ["statuses", "timed_out", "certified"]:
+            assert cfs.solver_stats[key] == expected.solver_stats[key]
+
+        statuses.append(cfs.solver_stats["statuses"])
+
+    assert statuses == [[1, 1], [-1, -1], []]
+    assert cfs.solver_stats["timed_out"]
+
+
+def test_generate_cfs_stopped_solve(monkeypatch):
+    my_coach, x_reject = make_slow_coach()
+    get_cbc_solver = coach.solver.get_cbc_solver
+
+    # CBC stops at its first solution, like a solve stopped by the time limit
+    # after it finds a feasible solution
+    def stop_at_first_solution(*args, **kwargs):
+        solver = get_cbc_solver(*args, **kwargs)
+        solver.options.append("maxSolutions 1")
+        return solver
+
+    monkeypatch.setattr(coach.solver, "get_cbc_solver", stop_at_first_solution)
+
+    for generate in [my_coach.generate_cfs, my_coach.generate_cfs_async]:
+        for time_budget, num_cfs, timed_out in [(None, 3, False), (60, 1, True)]:
+            cfs = generate(x_reject[0], total_cfs=3, verbose=0, time_budget=time_budget)
+            if asyncio.iscoroutine(cfs):
+                cfs = run_async(cfs)
+
+            # Without a time limit, the stop is not a time out. With a time
+            # limit, we keep the feasible CF, and stop the diversity rounds.
+            assert len(cfs) == num_cfs
+            assert cfs.solver_stats["statuses"] == [1] * num_cfs
+            assert (
+                cfs.solver_stats["sol_statuses"]
+                == [pulp.LpSolutionIntegerFeasible] * num_cfs
+            )
+            assert cfs.solver_stats["timed_out"] == timed_out
+
+
+def test_generate_cfs_budget_runs_out_before_solve(lending_club, monkeypatch):
+    my_coach, x_reject = lending_club
+    create_milp = coach.GAMCoach.create_milp
+
+    def slow_create_milp(*args, **kwargs):
+        time.sleep(0.2)
+        return create_milp(*args, **kwargs)
+
+    monkeypatch.setattr(coach.GAMCoach, "create_milp", staticmethod(slow_create_milp))
+
+    # The budget runs out while creating the first MILP, so it is not solved
+    cfs = my_coach.generate_cfs(x_reject[0], total_cfs=2, verbose=0, time_budget=0.1)
+    assert len(cfs) == 0
+    assert cfs.solver_stats["timed_out"]
+    assert cfs.solver_stats["statuses"] == []
+    assert cfs.stats.milps == []
+
+    spans = [span[0] for span in cfs.stats.spans]
+    assert spans.count("create_milp") == 1 and "solve_milp" not in spans
+
+
+def test_cancel_generate_cfs_async(monkeypatch):
+    my_coach, x_reject = make_slow_coach()
+
+    processes = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def record_subprocess(*args, **kwargs):
+        process = await create_subprocess_exec(*args, **kwargs)
+        processes.append(process)
+        return process
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", record_subprocess)
+
+    async def cancel_during_solve():
+        task = asyncio.ensure_future(
+            my_coach.generate_cfs_async(x_reject[0], verbose=0)
+        )
+        while len(processes) == 0:
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run_async(cancel_during_solve())
+
+    # The solver is killed instead of finishing its MILP
+    assert len(processes) == 1
+    assert processes[0].returncode not in (None, 0)
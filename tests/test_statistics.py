@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""Tests for the `FeatureStatistics` class."""
+
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gamcoach.gamcoach import GAMCoach
+from gamcoach.statistics import FeatureStatistics, QuantileSketch
+
+
+def test_feature_statistics_match_column_reference():
+    rs = np.random.RandomState(922)
+    n = 1001
+
+    x_train = np.empty((n, 4), dtype=object)
+    x_train[:, 0] = rs.normal(0, 3, n)
+    x_train[:, 1] = rs.choice(["a", "b", "c"], n, p=[0.5, 0.3, 0.2])
+    x_train[:, 2] = rs.randint(0, 5, n).astype(float)
+    x_train[:, 3] = rs.choice(["x", 1], n)
+
+    ebm = SimpleNamespace(
+        feature_names_in_=["f0", "f1", "f2", "f3"],
+        feature_types_in_=["continuous", "nominal", "continuous", "nominal"],
+    )
+
+    stats = FeatureStatistics.from_data(ebm, x_train)
+
+    for i, f_name in [[0, "f0"], [2, "f2"]]:
+        xs = x_train[:, i].astype(float)
+        mad = np.median(np.abs(xs - np.median(xs)))
+        assert np.isclose(stats.cont_mads[f_name], mad)
+        assert np.isclose(GAMCoach.compute_mad(x_train[:, i]), mad)
+
+    distances = stats.get_frequency_distances()
+    for i, f_name in [[1, "f1"], [3, "f3"]]:
+        counter = Counter(x_train[:, i])
+        assert stats.cat_counts[f_name] == dict(counter)
+        assert distances[f_name] == {k: 1 - counter[k] / n for k in counter}
+        assert GAMCoach.compute_frequency_distance(x_train[:, i]) == distances[f_name]
+
+    assert stats.get_naive_cat_distances()["f1"] == {"a": 1, "b": 1, "c": 1}
+    assert FeatureStatistics.from_data(ebm, x_train, continuous=False).cont_mads == {}
+
+
+def test_out_of_core_feature_statistics(tmp_path):
+    rs = np.random.RandomState(922)
+    n = 20001
+
+    x_train = np.empty((n, 3), dtype=object)
+    x_train[:, 0] = rs.lognormal(0, 1, n)
+    x_train[:, 1] = rs.choice(["a", "b", "c"], n)
+    x_train[:, 2] = rs.randint(0, 9, n).astype(float)
+
+    ebm = SimpleNamespace(
+        feature_names_in_=["f0", "f1", "f2"],
+        feature_types_in_=["continuous", "nominal", "continuous"],
+    )
+    exact = FeatureStatistics.from_data(ebm, x_train)
+
+    def chunks():
+        for start in range(0, n, 3000):
+            end = start + 3000
+            yield x_train[start:end]
+
+    # Two-pass exact MADs from a memmap, a CSV file, and a list of chunks
+    memmap = np.lib.format.open_memmap(
+        tmp_path / "x.npy", mode="w+", dtype=float, shape=(n, 2)
+    )
+    memmap[:] = x_train[:, [0, 2]]
+    memmap_ebm = SimpleNamespace(
+        feature_names_in_=["f0", "f2"],
+        feature_types_in_=["continuous", "continuous"],
+    )
+    stats = FeatureStatistics.from_source(memmap_ebm, memmap, chunk_size=999)
+    assert stats.cont_mads == exact.cont_mads
+
+    csv_path = tmp_path / "x.csv"
+    pd.DataFrame(x_train, columns=ebm.feature_names_in_).to_csv(csv_path, index=False)
+
+    for source in [str(csv_path), list(chunks())]:
+        stats = FeatureStatistics.from_source(ebm, source, chunk_size=4000)
+        assert stats.num_rows == n
+        assert stats.cat_counts == exact.cat_counts
+        for f_name in exact.cont_mads:
+            assert np.isclose(stats.cont_mads[f_name], exact.cont_mads[f_name])
+            assert stats.mad_errors[f_name] == 0
+
+    # One-time iterators can only use the sketch
+    with pytest.raises(ValueError):
+        FeatureStatistics.from_source(ebm, chunks(), mad_method="exact")
+
+    stats = FeatureStatistics.from_source(ebm, chunks(), mad_error=0.01)
+    assert stats.cat_counts == exact.cat_counts
+
+    xs = x_train[:, 0].astype(float)
+    sketch = QuantileSketch(0.01)
+    for chunk in chunks():
+        sketch.update(chunk[:, 0])
+
+    # The estimated median and MAD are within the rank error bound
+    error = sketch.rank_error
+    median = sketch.get_median()
+    assert error / n <= 0.01
+    assert np.sum(xs < median) <= n // 2 + error
+    assert np.sum(xs <= median) >= n // 2 - error
+
+    mad = stats.cont_mads["f0"]
+    assert stats.mad_errors["f0"] == sketch.get_relative_error()
+    assert np.sum(np.abs(xs - median) <= mad) >= n // 2 - 2 * error
+    assert np.sum(np.abs(xs - median) < mad) <= n // 2 + 2 * error
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+"""Tests for the synthetic EBM generator."""
+
+import numpy as np
+
+import gamcoach as coach
+from gamcoach.synthetic import make_synthetic_data, make_synthetic_ebm
+
+
+def test_synthetic_ebm():
+    params = {
+        "num_features": 8,
+        "categorical_ratio": 0.25,
+        "num_bins": 16,
+        "num_levels": 4,
+        "num_interactions": 3,
+        "interaction_bins": 4,
+    }
+    ebm = make_synthetic_ebm(**params, random_state=0)
+    assert make_synthetic_ebm(**params, random_state=0).fingerprint == ebm.fingerprint
+
+    assert ebm.feature_types_in_.count("nominal") == 2
+    assert len(ebm.term_features_) == 8 + 3
+
+    # Tables have the missing and unknown bins of interpret's EBMs
+    for term, scores in zip(ebm.term_features_, ebm.term_scores_):
+        shape = []
+        for i in term:
+            f_bins = ebm.bins_[i]
+            if isinstance(f_bins[0], dict):
+                shape.append(len(f_bins[0]) + 2)
+            else:
+                shape.append(len(f_bins[-1 if len(term) == 2 else 0]) + 3)
+        assert scores.shape == tuple(shape)
+
+    x_train = make_synthetic_data(ebm, 500, random_state=0)
+    my_coach = coach.GAMCoach(ebm, x_train)
+    x_reject = x_train[ebm.predict(x_train) == 0]
+    assert 0 < len(x_reject) < 500
+
+    cfs = my_coach.generate_cfs(x_reject[0], total_cfs=2, verbose=0)
+    assert len(cfs) == 2
+    assert np.all(cfs.is_valid)
+
+
+def test_single_feature_type():
+    # The 'auto' categorical weight needs both feature types
+    for categorical_ratio in [0.0, 1.0]:
+        ebm = make_synthetic_ebm(
+            num_features=5,
+            categorical_ratio=categorical_ratio,
+            num_bins=16,
+            num_interactions=2,
+            random_state=0,
+        )
+        x_train = make_synthetic_data(ebm, 500, random_state=0)
+        my_coach = coach.GAMCoach(ebm, x_train)
+        x_reject = x_train[ebm.predict(x_train) == 0]
+
+        cfs = my_coach.generate_cfs(x_reject[0], verbose=0)
+        assert len(cfs) == 1
+        assert np.all(cfs.is_valid)
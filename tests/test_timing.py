@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+"""Tests for the `GenerationStats` class."""
+
+import json
+import tracemalloc
+
+import gamcoach as coach
+
+
+def test_generation_stats(lending_club):
+    my_coach, x_reject = lending_club
+    kwargs = {
+        "features_to_vary": ["loan_amnt", "fico_score", "term"],
+        "feature_ranges": {"loan_amnt": [1000, 40000]},
+        "verbose": 0,
+    }
+
+    hook_stats = []
+    callback_stats = []
+    coach.add_stats_hook(hook_stats.append)
+
+    try:
+        cfs = my_coach.generate_cfs(
+            x_reject[0], total_cfs=2, stats_callback=callback_stats.append, **kwargs
+        )
+        no_stats = my_coach.generate_cfs(x_reject[0], collect_stats=False, **kwargs)
+    finally:
+        coach.remove_stats_hook(hook_stats.append)
+
+    stats = cfs.stats
+    assert no_stats.stats is None
+    assert hook_stats == [stats] and callback_stats == [stats]
+
+    stage_times = stats.get_stage_times()
+    for name in ["explain_local", "generate_cont_options", "create_milp", "solve_milp"]:
+        assert stage_times[name]["wall_time"] >= 0
+    assert stage_times["solve_milp"]["calls"] == 2
+
+    # Stages do not overlap
+    total_stage_time = sum(t["wall_time"] for t in stage_times.values())
+    assert total_stage_time <= stats.wall_time
+
+    # The range filter removes options, and the MILP sizes match the result
+    counts = stats.to_dict()["option_counts"]
+    assert counts["feature_ranges"] <= counts["generated"]
+    assert [milp["name"] for milp in stats.milps] == ["cf", "cf"]
+    assert stats.milps[-1]["num_variables"] == cfs.model_stats["num_variables"]
+    assert stats.milps[-1]["num_constraints"] == cfs.model_stats["num_constraints"]
+
+    json.dumps(stats.to_dict())
+
+
+def test_generation_stats_memory(lending_club):
+    my_coach, x_reject = lending_club
+    kwargs = {"features_to_vary": ["loan_amnt", "fico_score", "term"], "verbose": 0}
+
+    cfs = my_coach.generate_cfs(x_reject[0], total_cfs=2, track_memory=True, **kwargs)
+    stats = cfs.stats
+    assert not tracemalloc.is_tracing()
+
+    memory = stats.memory["create_milp"]
+    assert memory["calls"] == 2
+    assert memory["peak_bytes"] > 0
+    assert 0 < len(memory["top_sites"]) <= 5
+
+    estimates = stats.memory_estimates
+    assert estimates["bytes_per_option"] > 0
+    assert estimates["bytes_per_milp_variable"] > 0
+
+    num_variables = stats.milps[0]["num_variables"]
+    predicted = coach.estimate_memory(estimates, num_variables=num_variables)
+    assert predicted <= memory["peak_bytes"]
+
+    json.dumps(stats.to_dict())
+
+    # Memory is not tracked by default
+    assert my_coach.generate_cfs(x_reject[0], **kwargs).stats.memory is None